@@ -7,18 +7,23 @@ This module provides a command-line interface for interacting with the recommend
 import os
 import sys
 import argparse
+import asyncio
 import json
 from datetime import datetime, timedelta
 import random
+import numpy as np
 
 # Add the current directory to the Python path if needed
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
 # Import recommendation system components
 from src.recommendation_engine import RecommendationEngine
+from src.service import RecommendationService
 from src.content_metadata import Content
 from src.user_profile import UserProfile
-from src.utils import load_json_data, save_json_data
+from src.sqlite_storage import SQLiteStorage
+from src.storage import EventLogStorage, JSONStorage, SnapshotStorage
+from src.vocabulary import CONTENT_IDS
 
 # Sample data for initialization
 SAMPLE_GENRES = [
@@ -38,114 +43,82 @@ SAMPLE_CONTENT_TYPES = ["movie", "series", "documentary", "short"]
 class RecommendationSystem:
     """Main class that integrates all components of the recommendation system"""
     
-    def __init__(self, data_dir="data"):
+    # Formats data files can be stored in: one JSON object keyed by ID,
+    # newline-delimited JSON with one record per line, a binary snapshot of
+    # the whole model, a snapshot plus an append-only log of changes, or a
+    # SQLite database that loads users on demand (the last three fall back
+    # to JSON files until they hold data). With SQLite, history_similarity
+    # 'minhash' lets collaborative filtering load only the nearest
+    # neighbours rather than every user.
+    DATA_FORMATS = {"json": ".json", "ndjson": ".ndjson", "snapshot": ".json", "log": ".json", "sqlite": ".json"}
+    
+    def __init__(self, data_dir="data", data_format="json", max_loaded_users=None, history_similarity="exact"):
         """Initialize the recommendation system
         
         Args:
             data_dir (str): Directory for storing data files
+            data_format (str): One of 'json', 'ndjson', 'snapshot', 'log' or 'sqlite'
+            max_loaded_users (int, optional): With the 'sqlite' format, user
+                profiles kept in memory at a time. None keeps every profile
+                once loaded.
+            history_similarity (str): How collaborative filtering compares
+                viewing histories: 'exact' or 'minhash'
         """
+        if data_format not in self.DATA_FORMATS:
+            raise ValueError(f"Data format {data_format} not supported. Use one of: {list(self.DATA_FORMATS)}")
+            
         self.data_dir = data_dir
-        self.engine = RecommendationEngine()
+        self.data_format = data_format
+        self.max_loaded_users = max_loaded_users
+        self.engine = RecommendationEngine(history_similarity=history_similarity)
         
         # Ensure data directory exists
         os.makedirs(data_dir, exist_ok=True)
         
         # File paths for persistence
-        self.users_file = os.path.join(data_dir, "users.json")
-        self.content_file = os.path.join(data_dir, "content.json")
+        extension = self.DATA_FORMATS[data_format]
+        self.users_file = os.path.join(data_dir, "users" + extension)
+        self.content_file = os.path.join(data_dir, "content" + extension)
+        self.snapshot_file = os.path.join(data_dir, "model.snapshot")
+        self.log_file = os.path.join(data_dir, "model.log")
+        self.database_file = os.path.join(data_dir, "model.db")
+        self.storage = self._create_storage()
         
-    def load_data(self):
-        """Load users and content data from files"""
-        print("Loading data...")
+    def _create_storage(self):
+        """Persistence backend of the data format"""
+        files = JSONStorage(self.users_file, self.content_file)
+        if self.data_format == "snapshot":
+            return SnapshotStorage(self.snapshot_file, fallback=files)
+        if self.data_format == "log":
+            return EventLogStorage(self.snapshot_file, self.log_file, fallback=files)
+        if self.data_format == "sqlite":
+            return SQLiteStorage(self.database_file, fallback=files, max_loaded_users=self.max_loaded_users)
+        return files
         
-        # Load users
-        users_data = load_json_data(self.users_file)
-        for user_id, user_data in users_data.items():
-            user = self.engine.add_user(user_id, user_data.get("username"))
-            
-            # Load preferences
-            if "preferences" in user_data:
-                user.preferences = user_data["preferences"]
-                
-            # Load viewing history
-            if "viewing_history" in user_data:
-                for record in user_data["viewing_history"]:
-                    # Convert timestamp string back to datetime if it exists
-                    if "timestamp" in record:
-                        # Timestamps are saved as strings, convert back to datetime
-                        try:
-                            record["timestamp"] = datetime.fromisoformat(record["timestamp"])
-                        except (ValueError, TypeError):
-                            record["timestamp"] = datetime.now()
-                    user.viewing_history.append(record)
+    def load_data(self, progress=None):
+        """Load users and content data from storage
         
-        # Load content
-        content_data = load_json_data(self.content_file)
-        for content_id, content_info in content_data.items():
-            content = self.engine.add_content(
-                content_id, 
-                content_info.get("title", "Untitled"),
-                content_info.get("content_type", "movie")
-            )
-            
-            # Convert release_date string back to datetime if it exists
-            if "release_date" in content_info and content_info["release_date"]:
-                try:
-                    content_info["release_date"] = datetime.fromisoformat(content_info["release_date"])
-                except (ValueError, TypeError):
-                    content_info["release_date"] = None
-            
-            # Update all content metadata
-            content.update_metadata(content_info)
-            
+        Records are parsed one at a time, so memory holds the built model
+        rather than the whole file.
+        
+        Args:
+            progress (callable, optional): Called as progress(kind, records,
+                bytes_read, total_bytes) while files are read
+        """
+        print("Loading data...")
+        self.storage.load(self.engine, progress)
         print(f"Loaded {len(self.engine.users)} users and {len(self.engine.content_database)} content items")
         
     def save_data(self):
-        """Save users and content data to files"""
+        """Save users and content data to storage"""
         print("Saving data...")
         
-        # Save users
-        users_data = {}
-        for user_id, user in self.engine.users.items():
-            # Need to convert viewing history to be JSON serializable
-            serializable_history = []
-            for record in user.viewing_history:
-                record_copy = record.copy()
-                # Convert datetime to string if present
-                if "timestamp" in record_copy:
-                    record_copy["timestamp"] = record_copy["timestamp"].isoformat()
-                serializable_history.append(record_copy)
-                
-            users_data[user_id] = {
-                "username": user.username,
-                "preferences": user.preferences,
-                "viewing_history": serializable_history
-            }
-        
-        save_json_data(users_data, self.users_file)
-        
-        # Save content
-        content_data = {}
-        for content_id, content in self.engine.content_database.items():
-            # Convert content object to dictionary for JSON serialization
-            content_dict = {
-                "content_id": content.content_id,
-                "title": content.title,
-                "content_type": content.content_type,
-                "description": content.description,
-                "genres": content.genres,
-                "tags": content.tags,
-                "popularity_score": content.popularity_score,
-                "ratings": content.ratings
-            }
-            
-            # Handle release_date if it exists
-            if content.release_date:
-                content_dict["release_date"] = content.release_date.isoformat()
-                
-            content_data[content_id] = content_dict
-            
-        save_json_data(content_data, self.content_file)
+        try:
+            self.storage.save(self.engine)
+        except ValueError as e:
+            # Loading failed, keep the stored model as it is
+            print(f"Error saving data: {e}")
+            return
         
         print("Data saved successfully")
         
@@ -220,13 +193,14 @@ class RecommendationSystem:
         
         print("Sample data generated successfully")
     
-    def get_recommendations(self, user_id, algorithm="hybrid", limit=10):
+    def get_recommendations(self, user_id, algorithm="hybrid", limit=10, fusion=None):
         """Get recommendations for a user
         
         Args:
             user_id (str): User ID
             algorithm (str): Recommendation algorithm to use
             limit (int): Maximum number of recommendations
+            fusion (str, optional): How hybrid recommendations are fused
             
         Returns:
             list: List of recommended content items
@@ -237,7 +211,7 @@ class RecommendationSystem:
             
         print(f"Generating {algorithm} recommendations for user {user_id}...")
         recommendations = self.engine.generate_recommendations(
-            user_id, algorithm=algorithm, limit=limit
+            user_id, algorithm=algorithm, limit=limit, fusion=fusion
         )
         
         return recommendations
@@ -279,17 +253,22 @@ class RecommendationSystem:
             
         user = self.engine.users[user_id]
         
-        # Calculate total watch time
-        total_watch_time = sum(record["watch_duration"] for record in user.viewing_history)
+        history = user.viewing_history
         
-        # Count content types watched
+        # Calculate total watch time, skipping records without a duration
+        total_watch_time = float(np.nansum(history.durations))
+        if total_watch_time.is_integer():
+            total_watch_time = int(total_watch_time)
+        
+        # Count content types watched, one lookup per distinct content item
         content_types = {}
-        for record in user.viewing_history:
-            content_id = record["content_id"]
+        content_indices, view_counts = np.unique(history.content_indices, return_counts=True)
+        for content_index, count in zip(content_indices.tolist(), view_counts.tolist()):
+            content_id = CONTENT_IDS.lookup(content_index)
             if content_id in self.engine.content_database:
                 content = self.engine.content_database[content_id]
                 content_type = content.content_type
-                content_types[content_type] = content_types.get(content_type, 0) + 1
+                content_types[content_type] = content_types.get(content_type, 0) + count
         
         # Get favorite genres
         favorite_genres = user.get_favorite_genres(5)
@@ -359,6 +338,13 @@ def parse_arguments():
         default=5,
         help="Number of recommendations to show"
     )
+    rec_group.add_argument(
+        "--fusion",
+        type=str,
+        choices=["rank", "score", "rrf"],
+        default=None,
+        help="How hybrid recommendations combine content-based and collaborative signals"
+    )
     
     # Data options
     data_group = parser.add_argument_group("Data Options")
@@ -379,25 +365,92 @@ def parse_arguments():
         default=100,
         help="Number of sample content items to generate"
     )
+    data_group.add_argument(
+        "--data-format",
+        type=str,
+        choices=list(RecommendationSystem.DATA_FORMATS),
+        default="json",
+        help="Format of the data files"
+    )
+    data_group.add_argument(
+        "--max-loaded-users",
+        type=int,
+        default=None,
+        help="User profiles kept in memory with --data-format sqlite"
+    )
+    data_group.add_argument(
+        "--history-similarity",
+        type=str,
+        choices=list(RecommendationEngine.HISTORY_SIMILARITIES),
+        default="exact",
+        help="Compare viewing histories exactly or by MinHash estimate "
+             "(minhash keeps --data-format sqlite from loading every user)"
+    )
     data_group.add_argument(
         "--no-save", 
         action="store_true",
         help="Don't save data after execution"
     )
     
+    # Service options
+    service_group = parser.add_argument_group("Service Options")
+    service_group.add_argument(
+        "--serve",
+        action="store_true",
+        help="Serve recommendations over HTTP/JSON"
+    )
+    service_group.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Interface for the HTTP service"
+    )
+    service_group.add_argument(
+        "--port",
+        type=int,
+        default=8000,
+        help="Port for the HTTP service"
+    )
+    service_group.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=4,
+        help="Recommendation computations handed to worker threads at once (the engine scores one at a time)"
+    )
+    service_group.add_argument(
+        "--max-pending",
+        type=int,
+        default=64,
+        help="Pending computations before requests are rejected with 503"
+    )
+    
     return parser.parse_args()
 
 
+def print_load_progress(kind, records, bytes_read, total_bytes):
+    """Print data loading progress
+    
+    Args:
+        kind (str): 'users' or 'content'
+        records (int): Records read so far
+        bytes_read (int): Bytes of the file read so far
+        total_bytes (int): Size of the file
+    """
+    percent = 100.0 * bytes_read / total_bytes if total_bytes else 100.0
+    print(f"  {kind}: {records} records ({percent:.0f}%)")
+
+
 def main():
     """Main function"""
     args = parse_arguments()
     
     # Initialize recommendation system
-    system = RecommendationSystem()
+    system = RecommendationSystem(data_format=args.data_format, max_loaded_users=args.max_loaded_users,
+                                  history_similarity=args.history_similarity)
     
     try:
         # Load existing data
-        system.load_data()
+        system.load_data(progress=print_load_progress)
     except Exception as e:
         print(f"Error loading data: {e}")
         print("Starting with empty data")
@@ -406,6 +459,21 @@ def main():
     if args.generate:
         system.generate_sample_data(args.users, args.content)
     
+    if args.serve:
+        service = RecommendationService(
+            system.engine,
+            max_concurrency=args.max_concurrency,
+            max_pending=args.max_pending
+        )
+        print(f"Serving recommendations on http://{args.host}:{args.port}/recommendations")
+        try:
+            asyncio.run(service.serve_forever(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        if not args.no_save:
+            system.save_data()
+        return
+    
     # Handle user statistics
     if args.stats and args.user:
         stats = system.get_user_stats(args.user)
@@ -416,7 +484,8 @@ def main():
         recommendations = system.get_recommendations(
             args.user, 
             algorithm=args.algorithm,
-            limit=args.limit
+            limit=args.limit,
+            fusion=args.fusion
         )
         system.display_recommendations(recommendations)
     elif not args.stats and not args.generate:
@@ -427,7 +496,8 @@ def main():
             recommendations = system.get_recommendations(
                 random_user_id,
                 algorithm=args.algorithm,
-                limit=args.limit
+                limit=args.limit,
+                fusion=args.fusion
             )
             system.display_recommendations(recommendations)
         else:
@@ -0,0 +1,182 @@
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+# Rough per-entry bookkeeping cost (ordered dict node, expiry slot, indexes)
+# added on top of the key and value sizes when enforcing a byte budget
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def estimate_entry_size(key, value):
+    """Approximate memory held by one cache entry
+    
+    Args:
+        key: Cache key (tuples are measured element by element)
+        value: Cached value
+        
+    Returns:
+        int: Estimated size in bytes
+    """
+    size = sys.getsizeof(key) + sys.getsizeof(value) + ENTRY_OVERHEAD_BYTES
+    if isinstance(key, tuple):
+        size += sum(sys.getsizeof(part) for part in key)
+    return size
+
+
+class BoundedCache(MutableMapping):
+    """
+    Mapping with least-recently-used eviction and optional expiry.
+    
+    The cache is bounded by an entry count, an approximate byte budget, or
+    both; when an insert goes over budget the least recently used entries are
+    evicted. With a TTL, entries older than ttl seconds are treated as
+    missing and dropped when next touched (or by purge_expired()).
+    
+    get() and item access count hits and misses; `in` checks do not.
+    Subclasses can hook _entry_added/_entry_removed to maintain indexes.
+    """
+    
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None, clock=time.monotonic):
+        """Initialize an empty cache
+        
+        Args:
+            max_entries (int, optional): Maximum number of entries
+            max_bytes (int, optional): Approximate memory budget in bytes
+            ttl (float, optional): Seconds an entry stays valid after it is set
+            clock (callable): Time source returning seconds
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (value, expires_at), LRU first
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        
+    def _entry_added(self, key):
+        """Hook called after a new key is inserted"""
+        
+    def _entry_removed(self, key):
+        """Hook called after a key is removed for any reason"""
+        
+    def _remove(self, key):
+        """Remove an entry and update the byte count"""
+        value, _ = self._entries.pop(key)
+        if self.max_bytes is not None:
+            self._bytes -= estimate_entry_size(key, value)
+        self._entry_removed(key)
+        
+    def _live(self, key):
+        """Look up an entry, dropping it if it has expired
+        
+        Returns:
+            tuple: (value, expires_at), or None if missing or expired
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= self._clock():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        return entry
+    
+    def get(self, key, default=None):
+        entry = self._live(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+    
+    def __getitem__(self, key):
+        entry = self._live(key)
+        if entry is None:
+            self.misses += 1
+            raise KeyError(key)
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+    
+    def __setitem__(self, key, value):
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        
+        if key in self._entries:
+            old_value, _ = self._entries[key]
+            if self.max_bytes is not None:
+                self._bytes -= estimate_entry_size(key, old_value)
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+        else:
+            self._entries[key] = (value, expires_at)
+            self._entry_added(key)
+            
+        if self.max_bytes is not None:
+            self._bytes += estimate_entry_size(key, value)
+        self._evict()
+        
+    def __delitem__(self, key):
+        if key not in self._entries:
+            raise KeyError(key)
+        self._remove(key)
+        
+    def __contains__(self, key):
+        return self._live(key) is not None
+    
+    def __iter__(self):
+        return iter(list(self._entries))
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def _over_budget(self):
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+    
+    def _evict(self):
+        """Evict least recently used entries until within budget"""
+        while self._entries and self._over_budget():
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+            
+    def purge_expired(self):
+        """Drop all expired entries
+        
+        Returns:
+            int: Number of entries dropped
+        """
+        if self.ttl is None:
+            return 0
+        now = self._clock()
+        expired = [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        return len(expired)
+    
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        for key in list(self._entries):
+            self._remove(key)
+            
+    def stats(self):
+        """Cache counters and current size
+        
+        Returns:
+            dict: hits, misses, hit_rate, evictions, expirations, entries and
+                estimated bytes (when a byte budget is set)
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": len(self._entries),
+            "bytes": self._bytes if self.max_bytes is not None else None
+        }
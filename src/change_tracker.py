@@ -0,0 +1,80 @@
+from src.observable import FieldChanges
+
+
+class ChangeTracker:
+    """
+    Collects the users and content an engine added or changed since the
+    last save, for persistence that writes only what changed.
+
+    Register it with engine.add_change_listener(). users and content map
+    IDs to (object, changed fields); added objects have ADDED among their
+    fields. Changed fields are a FieldChanges, so the users whose ratings
+    changed are known as well. Viewing histories are append-only, so only the records after a
+    user's history mark need saving: the mark is the number of records
+    saved so far, taken from base_lengths for users never saved through
+    the tracker.
+    """
+
+    # Marks an object added since the last save in its set of changed fields
+    ADDED = "added"
+
+    def __init__(self, base_lengths=None):
+        """Initialize the tracker
+
+        Args:
+            base_lengths (dict, optional): user_id -> viewing records
+                already stored for users loaded from storage
+        """
+        self.base_lengths = base_lengths if base_lengths is not None else {}
+        self.history_marks = {}  # user_id -> viewing records saved
+        self.users = {}  # user_id -> (UserProfile, changed fields)
+        self.content = {}  # content_id -> (Content, changed fields)
+
+    def __call__(self, kind, obj, fields):
+        """Engine change listener, remembers an added or changed object"""
+        if kind == "user":
+            pending, key = self.users, obj.user_id
+        else:
+            pending, key = self.content, obj.content_id
+        entry = pending.get(key)
+        changed = entry[1] if entry is not None else FieldChanges()
+        changed.update_changes(fields if fields is not None else (self.ADDED,))
+        pending[key] = (obj, changed)
+
+    def __len__(self):
+        return len(self.users) + len(self.content)
+
+    def history_mark(self, user, fields):
+        """Position of a user's first viewing record not saved yet
+
+        Args:
+            user (UserProfile): Changed user
+            fields (set): The user's changed fields
+
+        Returns:
+            int: Number of records already saved
+        """
+        if user.user_id in self.history_marks:
+            return self.history_marks[user.user_id]
+        return 0 if self.ADDED in fields else self.base_lengths.get(user.user_id, 0)
+
+    def saved(self, history_marks):
+        """Record a successful save of every pending change
+
+        Args:
+            history_marks (dict): user_id -> viewing records now saved
+        """
+        self.history_marks.update(history_marks)
+        self.users.clear()
+        self.content.clear()
+
+    def reset(self, base_lengths):
+        """Forget marks and pending changes after the whole model was saved
+
+        Args:
+            base_lengths (dict): user_id -> viewing records now stored
+        """
+        self.base_lengths = base_lengths
+        self.history_marks.clear()
+        self.users.clear()
+        self.content.clear()
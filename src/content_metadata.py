@@ -1,5 +1,75 @@
-class Content:
+from src.observable import InternedListAttribute, Observable, TrackedAttribute
+from src.rating_map import RatingMap
+from src.vocabulary import GENRES, TAGS
+
+
+class _DeferredAttribute:
+    """Heavyweight field the content's source loads on first access"""
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.private_name = "_" + name
+        
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if instance._source is not None:
+            instance.hydrate()
+        return getattr(instance, self.private_name)
+    
+    def __set__(self, instance, value):
+        if instance._source is not None:
+            instance.hydrate()
+        setattr(instance, self.private_name, value)
+
+
+class _RatingsAttribute(TrackedAttribute):
+    """Tracked attribute that stores assigned ratings as a RatingMap it owns"""
+    
+    def __get__(self, instance, owner=None):
+        if instance is not None and instance._source is not None:
+            instance.hydrate()
+        return super().__get__(instance, owner)
+    
+    def __set__(self, instance, value):
+        if instance._source is not None:
+            instance.hydrate()
+        if not isinstance(value, RatingMap) or value.owner not in (None, instance):
+            value = RatingMap(value)
+        value.owner = instance
+        setattr(instance, self.private_name, value)
+        instance._field_changed(self.name)
+
+
+class Content(Observable):
+    __slots__ = (
+        "content_id", "title", "_content_type", "_description", "genre_ids",
+        "release_date", "duration", "_actors", "_directors", "tag_ids",
+        "_ratings", "_popularity_score", "_source", "_rating_summary"
+    )
+    
+    # Fields that feed similarity scoring and the engine's content indexes.
+    # Genres and tags are stored as interned ID tuples (genre_ids, tag_ids)
+    # and read back as list-like views that write changes back.
+    content_type = TrackedAttribute()
+    genres = InternedListAttribute(GENRES)
+    tags = InternedListAttribute(TAGS)
+    ratings = _RatingsAttribute()
+    popularity_score = TrackedAttribute()
+    
+    # Tracked fields other than ratings, which feed scoring through the average
+    SCORING_FIELDS = frozenset({"content_type", "genres", "tags", "popularity_score"})
+    
+    # Display-only fields, which a loader can leave to be read on first access
+    description = _DeferredAttribute()
+    actors = _DeferredAttribute()
+    directors = _DeferredAttribute()
+    
     def __init__(self, content_id, title, content_type):
+        super().__init__()
+        
+        self._source = None  # loads deferred fields, None once loaded
+        self._rating_summary = None  # (count, total) of ratings while deferred
         self.content_id = content_id
         self.title = title
         self.content_type = content_type  # movie, series, documentary, etc.
@@ -10,28 +80,113 @@ class Content:
         self.actors = []
         self.directors = []
         self.tags = []
-        self.ratings = {}  # user_id -> rating
+        self.ratings = {}  # user_id -> rating, stored as a RatingMap
         self.popularity_score = 0.0
         
+    def defer(self, source, rating_count, rating_total):
+        """Leave description, actors, directors and ratings to be loaded on first access
+        
+        Until then the average rating comes from the given count and sum,
+        which must match the ratings the source returns.
+        
+        Args:
+            source (callable): Called as source(content_id), returns a dict
+                with 'description', 'actors', 'directors' and 'ratings' (a
+                dict or an unowned RatingMap)
+            rating_count (int): Number of ratings
+            rating_total (float): Running sum of the ratings in insertion order
+        """
+        self._source = source
+        self._rating_summary = (rating_count, rating_total)
+        
+    @property
+    def hydrated(self):
+        """Whether the deferred fields are loaded"""
+        return self._source is None
+        
+    def hydrate(self):
+        """Load the deferred fields from the source, without notifying listeners"""
+        source = self._source
+        if source is None:
+            return
+        fields = source(self.content_id)
+        self._description = fields["description"]
+        self._actors = fields["actors"]
+        self._directors = fields["directors"]
+        ratings = fields["ratings"]
+        if not isinstance(ratings, RatingMap):
+            ratings = RatingMap(ratings)
+        ratings.owner = self
+        self._ratings = ratings
+        # Cleared last, so concurrent readers never see a half-loaded item
+        self._source = None
+        self._rating_summary = None
+        
     def update_metadata(self, metadata_dict):
         """Update content metadata from dictionary
         
+        Listeners are notified once with all tracked fields that changed.
+        
         Args:
             metadata_dict (dict): Dictionary with metadata fields
         """
-        for key, value in metadata_dict.items():
-            if hasattr(self, key):
-                setattr(self, key, value)
+        with self.batch_changes():
+            for key, value in metadata_dict.items():
+                if not key.startswith("_") and hasattr(self, key):
+                    setattr(self, key, value)
                 
+    def add_rating(self, user_id, rating):
+        """Add a user's rating, replacing any earlier rating by the same user
+        
+        Args:
+            user_id (str): User identifier
+            rating (float): Rating value (typically 1-5)
+        """
+        self.ratings[user_id] = rating
+        
+    def update_rating(self, user_id, rating):
+        """Change an existing rating
+        
+        Args:
+            user_id (str): User identifier
+            rating (float): New rating value
+            
+        Raises:
+            KeyError: If the user has not rated this content
+        """
+        if user_id not in self.ratings:
+            raise KeyError(user_id)
+        self.ratings[user_id] = rating
+        
+    def remove_rating(self, user_id):
+        """Remove a user's rating
+        
+        Args:
+            user_id (str): User identifier
+            
+        Returns:
+            float: The removed rating
+            
+        Raises:
+            KeyError: If the user has not rated this content
+        """
+        rating = self.ratings[user_id]
+        del self.ratings[user_id]
+        return rating
+        
     def get_average_rating(self):
-        """Calculate average user rating
+        """Get average user rating
+        
+        The rating sum is maintained as ratings change, so this is O(1) and
+        does not load deferred ratings.
         
         Returns:
             float: Average rating or 0 if no ratings
         """
-        if not self.ratings:
-            return 0.0
-        return sum(self.ratings.values()) / len(self.ratings)
+        if self._source is not None:
+            count, total = self._rating_summary
+            return total / count if count else 0.0
+        return self.ratings.average()
     
     def to_feature_vector(self):
         """Convert content metadata to feature vector for similarity calculation
@@ -41,10 +196,10 @@ class Content:
         """
         features = {
             "content_type": self.content_type,
-            "genres": self.genres.copy(),
+            "genres": list(self.genres),
             "avg_rating": self.get_average_rating(),
             "popularity": self.popularity_score,
             "release_year": self.release_date.year if self.release_date else None,
-            "tags": self.tags.copy()
+            "tags": list(self.tags)
         }
         return features
\ No newline at end of file
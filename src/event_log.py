@@ -0,0 +1,323 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+from src.change_tracker import ChangeTracker
+from src.rating_map import RatingMap
+from src.snapshot import load_snapshot, save_snapshot, snapshot_history_lengths, snapshot_metadata
+from src.vocabulary import USER_IDS
+
+# Content attributes written by update_content events
+CONTENT_FIELDS = (
+    "title", "content_type", "description", "genres", "tags", "popularity_score",
+    "release_date", "duration", "actors", "directors"
+)
+
+_COMMIT = {"op": "commit"}
+
+
+class EventLog:
+    """
+    Persists an engine as a snapshot plus an append-only log of changes.
+
+    While open, the log follows the engine's change notifications through a
+    ChangeTracker, which keeps the users and content changed since the last
+    flush. flush() appends one event per change and a commit marker, so a
+    save costs O(changes) rather than O(dataset). The events are add_user,
+    add_content, update_preferences, add_viewing_record, update_content,
+    update_ratings and ratings. Viewing records are appended as the records
+    added since the last flush and ratings as the users whose rating changed
+    with their new rating, plus the item's running sum. Metadata is written
+    as the current value of the fields that changed, and preferences and
+    reassigned ratings as their whole current value.
+
+    compact() writes the whole model to a new snapshot and starts an empty
+    log. flush() compacts on its own once the log reaches compact_bytes.
+    Snapshots are renamed into place and tagged with a generation, and the
+    log records the generation it applies to. A crash during compaction
+    therefore never replays a log over a snapshot that already contains it,
+    and a crash during a flush leaves an uncommitted tail that is dropped.
+
+    Changes to attributes the engine is not notified of (title,
+    description, release_date, duration, actors, directors and username on
+    existing objects) are not logged by themselves. Name them in
+    engine.refresh_content(content_id, fields) to log them; a username is
+    written with the next change of the same user.
+    """
+
+    EVENT_TYPES = ("add_user", "update_preferences", "add_viewing_record", "add_content",
+                   "update_content", "update_ratings", "ratings")
+
+    def __init__(self, snapshot_path, log_path=None, compact_bytes=64 << 20):
+        """Initialize the event log
+
+        Args:
+            snapshot_path (str): Path of the compacted snapshot
+            log_path (str, optional): Path of the event log. Defaults to the
+                snapshot path with a .log extension.
+            compact_bytes (int, optional): Log size at which flush() compacts.
+                None to compact only when compact() is called.
+        """
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path if log_path is not None else os.path.splitext(snapshot_path)[0] + ".log"
+        self.compact_bytes = compact_bytes
+        self.engine = None
+        self.generation = 0
+        self._file = None
+        self._changes = ChangeTracker()
+
+    def open(self, engine=None):
+        """Restore the engine from the snapshot and log, then follow its changes
+
+        Without a snapshot, the given engine's current state (for example
+        loaded from JSON files) becomes the first snapshot.
+
+        Args:
+            engine (RecommendationEngine, optional): Engine to restore into,
+                empty if a snapshot exists. Defaults to a new engine.
+
+        Returns:
+            RecommendationEngine: The restored engine
+        """
+        if os.path.exists(self.snapshot_path):
+            engine = load_snapshot(self.snapshot_path, engine)
+            self.generation = snapshot_metadata(self.snapshot_path).get("generation", 0)
+            replayed = self._replay(engine)
+            # Replayed users hold more records than the snapshot
+            self._changes.reset(snapshot_history_lengths(self.snapshot_path))
+            self._changes.saved({user_id: len(engine.users[user_id].viewing_history) for user_id in replayed})
+            self.engine = engine
+        else:
+            if engine is None:
+                from src.recommendation_engine import RecommendationEngine
+                engine = RecommendationEngine()
+            self.engine = engine
+            self.compact()
+
+        if self._file is None:
+            self._file = open(self.log_path, "ab")
+        engine.add_change_listener(self._changes)
+        return engine
+
+    def close(self):
+        """Flush pending changes and stop following the engine"""
+        if self.engine is None:
+            return
+        self.flush(compact=False)
+        self.engine.remove_change_listener(self._changes)
+        self._file.close()
+        self._file = None
+        self.engine = None
+
+    def pending(self):
+        """Number of users and content items changed since the last flush
+
+        Returns:
+            int: Count of changed objects
+        """
+        return len(self._changes)
+
+    def flush(self, compact=True):
+        """Append the changes since the last flush to the log
+
+        Args:
+            compact (bool): Compact afterwards if the log reached compact_bytes
+
+        Returns:
+            int: Number of events written
+        """
+        history_marks = {}
+        events = []
+        for content, fields in self._changes.content.values():
+            events.extend(self._content_events(content, fields))
+        for user, fields in self._changes.users.values():
+            events.extend(self._user_events(user, fields, history_marks))
+
+        if events:
+            self._file.write(b"".join(json.dumps(event).encode() + b"\n" for event in events + [_COMMIT]))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+        self._changes.saved(history_marks)
+        if compact and self.compact_bytes is not None and self._file.tell() >= self.compact_bytes:
+            self.compact()
+        return len(events)
+
+    def compact(self):
+        """Write the whole model to a new snapshot and start an empty log"""
+        generation = self.generation + 1
+        save_snapshot(self.engine, self.snapshot_path, {"generation": generation})
+        # A crash from here on finds an outdated log and discards it
+        self._start_log(generation)
+        self.generation = generation
+        self._changes.reset(snapshot_history_lengths(self.snapshot_path))
+
+    def _start_log(self, generation):
+        """Atomically replace the log with one holding only its header"""
+        if self._file is not None:
+            self._file.close()
+        temporary = f"{self.log_path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(json.dumps({"generation": generation}).encode() + b"\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.log_path)
+        self._file = open(self.log_path, "ab")
+
+    def _user_events(self, user, fields, history_marks):
+        """Events recording a user's changes"""
+        user_id = user.user_id
+        added = ChangeTracker.ADDED in fields
+        if added:
+            yield {"op": "add_user", "user_id": user_id, "username": user.username}
+
+        if "preferences" in fields or (added and user.preferences):
+            yield {"op": "update_preferences", "user_id": user_id, "preferences": dict(user.preferences)}
+
+        history = user.viewing_history
+        mark = self._changes.history_mark(user, fields)
+        if len(history) > mark:
+            yield {
+                "op": "add_viewing_record",
+                "user_id": user_id,
+                "content_ids": [record["content_id"] for record in history[mark:]],
+                "watch_durations": history.durations[mark:].tolist(),
+                "completion_percentages": history.completions[mark:].tolist(),
+                "timestamps": history.timestamps[mark:].tolist()
+            }
+            history_marks[user_id] = len(history)
+
+    def _content_events(self, content, fields):
+        """Events recording a content item's changes"""
+        content_id = content.content_id
+        added = ChangeTracker.ADDED in fields
+        if added:
+            yield {"op": "add_content", "content_id": content_id, "title": content.title,
+                   "content_type": content.content_type}
+
+        # Only the changed fields, so deferred description and credits of
+        # existing items stay unloaded unless they changed
+        changed = CONTENT_FIELDS if added else [field for field in CONTENT_FIELDS if field in fields]
+        if changed:
+            metadata = {field: getattr(content, field) for field in changed}
+            for field in ("genres", "tags", "actors", "directors"):
+                if field in metadata:
+                    metadata[field] = list(metadata[field])
+            if metadata.get("release_date") is not None:
+                metadata["release_date"] = metadata["release_date"].isoformat()
+            yield {"op": "update_content", "content_id": content_id, "metadata": metadata}
+
+        # The running sum is kept so averages match to the last bit
+        if "ratings" in fields and not added and "ratings" in fields.keys:
+            user_ids = sorted(fields.keys["ratings"])
+            ratings = content.ratings
+            yield {"op": "update_ratings", "content_id": content_id, "user_ids": user_ids,
+                   "ratings": [ratings.get(user_id) for user_id in user_ids], "total": ratings._total}
+        elif "ratings" in fields or (added and content.ratings):
+            yield {"op": "ratings", "content_id": content_id, "ratings": content.ratings.copy(),
+                   "total": content.ratings._total}
+
+    def _replay(self, engine):
+        """Apply the committed events of the log to a freshly loaded engine
+
+        Returns:
+            set: IDs of the users the log changed
+        """
+        if not os.path.exists(self.log_path):
+            self._start_log(self.generation)
+            return set()
+
+        with open(self.log_path, "rb") as file:
+            header = file.readline()
+            try:
+                generation = json.loads(header).get("generation")
+            except ValueError:
+                generation = None
+            if generation != self.generation:
+                # Written before the snapshot was compacted, or unreadable
+                self._start_log(self.generation)
+                return set()
+
+            handlers = self._handlers(engine)
+            users = set()
+            batch = []
+            committed = file.tell()
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    break  # Torn write at the end of the log
+                if event == _COMMIT:
+                    for committed_event in batch:
+                        handlers[committed_event["op"]](committed_event)
+                        users.add(committed_event.get("user_id"))
+                    batch = []
+                    committed = file.tell()
+                    continue
+                if event.get("op") not in handlers:
+                    raise ValueError(f"Event {event.get('op')} not supported. Use one of: {list(self.EVENT_TYPES)}")
+                batch.append(event)
+
+        if committed < os.path.getsize(self.log_path):
+            # Drop the uncommitted tail so new events follow the last commit
+            with open(self.log_path, "r+b") as file:
+                file.truncate(committed)
+        users.discard(None)
+        return users
+
+    def _handlers(self, engine):
+        """Functions applying each event type to an engine"""
+        def user(user_id):
+            return engine.users[user_id] if user_id in engine.users else engine.add_user(user_id)
+
+        def add_user(event):
+            user(event["user_id"]).username = event["username"]
+
+        def update_preferences(event):
+            user(event["user_id"]).preferences = event["preferences"]
+
+        def add_viewing_record(event):
+            user(event["user_id"]).add_viewing_records(
+                event["content_ids"], event["watch_durations"], event["completion_percentages"],
+                np.array(event["timestamps"], dtype=np.int64)
+            )
+
+        def add_content(event):
+            engine.add_content(event["content_id"], event["title"], event["content_type"])
+
+        def update_content(event):
+            metadata = event["metadata"]
+            if metadata.get("release_date"):
+                metadata["release_date"] = datetime.fromisoformat(metadata["release_date"])
+            engine.content_database[event["content_id"]].update_metadata(metadata)
+
+        def rating_map(entries, total):
+            # Sorted once, keeping the logged running sum
+            user_indices = sorted(entries)
+            return RatingMap.from_arrays(user_indices, [entries[user_index] for user_index in user_indices], total)
+
+        def update_ratings(event):
+            content = engine.content_database[event["content_id"]]
+            entries = dict(zip(content.ratings._users, content.ratings._values))
+            for user_id, rating in zip(event["user_ids"], event["ratings"]):
+                if rating is None:
+                    entries.pop(USER_IDS.intern(user_id), None)
+                else:
+                    entries[USER_IDS.intern(user_id)] = rating
+            content.ratings = rating_map(entries, event["total"])
+
+        def ratings(event):
+            entries = {USER_IDS.intern(user_id): rating for user_id, rating in event["ratings"].items()}
+            engine.content_database[event["content_id"]].ratings = rating_map(entries, event["total"])
+
+        return {
+            "add_user": add_user,
+            "update_preferences": update_preferences,
+            "add_viewing_record": add_viewing_record,
+            "add_content": add_content,
+            "update_content": update_content,
+            "update_ratings": update_ratings,
+            "ratings": ratings
+        }
@@ -0,0 +1,305 @@
+import numpy as np
+
+
+class ContentFeatureMatrix:
+    """
+    Columnar encoding of the content catalog for batched similarity scoring.
+
+    Genres and tags are stored as multi-hot boolean matrices laid out with one
+    row per vocabulary entry and one column per content item, so the overlap
+    of a single item with the whole catalog is the sum of a handful of rows.
+    Content type is stored as a categorical code, average rating and
+    popularity as dense float columns.
+
+    The scores produced here are identical to
+    src.utils.calculate_content_similarity for every pair.
+    """
+
+    def __init__(self, initial_capacity=64):
+        """Initialize an empty feature matrix
+
+        Args:
+            initial_capacity (int): Number of content rows to preallocate
+        """
+        capacity = max(1, initial_capacity)
+
+        self.content_ids = []  # row -> content_id
+        self.index = {}  # content_id -> row
+
+        self.genre_vocab = {}  # genre -> vocabulary row
+        self.tag_vocab = {}  # tag -> vocabulary row
+        self.type_vocab = {}  # content_type -> categorical code
+
+        self._genres = np.zeros((8, capacity), dtype=bool)
+        self._tags = np.zeros((8, capacity), dtype=bool)
+        self._genre_counts = np.zeros(capacity, dtype=np.int64)
+        self._tag_counts = np.zeros(capacity, dtype=np.int64)
+        self._types = np.zeros(capacity, dtype=np.int64)
+        self._ratings = np.zeros(capacity, dtype=np.float64)
+        self._popularity = np.zeros(capacity, dtype=np.float64)
+        self._operands = None  # float32 genre/tag copies for block_scores
+
+    def __len__(self):
+        return len(self.content_ids)
+
+    def __contains__(self, content_id):
+        return content_id in self.index
+
+    @property
+    def capacity(self):
+        """Number of content rows currently allocated"""
+        return self._types.shape[0]
+
+    def _grow_rows(self, needed):
+        """Grow per-content storage geometrically to hold `needed` rows"""
+        capacity = self.capacity
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+
+        def grow(array):
+            grown = np.zeros(array.shape[:-1] + (capacity,), dtype=array.dtype)
+            grown[..., :array.shape[-1]] = array
+            return grown
+
+        self._genres = grow(self._genres)
+        self._tags = grow(self._tags)
+        self._genre_counts = grow(self._genre_counts)
+        self._tag_counts = grow(self._tag_counts)
+        self._types = grow(self._types)
+        self._ratings = grow(self._ratings)
+        self._popularity = grow(self._popularity)
+
+    @staticmethod
+    def _encode(values, vocab, matrix):
+        """Map feature values to vocabulary rows, growing the matrix if needed
+
+        Returns:
+            tuple: (vocabulary rows, possibly reallocated matrix)
+        """
+        rows = set()
+        for value in values:
+            row = vocab.get(value)
+            if row is None:
+                row = len(vocab)
+                vocab[value] = row
+            rows.add(row)
+
+        if len(vocab) > matrix.shape[0]:
+            vocab_capacity = matrix.shape[0]
+            while vocab_capacity < len(vocab):
+                vocab_capacity *= 2
+            grown = np.zeros((vocab_capacity, matrix.shape[1]), dtype=bool)
+            grown[:matrix.shape[0]] = matrix
+            matrix = grown
+
+        return sorted(rows), matrix
+
+    def upsert(self, content):
+        """Insert or re-encode the feature row of a content item
+
+        Args:
+            content (Content): Content item to encode
+
+        Returns:
+            int: Row index of the content item
+        """
+        self._operands = None
+        row = self.index.get(content.content_id)
+        if row is None:
+            row = len(self.content_ids)
+            self._grow_rows(row + 1)
+            self.content_ids.append(content.content_id)
+            self.index[content.content_id] = row
+
+        genre_rows, self._genres = self._encode(content.genres, self.genre_vocab, self._genres)
+        tag_rows, self._tags = self._encode(content.tags, self.tag_vocab, self._tags)
+
+        self._genres[:, row] = False
+        self._genres[genre_rows, row] = True
+        self._genre_counts[row] = len(genre_rows)
+
+        self._tags[:, row] = False
+        self._tags[tag_rows, row] = True
+        self._tag_counts[row] = len(tag_rows)
+
+        type_code = self.type_vocab.setdefault(content.content_type, len(self.type_vocab))
+        self._types[row] = type_code
+        self._ratings[row] = content.get_average_rating()
+        self._popularity[row] = content.popularity_score
+
+        return row
+
+    def average_rating(self, content_id):
+        """Average rating a content item's row was encoded with
+
+        Args:
+            content_id (str): Content identifier
+
+        Returns:
+            float: Encoded average rating
+        """
+        return float(self._ratings[self.index[content_id]])
+
+    @staticmethod
+    def _jaccard(features, counts, row, rows, n):
+        """Jaccard similarity of one item's feature set against many items"""
+        members = np.flatnonzero(features[:, row])
+        if rows is None:
+            intersection = features[members, :n].sum(axis=0, dtype=np.int64)
+            other_counts = counts[:n]
+        else:
+            intersection = features[np.ix_(members, rows)].sum(axis=0, dtype=np.int64)
+            other_counts = counts[rows]
+
+        union = counts[row] + other_counts - intersection
+
+        # Both empty means perfect similarity, matching calculate_jaccard_similarity
+        similarity = np.ones(union.shape[0], dtype=np.float64)
+        nonempty = union > 0
+        similarity[nonempty] = intersection[nonempty] / union[nonempty]
+        return similarity
+
+    def scores(self, content_id, rows=None):
+        """Similarity of one content item against the catalog in one batch
+
+        Args:
+            content_id (str): Content identifier to score against
+            rows (np.ndarray, optional): Row indices to restrict scoring to.
+                Defaults to every row in the matrix.
+
+        Returns:
+            np.ndarray: Similarity scores aligned with `rows` (or with
+                `content_ids` when no rows are given)
+        """
+        row = self.index[content_id]
+        n = len(self.content_ids)
+
+        genre_sim = self._jaccard(self._genres, self._genre_counts, row, rows, n)
+        tag_sim = self._jaccard(self._tags, self._tag_counts, row, rows, n)
+        rating_term, pop_term, type_term = self._dense_terms(row, rows, n)
+
+        # Same weights and evaluation order as calculate_content_similarity
+        return 0.4 * genre_sim + 0.3 * tag_sim + rating_term + pop_term + type_term
+
+    def _block_operands(self):
+        """Genre and tag matrices as float32 (vocabulary, items) operands
+
+        Converted once and reused by block_scores until a row changes.
+        """
+        n = len(self.content_ids)
+        if self._operands is None or self._operands[0].shape[1] != n:
+            self._operands = (
+                self._genres[:len(self.genre_vocab), :n].astype(np.float32),
+                self._tags[:len(self.tag_vocab), :n].astype(np.float32)
+            )
+        return self._operands
+
+    @staticmethod
+    def _block_jaccard(operand, counts, rows, columns):
+        """Jaccard similarity of several items' feature sets against many items"""
+        # 0/1 products are exact small integers, so the float64 division
+        # rounds exactly like the integer version in _jaccard
+        others = operand if isinstance(columns, slice) else operand[:, columns]
+        intersection = (operand[:, rows].T @ others).astype(np.float64)
+        row_counts = counts[rows].astype(np.float64)
+        column_counts = counts[columns].astype(np.float64)
+        union = np.add.outer(row_counts, column_counts)
+        union -= intersection
+
+        with np.errstate(invalid="ignore"):
+            similarity = np.divide(intersection, union, out=intersection)
+        # Both empty (0/0) means perfect similarity
+        similarity[np.ix_(row_counts == 0, column_counts == 0)] = 1.0
+        return similarity
+
+    def block_scores(self, rows, columns=None):
+        """Similarity of several content items against the catalog in one batch
+
+        The overlaps of a block of items are one matrix product per feature
+        family, so scoring many items at once is much cheaper than calling
+        `scores` per item. Row i of the result equals
+        scores(content_ids[rows[i]], columns).
+
+        Args:
+            rows (np.ndarray): Row indices of the items to score
+            columns (np.ndarray, optional): Row indices to score against.
+                Defaults to every row in the matrix.
+
+        Returns:
+            np.ndarray: (len(rows), len(columns)) matrix of similarity scores
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        genres, tags = self._block_operands()
+        if columns is None:
+            columns = slice(0, len(self.content_ids))
+
+        # Same weights and evaluation order as scores(), computed in place
+        result = self._block_jaccard(genres, self._genre_counts, rows, columns)
+        result *= 0.4
+        term = self._block_jaccard(tags, self._tag_counts, rows, columns)
+        term *= 0.3
+        result += term
+
+        for values in (self._ratings, self._popularity):
+            np.subtract(values[rows, None], values[columns], out=term)
+            np.abs(term, out=term)
+            if values is self._ratings:
+                term /= 5.0  # Normalize to 0-1
+            np.subtract(1, term, out=term)
+            term *= 0.1
+            result += term
+
+        np.equal(self._types[rows, None], self._types[columns], out=term, casting="unsafe")
+        term *= 0.1
+        result += term
+        return result
+
+    def floor_scores(self, content_id, rows=None):
+        """Similarity of one content item against items sharing no genre or tag
+
+        With both Jaccard terms at zero only the rating, popularity and type
+        terms remain, so these scores equal `scores` for such items without
+        touching the genre and tag matrices.
+
+        Args:
+            content_id (str): Content identifier to score against
+            rows (np.ndarray, optional): Row indices to restrict scoring to
+
+        Returns:
+            np.ndarray: Floor scores aligned with `rows`
+        """
+        row = self.index[content_id]
+        rating_term, pop_term, type_term = self._dense_terms(row, rows, len(self.content_ids))
+        return rating_term + pop_term + type_term
+
+    def _dense_terms(self, row, rows, n):
+        """Weighted rating, popularity and type terms of the similarity score"""
+        if rows is None:
+            ratings = self._ratings[:n]
+            popularity = self._popularity[:n]
+            types = self._types[:n]
+        else:
+            ratings = self._ratings[rows]
+            popularity = self._popularity[rows]
+            types = self._types[rows]
+
+        rating_diff = np.abs(self._ratings[row] - ratings) / 5.0  # Normalize to 0-1
+        pop_diff = np.abs(self._popularity[row] - popularity)
+        type_sim = (types == self._types[row]).astype(np.float64)
+
+        return 0.1 * (1 - rating_diff), 0.1 * (1 - pop_diff), 0.1 * type_sim
+
+    def similarity(self, content_id1, content_id2):
+        """Similarity between two content items
+
+        Args:
+            content_id1 (str): First content identifier
+            content_id2 (str): Second content identifier
+
+        Returns:
+            float: Similarity score
+        """
+        rows = np.array([self.index[content_id2]])
+        return float(self.scores(content_id1, rows)[0])
@@ -0,0 +1,96 @@
+from collections import defaultdict
+
+
+class InvertedIndex:
+    """
+    Inverted index from genres and tags to the content items that carry them.
+
+    Used for candidate generation: only items sharing at least one genre or
+    tag with something the user watched can have a non-zero Jaccard term in
+    the content similarity score. Items with no genres (or no tags) are
+    indexed under an "empty" key, because two empty sets count as a perfect
+    Jaccard match.
+    """
+
+    EMPTY = None  # Key used for content with no genres or no tags
+
+    def __init__(self):
+        """Initialize an empty index"""
+        self.postings = defaultdict(set)  # (field, value) -> set of content_ids
+        self._keys = {}  # content_id -> frozenset of indexed keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, content_id):
+        return content_id in self._keys
+
+    @classmethod
+    def keys_for(cls, content):
+        """Index keys for a content item's genres and tags
+
+        Args:
+            content (Content): Content item
+
+        Returns:
+            frozenset: Set of (field, value) keys
+        """
+        keys = set()
+        for field, values in (("genre", content.genres), ("tag", content.tags)):
+            if values:
+                keys.update((field, value) for value in values)
+            else:
+                keys.add((field, cls.EMPTY))
+        return frozenset(keys)
+
+    def index(self, content):
+        """Add a content item or re-index it after its genres/tags changed
+
+        Args:
+            content (Content): Content item to index
+        """
+        content_id = content.content_id
+        old_keys = self._keys.get(content_id, frozenset())
+        new_keys = self.keys_for(content)
+
+        for key in old_keys - new_keys:
+            postings = self.postings[key]
+            postings.discard(content_id)
+            if not postings:
+                del self.postings[key]
+
+        for key in new_keys - old_keys:
+            self.postings[key].add(content_id)
+
+        self._keys[content_id] = new_keys
+
+    def remove(self, content_id):
+        """Remove a content item from the index
+
+        Args:
+            content_id (str): Content identifier
+        """
+        for key in self._keys.pop(content_id, frozenset()):
+            postings = self.postings[key]
+            postings.discard(content_id)
+            if not postings:
+                del self.postings[key]
+
+    def candidates(self, content_ids):
+        """Content sharing at least one genre or tag with the given items
+
+        Args:
+            content_ids (iterable): Content identifiers to expand
+
+        Returns:
+            set: Content IDs with overlapping genres or tags (including the
+                given items themselves)
+        """
+        keys = set()
+        for content_id in content_ids:
+            keys.update(self._keys.get(content_id, ()))
+
+        candidates = set()
+        for key in keys:
+            candidates.update(self.postings.get(key, ()))
+        return candidates
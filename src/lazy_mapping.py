@@ -0,0 +1,64 @@
+from collections.abc import MutableMapping
+
+# Placeholder for values not built yet
+_UNLOADED = object()
+
+
+class LazyMapping(MutableMapping):
+    """
+    Ordered mapping whose values are built on first access.
+
+    Every key is known up front, but load(key) is only called the first time
+    a key's value is read; the value is kept afterwards. Membership tests,
+    len() and iterating over keys never build values. Keys assigned later
+    behave like entries of a plain dict.
+    """
+
+    def __init__(self, keys, load):
+        """Initialize the mapping
+
+        Args:
+            keys (iterable): Keys, in iteration order
+            load (callable): Builds the value of a key
+        """
+        self._values = dict.fromkeys(keys, _UNLOADED)
+        self._load = load
+
+    def __getitem__(self, key):
+        value = self._values[key]
+        if value is _UNLOADED:
+            value = self._values[key] = self._load(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        del self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def unload(self, key):
+        """Drop a built value so the next access builds it again
+
+        Args:
+            key: Key whose value is dropped; it stays in the mapping
+        """
+        if key not in self._values:
+            raise KeyError(key)
+        self._values[key] = _UNLOADED
+
+    def loaded(self):
+        """Number of values built so far
+
+        Returns:
+            int: Count of keys whose value exists
+        """
+        return sum(value is not _UNLOADED for value in self._values.values())
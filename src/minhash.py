@@ -0,0 +1,217 @@
+import zlib
+import numpy as np
+
+# Hash values are taken modulo the Mersenne prime 2^31 - 1, so products of two
+# values stay below 2^62 and never overflow uint64 arithmetic
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def stable_hash(value):
+    """32-bit hash of a value that is stable across processes and runs
+    
+    Args:
+        value: Value to hash (converted with str())
+        
+    Returns:
+        int: Unsigned 32-bit hash
+    """
+    return zlib.crc32(str(value).encode("utf-8"))
+
+
+class MinHasher:
+    """
+    MinHash signatures for estimating Jaccard similarity between sets.
+    
+    Each of the `num_perm` universal hash functions h(x) = (a * x + b) mod p
+    simulates a random permutation; the fraction of positions where two
+    signatures agree estimates the Jaccard similarity of the underlying sets.
+    Empty sets get a signature filled with p, which no real hash can produce.
+    Signatures are uint32 arrays, since every value is at most p.
+    """
+    
+    def __init__(self, num_perm=64, seed=42):
+        """Initialize the hash family
+        
+        Args:
+            num_perm (int): Number of hash functions (signature length)
+            seed (int): Seed for drawing the hash coefficients
+        """
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.seed = seed
+        self._a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        
+        # Read-only empty signature that sets without elements can share
+        self.shared_empty_signature = self.empty_signature()
+        self.shared_empty_signature.flags.writeable = False
+        
+    def __eq__(self, other):
+        if not isinstance(other, MinHasher):
+            return NotImplemented
+        return (self.num_perm, self.seed) == (other.num_perm, other.seed)
+    
+    def __hash__(self):
+        return hash((self.num_perm, self.seed))
+        
+    def empty_signature(self):
+        """Signature of the empty set
+        
+        Returns:
+            np.ndarray: uint32 array of length num_perm
+        """
+        return np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint32)
+    
+    def hash_values(self, items):
+        """Hash every item under every hash function
+        
+        Args:
+            items (list): Items to hash
+            
+        Returns:
+            np.ndarray: uint32 array of shape (len(items), num_perm)
+        """
+        base = np.fromiter((stable_hash(item) for item in items),
+                           dtype=np.uint64, count=len(items)) % MERSENNE_PRIME
+        return ((np.outer(base, self._a) + self._b) % MERSENNE_PRIME).astype(np.uint32)
+    
+    def update(self, signature, item):
+        """Add one item to a signature in place
+        
+        Args:
+            signature (np.ndarray): Signature to update
+            item: Element added to the underlying set
+        """
+        base = np.uint64(stable_hash(item) % MERSENNE_PRIME)
+        hashes = (self._a * base + self._b) % MERSENNE_PRIME
+        np.minimum(signature, hashes.astype(np.uint32), out=signature)
+    
+    def signature(self, items):
+        """MinHash signature of a set of items
+        
+        Args:
+            items (iterable): Set elements
+            
+        Returns:
+            np.ndarray: uint32 array of length num_perm
+        """
+        items = list(set(items))
+        if not items:
+            return self.empty_signature()
+        return self.hash_values(items).min(axis=0)
+
+
+def estimate_jaccard(signature1, signature2):
+    """Estimate the Jaccard similarity of two sets from their MinHash signatures
+    
+    Args:
+        signature1 (np.ndarray): First signature
+        signature2 (np.ndarray): Second signature
+        
+    Returns:
+        float: Estimated similarity, 0.0 if either set is empty
+    """
+    if signature1[0] == MERSENNE_PRIME or signature2[0] == MERSENNE_PRIME:
+        return 0.0
+    return float(np.mean(signature1 == signature2))
+
+
+# Hash family shared by user profiles unless the engine configures another
+DEFAULT_MINHASHER = MinHasher()
+
+
+class SignatureMatrix:
+    """
+    MinHash signatures of many sets stored as rows of one array.
+    
+    Comparing one signature against every row is a single vectorized
+    equality test, which estimates Jaccard similarity against all sets at
+    once. Rows grow geometrically as keys are added.
+    """
+    
+    def __init__(self, minhasher, initial_capacity=64):
+        """Initialize an empty signature matrix
+        
+        Args:
+            minhasher (MinHasher): Hash family the signatures were built with
+            initial_capacity (int): Number of rows to preallocate
+        """
+        self.minhasher = minhasher
+        self.keys = []  # row -> key
+        self.index = {}  # key -> row
+        self._signatures = np.full((max(1, initial_capacity), minhasher.num_perm),
+                                   MERSENNE_PRIME, dtype=np.uint32)
+        
+    def __len__(self):
+        return len(self.keys)
+    
+    def __contains__(self, key):
+        return key in self.index
+    
+    def update(self, key, signature):
+        """Store the current signature for a key
+        
+        Args:
+            key: Row key (e.g. a user ID)
+            signature (np.ndarray): MinHash signature
+        """
+        row = self.index.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == self._signatures.shape[0]:
+                grown = np.full((2 * row, self.minhasher.num_perm), MERSENNE_PRIME, dtype=np.uint32)
+                grown[:row] = self._signatures
+                self._signatures = grown
+            self.keys.append(key)
+            self.index[key] = row
+        self._signatures[row] = signature
+        
+    def jaccard(self, signature, keys=None):
+        """Estimate Jaccard similarity of one set against many
+        
+        Sets that are empty on either side score 0.0.
+        
+        Args:
+            signature (np.ndarray): MinHash signature to compare
+            keys (list, optional): Keys to compare against. Defaults to every row.
+            
+        Returns:
+            np.ndarray: Estimated similarities aligned with keys (or rows)
+        """
+        if keys is None:
+            signatures = self._signatures[:len(self.keys)]
+        else:
+            rows = np.fromiter((self.index[key] for key in keys), dtype=np.int64, count=len(keys))
+            signatures = self._signatures[rows]
+            
+        if signature[0] == MERSENNE_PRIME:
+            return np.zeros(signatures.shape[0])
+            
+        estimates = (signatures == signature).mean(axis=1)
+        estimates[signatures[:, 0] == MERSENNE_PRIME] = 0.0
+        return estimates
+
+    def jaccard_matrix(self, signatures, keys, block_size=1024):
+        """Estimate Jaccard similarity of several sets against many
+        
+        Sets that are empty on either side score 0.0. Keys are compared in
+        blocks to bound the size of the equality test.
+        
+        Args:
+            signatures (np.ndarray): (n, num_perm) MinHash signatures to compare
+            keys (list): Keys to compare against
+            block_size (int): Keys compared per block
+            
+        Returns:
+            np.ndarray: (n, len(keys)) estimated similarities
+        """
+        rows = np.fromiter((self.index[key] for key in keys), dtype=np.int64, count=len(keys))
+        others = self._signatures[rows]
+        
+        estimates = np.empty((signatures.shape[0], len(keys)))
+        for start in range(0, len(keys), block_size):
+            block = others[start:start + block_size]
+            estimates[:, start:start + block_size] = (signatures[:, None, :] == block[None, :, :]).mean(axis=2)
+        estimates[signatures[:, 0] == MERSENNE_PRIME] = 0.0
+        estimates[:, others[:, 0] == MERSENNE_PRIME] = 0.0
+        return estimates
@@ -0,0 +1,182 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.utils import top_k_indices
+
+
+class ItemNeighborTable:
+    """
+    Precomputed top-N most similar items for every content item.
+
+    Neighbour lists are stored as two (rows, N) arrays over the rows of a
+    ContentFeatureMatrix: neighbour row indices (padded with -1) and their
+    similarity scores (padded with -inf), highest score first with ties in
+    catalog order. Recommending from the table only has to merge the lists
+    of the watched items, O(history x N), instead of scoring the catalog.
+
+    build() scores blocks of items against the catalog with one matrix
+    product per block, spread over a thread pool (NumPy releases the GIL in
+    the heavy kernels). refresh() updates the table after items were added
+    or re-encoded without rebuilding it.
+    """
+
+    def __init__(self, features, size=50):
+        """Initialize an empty table
+
+        Args:
+            features (ContentFeatureMatrix): Feature matrix to score with
+            size (int): Number of neighbours kept per item
+        """
+        if size <= 0:
+            raise ValueError("Neighbour table size must be positive")
+
+        self.features = features
+        self.size = size
+        self.built = False
+        self._rows = 0  # feature rows covered by the table
+        self._neighbors = np.full((0, size), -1, dtype=np.int64)
+        self._scores = np.full((0, size), -np.inf)
+        self._counts = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return self._rows
+
+    def _grow(self, needed):
+        """Grow the table geometrically to hold `needed` rows"""
+        capacity = self._counts.size
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity)
+
+        neighbors = np.full((capacity, self.size), -1, dtype=np.int64)
+        neighbors[:self._counts.size] = self._neighbors
+        scores = np.full((capacity, self.size), -np.inf)
+        scores[:self._counts.size] = self._scores
+        counts = np.zeros(capacity, dtype=np.int64)
+        counts[:self._counts.size] = self._counts
+
+        self._neighbors, self._scores, self._counts = neighbors, scores, counts
+
+    def _fill_block(self, rows):
+        """Recompute the neighbour lists of a block of rows"""
+        n = len(self.features)
+        k = min(self.size, n - 1)
+        scores = self.features.block_scores(rows)
+        scores[np.arange(rows.size), rows] = -np.inf  # never your own neighbour
+
+        for i, row in enumerate(rows.tolist()):
+            top = top_k_indices(scores[i], k)
+            self._neighbors[row] = -1
+            self._scores[row] = -np.inf
+            self._neighbors[row, :k] = top
+            self._scores[row, :k] = scores[i, top]
+            self._counts[row] = k
+
+    def _fill(self, rows, workers=None, block_size=128):
+        """Recompute the neighbour lists of the given rows in parallel blocks"""
+        blocks = [rows[start:start + block_size] for start in range(0, rows.size, block_size)]
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(blocks) <= 1:
+            for block in blocks:
+                self._fill_block(block)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Blocks write disjoint rows, so they can run concurrently
+            list(pool.map(self._fill_block, blocks))
+
+    def build(self, workers=None, block_size=128):
+        """Compute the neighbour lists of every item from scratch
+
+        Args:
+            workers (int, optional): Number of threads. Defaults to the
+                number of CPUs.
+            block_size (int): Items scored per matrix product
+        """
+        n = len(self.features)
+        self._grow(n)
+        self._rows = n
+        self._fill(np.arange(n), workers, block_size)
+        self.built = True
+
+    def refresh(self, content_ids, workers=None):
+        """Update the table after content items were added or re-encoded
+
+        Similarity is symmetric, so the changed items' scores against the
+        catalog are also their scores in every other item's list. Lists that
+        held a changed item are recomputed, since it may have dropped out;
+        every other list only checks whether a changed item now ranks in it.
+
+        Args:
+            content_ids (iterable): Content identifiers whose feature rows changed
+            workers (int, optional): Number of threads for recomputed lists
+        """
+        if not self.built:
+            self.build(workers)
+            return
+
+        index = self.features.index
+        old_rows = self._rows
+        n = len(self.features)
+        self._grow(n)
+        self._rows = n
+
+        # Rows added since the last build or refresh count as changed
+        changed = {index[content_id] for content_id in content_ids if content_id in index}
+        changed.update(range(old_rows, n))
+        if not changed:
+            return
+        changed = np.array(sorted(changed), dtype=np.int64)
+
+        holds_changed = np.isin(self._neighbors[:old_rows], changed).any(axis=1)
+        recompute = np.union1d(np.flatnonzero(holds_changed), changed)
+        if recompute.size * 2 >= n:
+            self._fill(np.arange(n), workers)
+            return
+
+        stable = np.ones(n, dtype=bool)
+        stable[recompute] = False
+        stable_rows = np.flatnonzero(stable)
+
+        k = min(self.size, n - 1)
+        changed_scores = self.features.block_scores(changed)
+        for changed_row, scores in zip(changed.tolist(), changed_scores):
+            counts = self._counts[stable_rows]
+            last = np.maximum(counts - 1, 0)
+            last_scores = self._scores[stable_rows, last]
+            last_rows = self._neighbors[stable_rows, last]
+            candidate_scores = scores[stable_rows]
+
+            # Ranks if there is room or it beats the current last neighbour
+            ranks = ((counts < k) | (candidate_scores > last_scores)
+                     | ((candidate_scores == last_scores) & (changed_row < last_rows)))
+            for row, score in zip(stable_rows[ranks].tolist(), candidate_scores[ranks].tolist()):
+                self._insert(row, changed_row, score, k)
+
+        self._fill(recompute, workers)
+
+    def _insert(self, row, neighbor, score, k):
+        """Insert one neighbour into a row's list, keeping the top k"""
+        count = self._counts[row]
+        neighbors = np.append(self._neighbors[row, :count], neighbor)
+        scores = np.append(self._scores[row, :count], score)
+        order = np.lexsort((neighbors, -scores))[:k]
+
+        self._neighbors[row, :order.size] = neighbors[order]
+        self._scores[row, :order.size] = scores[order]
+        self._counts[row] = order.size
+
+    def neighbors(self, content_id):
+        """Neighbour list of a content item
+
+        Args:
+            content_id (str): Content identifier
+
+        Returns:
+            tuple: (neighbour rows, similarity scores), highest score first
+        """
+        row = self.features.index[content_id]
+        count = self._counts[row]
+        return self._neighbors[row, :count], self._scores[row, :count]
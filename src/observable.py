@@ -0,0 +1,229 @@
+from collections.abc import MutableSequence
+from contextlib import contextmanager
+
+
+class TrackedAttribute:
+    """Attribute that notifies the owner's listeners whenever it is reassigned"""
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.private_name = "_" + name
+        
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return getattr(instance, self.private_name)
+    
+    def __set__(self, instance, value):
+        setattr(instance, self.private_name, self.encode(value))
+        instance._field_changed(self.name)
+        
+    def encode(self, value):
+        """Convert an assigned value to its stored form"""
+        return value
+
+
+class InternedSequence(MutableSequence):
+    """
+    List-like view of an interned attribute that writes changes back.
+    
+    Reads decode the owner's stored IDs; every mutation (append, extend,
+    item assignment, remove, ...) reassigns the whole attribute, so the
+    owner's listeners are notified as if a new list had been assigned.
+    Compares equal to lists and tuples holding the same values.
+    """
+    
+    __slots__ = ("_owner", "_attribute")
+    
+    def __init__(self, owner, attribute):
+        self._owner = owner
+        self._attribute = attribute
+    
+    def _ids(self):
+        return getattr(self._owner, self._attribute.private_name)
+    
+    def _values(self):
+        values = self._attribute.vocabulary.values
+        return [values[value_id] for value_id in self._ids()]
+    
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return self._values()[position]
+        return self._attribute.vocabulary.values[self._ids()[position]]
+    
+    def __setitem__(self, position, value):
+        values = self._values()
+        values[position] = value
+        setattr(self._owner, self._attribute.name, values)
+    
+    def __delitem__(self, position):
+        values = self._values()
+        del values[position]
+        setattr(self._owner, self._attribute.name, values)
+    
+    def insert(self, position, value):
+        values = self._values()
+        values.insert(position, value)
+        setattr(self._owner, self._attribute.name, values)
+    
+    def extend(self, values):
+        setattr(self._owner, self._attribute.name, self._values() + list(values))
+        
+    def reverse(self):
+        setattr(self._owner, self._attribute.name, self._values()[::-1])
+        
+    def __iter__(self):
+        return iter(self._values())
+    
+    def __len__(self):
+        return len(self._ids())
+    
+    def __eq__(self, other):
+        if isinstance(other, (InternedSequence, list, tuple)):
+            return self._values() == list(other)
+        return NotImplemented
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return repr(self._values())
+
+
+class InternedListAttribute(TrackedAttribute):
+    """
+    Tracked attribute holding a sequence of strings as interned integer IDs.
+    
+    Assigned sequences are stored as a tuple of vocabulary IDs, in order and
+    with duplicates kept, and read back as an InternedSequence, so list
+    methods such as append() keep working and notify listeners. The raw
+    IDs are available as the "<name>_ids" attribute.
+    """
+    
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.private_name = name[:-1] + "_ids"  # genres -> genre_ids
+    
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return InternedSequence(instance, self)
+    
+    def encode(self, value):
+        return tuple([self.vocabulary.intern(item) for item in value])
+
+
+class FieldChanges(set):
+    """
+    Set of changed field names that also remembers which keys of keyed
+    fields changed.
+    
+    A field such as ratings can change one key at a time. keys maps each
+    such field to the set of keys changed in it. If a field is missing
+    from keys, it changed as a whole, for example by reassignment.
+    """
+    
+    __slots__ = ("keys",)
+    
+    def __init__(self, names=()):
+        super().__init__(names)
+        self.keys = {}
+        
+    def add_change(self, name, key=None):
+        """Record a change to a whole field, or to one key of it
+        
+        Args:
+            name (str): Field name
+            key (hashable, optional): Changed key, None if the whole field changed
+        """
+        if key is None:
+            self.add(name)
+            self.keys.pop(name, None)
+        elif name not in self:
+            self.add(name)
+            self.keys[name] = {key}
+        elif name in self.keys:
+            self.keys[name].add(key)
+            
+    def update_changes(self, changes):
+        """Merge in changed fields, keeping their keys when they have any
+        
+        Args:
+            changes (set): Changed field names, a FieldChanges to merge keys too
+        """
+        keys = getattr(changes, "keys", {})
+        for name in changes:
+            if name in keys:
+                for key in keys[name]:
+                    self.add_change(name, key)
+            else:
+                self.add_change(name)
+
+
+class Observable:
+    """
+    Base class for model objects whose changes the engine needs to follow.
+    
+    Listeners are called as listener(obj, fields) where fields is a
+    FieldChanges set of changed attribute names. Changes made inside
+    batch_changes() are delivered as a single notification.
+    """
+    
+    __slots__ = ("_listeners", "_pending_changes")
+    
+    def __init__(self):
+        self._listeners = ()  # becomes a list once a listener is added
+        self._pending_changes = None
+        
+    def add_listener(self, listener):
+        """Register a callback for changes to tracked fields
+        
+        Args:
+            listener (callable): Called as listener(obj, fields)
+        """
+        if listener not in self._listeners:
+            self._listeners = list(self._listeners) + [listener]
+            
+    def remove_listener(self, listener):
+        """Unregister a previously added listener
+        
+        Args:
+            listener (callable): Listener to remove
+        """
+        if listener in self._listeners:
+            self._listeners = [other for other in self._listeners if other != listener]
+            
+    @contextmanager
+    def batch_changes(self):
+        """Collect changes made inside the block into one notification"""
+        if self._pending_changes is not None:
+            # Already batching, the outer block notifies
+            yield
+            return
+            
+        self._pending_changes = FieldChanges()
+        try:
+            yield
+        finally:
+            # Notify even if the block failed part-way, earlier changes stand
+            changed, self._pending_changes = self._pending_changes, None
+            if changed:
+                self._notify(changed)
+            
+    def _field_changed(self, name, key=None):
+        """Record or dispatch a change to a tracked field, or to one key of it"""
+        if self._pending_changes is not None:
+            self._pending_changes.add_change(name, key)
+            return
+            
+        changes = FieldChanges((name,))
+        if key is not None:
+            changes.keys[name] = {key}
+        self._notify(changes)
+        
+    def _notify(self, fields):
+        """Dispatch changed field names to all listeners"""
+        for listener in self._listeners:
+            listener(self, fields)
@@ -0,0 +1,71 @@
+from src.cache import BoundedCache
+
+
+class PairCache(BoundedCache):
+    """
+    Bounded cache of values keyed by (id1, id2) pairs with a per-id adjacency map.
+    
+    Besides the pair -> value entries, every id maps to the set of ids it is
+    cached together with. Invalidating one id therefore touches only the
+    entries involving it, O(degree), instead of scanning every cached pair.
+    The adjacency map is kept in step with LRU eviction and expiry.
+    """
+    
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None, **kwargs):
+        """Initialize an empty cache
+        
+        Args:
+            max_entries (int, optional): Maximum number of entries
+            max_bytes (int, optional): Approximate memory budget in bytes
+            ttl (float, optional): Seconds an entry stays valid after it is set
+        """
+        self._adjacency = {}  # id -> set of partner ids
+        super().__init__(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl, **kwargs)
+        
+    def _entry_added(self, key):
+        first, second = key
+        self._adjacency.setdefault(first, set()).add(second)
+        self._adjacency.setdefault(second, set()).add(first)
+        
+    def _entry_removed(self, key):
+        first, second = key
+        self._unlink(first, second)
+        self._unlink(second, first)
+        
+    def _unlink(self, member, partner):
+        """Remove partner from member's adjacency set"""
+        partners = self._adjacency.get(member)
+        if partners is not None:
+            partners.discard(partner)
+            if not partners:
+                del self._adjacency[member]
+                
+    def partners(self, member):
+        """Ids that have a cached entry together with an id
+        
+        Args:
+            member: Identifier
+            
+        Returns:
+            set: Partner identifiers (a copy)
+        """
+        return set(self._adjacency.get(member, ()))
+    
+    def invalidate(self, member):
+        """Drop every entry involving an id
+        
+        Args:
+            member: Identifier whose entries are dropped
+            
+        Returns:
+            int: Number of entries dropped
+        """
+        dropped = 0
+        for partner in self.partners(member):
+            # Entries are stored under one of the two orders
+            for key in ((member, partner), (partner, member)):
+                if key in self._entries:
+                    self._remove(key)
+                    dropped += 1
+                    break
+        return dropped
@@ -0,0 +1,219 @@
+import gc
+import multiprocessing
+import os
+from itertools import islice
+
+import numpy as np
+
+from src.shared_arrays import SharedArrays
+from src.viewing_history import ViewingHistory
+
+# Engine of a worker process, inherited from the parent when the pool forks
+_worker_engine = None
+
+
+def _init_worker(engine):
+    global _worker_engine
+    _worker_engine = engine
+
+
+def _recommend_chunk(task):
+    """Score one chunk of users in a worker process
+
+    Args:
+        task (tuple): (user_ids, algorithm, limit, fusion)
+
+    Returns:
+        list: (user_id, recommended content IDs) pairs
+    """
+    user_ids, algorithm, limit, fusion = task
+    return [(user_id, [content.content_id for content in recommendations])
+            for user_id, recommendations in _worker_engine.generate_recommendations_batch(
+                user_ids, algorithm, limit, chunk_size=len(user_ids), fusion=fusion)]
+
+
+class ParallelRecommendationRunner:
+    """
+    Fans batch recommendation requests out over a pool of worker processes.
+
+    While the runner is open, the engine's NumPy model state is moved into
+    one shared memory segment and the engine is switched to read-only views
+    of it. That state is the content feature matrix, the item neighbour
+    table, the user preference and MinHash matrices and every viewing
+    history. Workers are forked with the engine already in memory, so
+    nothing is pickled, and they all read the same physical pages instead
+    of holding a copy each. Only user ID chunks and result ID lists cross
+    process boundaries.
+
+    The model must not change while the runner is open: writes to the
+    shared arrays raise ValueError. close() gives the engine private copies
+    again.
+
+    Usage:
+        with ParallelRecommendationRunner(engine, workers=8) as runner:
+            for user_id, recommendations in runner.run(user_ids):
+                ...
+    """
+
+    def __init__(self, engine, workers=None, chunk_size=256):
+        """Initialize the runner
+
+        Args:
+            engine (RecommendationEngine): Engine to score with
+            workers (int, optional): Number of worker processes. Defaults to
+                the number of CPUs.
+            chunk_size (int): Users per task sent to a worker
+        """
+        self.engine = engine
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._pool = None
+        self._shared = None
+        self._bindings = []  # (owner, attribute) pairs pointing at shared views
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def parallel(self):
+        """Whether results come from worker processes
+
+        Pools need the fork start method to inherit the engine; elsewhere,
+        or with a single worker, the runner scores in-process.
+        """
+        return self.workers > 1 and "fork" in multiprocessing.get_all_start_methods()
+
+    def _model_attributes(self):
+        """Array attributes of the engine's model, other than viewing histories
+
+        Returns:
+            list: (owner, attribute name) pairs
+        """
+        engine = self.engine
+        features = engine.content_features
+        attributes = [(features, name) for name in (
+            "_genres", "_tags", "_genre_counts", "_tag_counts", "_types", "_ratings", "_popularity"
+        )]
+        attributes.append((engine.preference_matrix, "_rows"))
+        attributes.append((engine.history_signatures, "_signatures"))
+
+        table = engine.item_neighbors
+        if table is not None:
+            attributes.extend((table, name) for name in ("_neighbors", "_scores", "_counts"))
+        return attributes
+
+    def start(self):
+        """Bring lazy model state up to date, share it and start the workers"""
+        if self._shared is not None:
+            return
+
+        engine = self.engine
+        engine._sync_content_features()
+        if engine.item_neighbors is not None and not engine.item_neighbors.built:
+            engine.item_neighbors.build()
+        refresh = getattr(engine.neighbor_index, "refresh", None)
+        if refresh is not None:
+            refresh()
+
+        if not self.parallel:
+            return
+
+        features = engine.content_features
+        features._operands = None
+        genres, tags = features._block_operands()
+
+        arrays = {"operand_genres": genres, "operand_tags": tags}
+        attributes = self._model_attributes()
+        for position, (owner, name) in enumerate(attributes):
+            arrays[f"model_{position}"] = getattr(owner, name)
+
+        # Histories are concatenated per column, so the segment layout stays
+        # small however many users there are
+        histories = [user.viewing_history for user in engine.users.values() if len(user.viewing_history)]
+        bounds = np.cumsum([0] + [len(history) for history in histories]).tolist()
+        for name, empty in ViewingHistory._EMPTY.items():
+            arrays[f"history{name}"] = (np.concatenate([getattr(history, name)[:len(history)] for history in histories])
+                                        if histories else empty)
+
+        self._shared = SharedArrays(arrays)
+        shared = self._shared
+
+        for position, (owner, name) in enumerate(attributes):
+            self._bind(owner, name, shared[f"model_{position}"])
+        for name in ViewingHistory._EMPTY:
+            column = shared[f"history{name}"]
+            for history, start, stop in zip(histories, bounds, bounds[1:]):
+                self._bind(history, name, column[start:stop])
+        features._operands = (shared["operand_genres"], shared["operand_tags"])
+
+        # Objects that exist now never need collecting in the workers; keeping
+        # the collector off them avoids copying their pages on write
+        gc.freeze()
+        try:
+            context = multiprocessing.get_context("fork")
+            self._pool = context.Pool(self.workers, initializer=_init_worker, initargs=(engine,))
+        finally:
+            gc.unfreeze()
+
+    def _bind(self, owner, name, view):
+        """Point an attribute at a shared view, remembering it for close()"""
+        self._bindings.append((owner, name))
+        setattr(owner, name, view)
+
+    def run(self, user_ids, algorithm="hybrid", limit=10, fusion=None):
+        """Generate recommendations for many users in parallel
+
+        Args:
+            user_ids (iterable): User identifiers, consumed lazily
+            algorithm (str): One of 'content_based', 'collaborative', or 'hybrid'
+            limit (int): Maximum number of recommendations per user
+            fusion (str, optional): Hybrid fusion, one of 'rank', 'score' or 'rrf'
+
+        Yields:
+            tuple: (user_id, list of recommended content objects), in input order
+        """
+        self.start()
+        if self._pool is None:
+            yield from self.engine.generate_recommendations_batch(user_ids, algorithm, limit, self.chunk_size,
+                                                                  fusion)
+            return
+
+        algorithms = ("content_based", "collaborative", "hybrid")
+        if algorithm not in algorithms:
+            raise ValueError(f"Algorithm {algorithm} not supported. Use one of: {list(algorithms)}")
+        if algorithm == "hybrid":
+            fusion = self.engine._hybrid_fusion(fusion)
+
+        content_database = self.engine.content_database
+        for results in self._pool.imap(_recommend_chunk, self._tasks(iter(user_ids), algorithm, limit, fusion)):
+            for user_id, recommendation_ids in results:
+                yield user_id, [content_database[content_id] for content_id in recommendation_ids
+                                if content_id in content_database]
+
+    def _tasks(self, user_ids, algorithm, limit, fusion):
+        """Split user IDs into worker tasks of chunk_size users"""
+        while True:
+            chunk = list(islice(user_ids, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk, algorithm, limit, fusion
+
+    def close(self):
+        """Stop the workers and give the engine private copies of its model"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+        for owner, name in self._bindings:
+            setattr(owner, name, np.array(getattr(owner, name)))
+        self._bindings = []
+
+        if self._shared is not None:
+            self.engine.content_features._operands = None
+            self._shared.close()
+            self._shared = None
@@ -0,0 +1,114 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from itertools import count, islice
+
+
+class PopularityIndex:
+    """
+    Content ranked by popularity score, maintained incrementally.
+
+    Keeps one sorted list of (-popularity, sequence, content_id) keys for the
+    whole catalog plus one per content type and per genre, so popular lists
+    are read in O(limit) and an update costs a binary search and a list
+    insert per list the item appears in. The sequence number records when an
+    item was first indexed, so ties rank in catalog order.
+    """
+
+    def __init__(self):
+        """Initialize an empty index"""
+        self._ranking = []  # sorted keys for the whole catalog
+        self._by_type = defaultdict(list)  # content_type -> sorted keys
+        self._by_genre = defaultdict(list)  # genre -> sorted keys
+        self._entries = {}  # content_id -> (key, content_type, genres)
+        self._sequence = {}  # content_id -> first-indexed sequence number
+        self._counter = count()
+
+    def __len__(self):
+        return len(self._ranking)
+
+    def __contains__(self, content_id):
+        return content_id in self._entries
+
+    @staticmethod
+    def _discard(ranking, key):
+        """Remove a key from a sorted list"""
+        position = bisect_left(ranking, key)
+        if position < len(ranking) and ranking[position] == key:
+            del ranking[position]
+
+    def update(self, content):
+        """Insert a content item or reposition it after its metadata changed
+
+        Args:
+            content (Content): Content item to index
+        """
+        content_id = content.content_id
+        if content_id not in self._sequence:
+            self._sequence[content_id] = next(self._counter)
+
+        key = (-content.popularity_score, self._sequence[content_id], content_id)
+        genres = frozenset(content.genres)
+        entry = (key, content.content_type, genres)
+
+        if self._entries.get(content_id) == entry:
+            return
+
+        self.remove(content_id)
+
+        insort(self._ranking, key)
+        insort(self._by_type[content.content_type], key)
+        for genre in genres:
+            insort(self._by_genre[genre], key)
+
+        self._entries[content_id] = entry
+
+    def remove(self, content_id):
+        """Remove a content item from the index
+
+        Args:
+            content_id (str): Content identifier
+        """
+        entry = self._entries.pop(content_id, None)
+        if entry is None:
+            return
+
+        key, content_type, genres = entry
+        self._discard(self._ranking, key)
+        self._discard(self._by_type[content_type], key)
+        if not self._by_type[content_type]:
+            del self._by_type[content_type]
+        for genre in genres:
+            self._discard(self._by_genre[genre], key)
+            if not self._by_genre[genre]:
+                del self._by_genre[genre]
+
+    def top(self, limit=10, content_type=None, genre=None):
+        """Most popular content, optionally filtered by type and/or genre
+
+        Args:
+            limit (int): Maximum number of items to return
+            content_type (str, optional): Only include this content type
+            genre (str, optional): Only include content with this genre
+
+        Returns:
+            list: Content IDs, most popular first
+        """
+        if limit <= 0:
+            return []
+
+        if content_type is None and genre is None:
+            ranking = self._ranking
+        elif genre is None:
+            ranking = self._by_type.get(content_type, [])
+        elif content_type is None:
+            ranking = self._by_genre.get(genre, [])
+        else:
+            # Walk the shorter list and filter on the other attribute
+            by_type = self._by_type.get(content_type, [])
+            by_genre = self._by_genre.get(genre, [])
+            if len(by_type) <= len(by_genre):
+                ranking = (key for key in by_type if genre in self._entries[key[2]][2])
+            else:
+                ranking = (key for key in by_genre if self._entries[key[2]][1] == content_type)
+
+        return [content_id for _, _, content_id in islice(ranking, limit)]
@@ -0,0 +1,114 @@
+import math
+import numpy as np
+
+
+class PreferenceMatrix:
+    """
+    Dense matrix of users' genre preferences with L2-normalized rows.
+    
+    Columns are indexed by a genre vocabulary that grows as new genres
+    appear. Because rows are stored pre-normalized, the cosine similarity of
+    one user against every other user is a single matrix-vector product.
+    Values are float32 to halve memory against float64.
+    """
+    
+    def __init__(self, initial_capacity=64, initial_genres=16):
+        """Initialize an empty preference matrix
+        
+        Args:
+            initial_capacity (int): Number of user rows to preallocate
+            initial_genres (int): Number of genre columns to preallocate
+        """
+        self.keys = []  # row -> key
+        self.index = {}  # key -> row
+        self.genre_vocab = {}  # genre -> column
+        self._rows = np.zeros((max(1, initial_capacity), max(1, initial_genres)), dtype=np.float32)
+        
+    def __len__(self):
+        return len(self.keys)
+    
+    def __contains__(self, key):
+        return key in self.index
+    
+    def _grow(self, rows, columns):
+        """Grow storage geometrically to at least rows x columns"""
+        capacity, width = self._rows.shape
+        if rows <= capacity and columns <= width:
+            return
+        while capacity < rows:
+            capacity *= 2
+        while width < columns:
+            width *= 2
+        grown = np.zeros((capacity, width), dtype=np.float32)
+        grown[:self._rows.shape[0], :self._rows.shape[1]] = self._rows
+        self._rows = grown
+        
+    def update(self, key, preferences):
+        """Overwrite a row with the normalized preference vector of a user
+        
+        Args:
+            key: Row key (e.g. a user ID)
+            preferences (dict): Genre -> preference score
+        """
+        for genre in preferences:
+            if genre not in self.genre_vocab:
+                self.genre_vocab[genre] = len(self.genre_vocab)
+                
+        row = self.index.get(key)
+        if row is None:
+            row = len(self.keys)
+            self.keys.append(key)
+            self.index[key] = row
+        self._grow(len(self.keys), len(self.genre_vocab))
+        
+        vector = self._rows[row]
+        vector[:] = 0.0
+        norm = math.sqrt(sum(score * score for score in preferences.values()))
+        if norm > 0:
+            for genre, score in preferences.items():
+                vector[self.genre_vocab[genre]] = score / norm
+                
+    def similarities(self, key, keys=None):
+        """Cosine similarity of one row against many
+        
+        Args:
+            key: Row key to compare
+            keys (list, optional): Keys to compare against. Defaults to every row.
+            
+        Returns:
+            np.ndarray: float64 similarities aligned with keys (or rows)
+        """
+        vector = self._rows[self.index[key]]
+        if keys is None:
+            rows = self._rows[:len(self.keys)]
+        else:
+            positions = np.fromiter((self.index[other] for other in keys), dtype=np.int64, count=len(keys))
+            rows = self._rows[positions]
+        return (rows @ vector).astype(np.float64)
+    
+    def similarity_matrix(self, keys, others):
+        """Cosine similarity of several rows against many in one matrix product
+        
+        Args:
+            keys (list): Row keys to compare
+            others (list): Keys to compare against
+            
+        Returns:
+            np.ndarray: float64 (len(keys), len(others)) similarities
+        """
+        rows = self._rows[np.fromiter((self.index[key] for key in keys), dtype=np.int64, count=len(keys))]
+        other_rows = self._rows[np.fromiter((self.index[other] for other in others), dtype=np.int64,
+                                            count=len(others))]
+        return (other_rows @ rows.T).T.astype(np.float64)
+    
+    def similarity(self, key1, key2):
+        """Cosine similarity between two rows
+        
+        Args:
+            key1: First row key
+            key2: Second row key
+            
+        Returns:
+            float: Similarity score between 0 and 1
+        """
+        return float(np.dot(self._rows[self.index[key1]], self._rows[self.index[key2]]))
@@ -1,8 +1,21 @@
+import math
 import numpy as np
 from collections import defaultdict
+from itertools import chain, islice
 from src.user_profile import UserProfile
 from src.content_metadata import Content
-from src.utils import calculate_content_similarity
+from src.feature_matrix import ContentFeatureMatrix
+from src.inverted_index import InvertedIndex
+from src.minhash import MinHasher, SignatureMatrix, estimate_jaccard
+from src.neighbor_table import ItemNeighborTable
+from src.pair_cache import PairCache
+from src.popularity_index import PopularityIndex
+from src.preference_matrix import PreferenceMatrix
+from src.result_cache import ResultCache
+from src.user_index import ExactUserIndex, LSHUserIndex, recall_at_k
+from src.utils import top_k_indices, top_k_items
+from src.viewing_history import ViewingHistory
+from src.vocabulary import CONTENT_IDS
 
 class RecommendationEngine:
     """
@@ -14,12 +27,140 @@ class RecommendationEngine:
     3. Hybrid approach: Combines both methods for better recommendations
     """
     
-    def __init__(self):
-        """Initialize the recommendation engine"""
+    # How content_based_filtering treats items sharing no genre or tag with the
+    # user's history: "exact" scores them by their rating/popularity/type floor
+    # whenever they could reach the top-N, "pad" only uses them to fill up short
+    # candidate lists, "none" ignores them.
+    CANDIDATE_FALLBACKS = ("exact", "pad", "none")
+    
+    # Number of similar users collaborative_filtering draws recommendations from
+    COLLABORATIVE_NEIGHBORS = 10
+    
+    # Neighbour indexes collaborative_filtering can draw similar users from
+    NEIGHBOR_INDEXES = {
+        "exact": ExactUserIndex,
+        "lsh": LSHUserIndex
+    }
+    
+    # How viewing-history overlap between users is measured: "exact" compares
+    # the sets of watched IDs, "minhash" estimates Jaccard from signatures
+    HISTORY_SIMILARITIES = ("exact", "minhash")
+    
+    # How hybrid_filtering combines its two signals: "rank" merges the two
+    # top-N lists by weighted rank position, "score" adds max-normalized
+    # content-based and collaborative scores, "rrf" adds weighted reciprocal
+    # ranks. "score" and "rrf" score both signals in one pass over a shared
+    # candidate set.
+    HYBRID_FUSIONS = ("rank", "score", "rrf")
+    
+    # Weights of the content-based and collaborative signals in hybrid fusion
+    HYBRID_WEIGHTS = (0.6, 0.4)
+    
+    # Rank offset of reciprocal rank fusion, damping the lead of the top ranks
+    RRF_K = 60
+    
+    def __init__(self, candidate_fallback="exact", neighbor_index="exact",
+                 history_similarity="exact", minhash_permutations=64,
+                 cache_max_entries=1_000_000, cache_max_bytes=None, cache_ttl=None,
+                 item_neighbors=None, repeat_views="first", result_cache_size=None,
+                 stale_while_revalidate=False, hybrid_fusion="rank"):
+        """Initialize the recommendation engine
+        
+        Args:
+            candidate_fallback (str): One of 'exact', 'pad' or 'none'
+            neighbor_index (str or object): One of 'exact' or 'lsh', or an index
+                object with update(user), remove(user_id) and candidates(user_id)
+            history_similarity (str): One of 'exact' or 'minhash'
+            minhash_permutations (int): MinHash signature length; more hash
+                functions give more accurate estimates at a higher cost
+            cache_max_entries (int, optional): Entry limit for the user similarity cache
+            cache_max_bytes (int, optional): Approximate memory budget for the
+                user similarity cache
+            cache_ttl (float, optional): Seconds before a cached user similarity expires
+            item_neighbors (int, optional): Keep a precomputed table of this many
+                most similar items per item and serve content_based_filtering
+                from it instead of scoring the catalog per request
+            repeat_views (str): How repeat views of an item combine into its
+                content-based weight: one of 'first', 'max' or 'sum'
+            result_cache_size (int, optional): Cache up to this many
+                recommendation lists of known users, invalidated by profile
+                and content events
+            stale_while_revalidate (bool): Serve stale cached lists and queue
+                them for refresh_stale_results() instead of recomputing
+            hybrid_fusion (str): Default fusion of hybrid recommendations: one
+                of 'rank', 'score' or 'rrf'
+        """
+        if candidate_fallback not in self.CANDIDATE_FALLBACKS:
+            raise ValueError(f"Candidate fallback {candidate_fallback} not supported. "
+                             f"Use one of: {list(self.CANDIDATE_FALLBACKS)}")
+            
+        if history_similarity not in self.HISTORY_SIMILARITIES:
+            raise ValueError(f"History similarity {history_similarity} not supported. "
+                             f"Use one of: {list(self.HISTORY_SIMILARITIES)}")
+            
+        if repeat_views not in ViewingHistory.WEIGHT_AGGREGATIONS:
+            raise ValueError(f"Repeat view aggregation {repeat_views} not supported. "
+                             f"Use one of: {list(ViewingHistory.WEIGHT_AGGREGATIONS)}")
+            
+        if hybrid_fusion not in self.HYBRID_FUSIONS:
+            raise ValueError(f"Hybrid fusion {hybrid_fusion} not supported. "
+                             f"Use one of: {list(self.HYBRID_FUSIONS)}")
+            
+        if isinstance(neighbor_index, str):
+            if neighbor_index not in self.NEIGHBOR_INDEXES:
+                raise ValueError(f"Neighbor index {neighbor_index} not supported. "
+                                 f"Use one of: {list(self.NEIGHBOR_INDEXES)}")
+            neighbor_index = self.NEIGHBOR_INDEXES[neighbor_index]()
+            
         self.users = {}  # user_id -> UserProfile
         self.content_database = {}  # content_id -> Content
-        self.content_similarity_cache = {}  # (content_id1, content_id2) -> similarity_score
-        self.user_similarity_cache = {}  # (user_id1, user_id2) -> similarity_score
+        # Bounded LRU cache: (user_id1, user_id2) -> similarity_score
+        self.user_similarity_cache = PairCache(cache_max_entries, cache_max_bytes, cache_ttl)
+        self.content_features = ContentFeatureMatrix()
+        self._stale_content = set()  # content_ids whose feature rows need re-encoding
+        self.content_index = InvertedIndex()  # genre/tag -> content_ids
+        self.candidate_fallback = candidate_fallback
+        self.popularity_index = PopularityIndex()  # maintained popularity ranking
+        self.neighbor_index = neighbor_index  # candidate similar users
+        self.history_similarity = history_similarity
+        self.repeat_views = repeat_views
+        self.hybrid_fusion = hybrid_fusion
+        self.minhasher = MinHasher(minhash_permutations)
+        self.history_signatures = SignatureMatrix(self.minhasher)  # user_id -> MinHash row
+        self.preference_matrix = PreferenceMatrix()  # user_id -> normalized genre vector
+        # (user_id, algorithm, limit, fusion) -> recommended content_ids
+        self.result_cache = ResultCache(result_cache_size) if result_cache_size else None
+        self.stale_while_revalidate = stale_while_revalidate
+        # content row -> top-N similar content rows, built on first use
+        self.item_neighbors = (ItemNeighborTable(self.content_features, item_neighbors)
+                               if item_neighbors else None)
+        self._change_listeners = []  # called as listener(kind, obj, fields)
+        
+    def add_change_listener(self, listener):
+        """Register a callback for users and content being added or changed
+        
+        Args:
+            listener (callable): Called as listener(kind, obj, fields), where
+                kind is 'user' or 'content', obj the UserProfile or Content
+                and fields the set of changed attribute names, or None when
+                obj was just added
+        """
+        if listener not in self._change_listeners:
+            self._change_listeners.append(listener)
+            
+    def remove_change_listener(self, listener):
+        """Unregister a previously added change listener
+        
+        Args:
+            listener (callable): Listener to remove
+        """
+        if listener in self._change_listeners:
+            self._change_listeners.remove(listener)
+            
+    def _notify_change(self, kind, obj, fields):
+        """Dispatch an addition or change to all change listeners"""
+        for listener in self._change_listeners:
+            listener(kind, obj, fields)
         
     def add_user(self, user_id, username=None):
         """Add a new user to the system
@@ -34,9 +175,38 @@ class RecommendationEngine:
         if user_id in self.users:
             return self.users[user_id]
             
-        user = UserProfile(user_id, username)
+        user = UserProfile(user_id, username, minhasher=self.minhasher)
         self.users[user_id] = user
+        self.history_signatures.update(user_id, user.history_signature)
+        self.preference_matrix.update(user_id, user.preferences)
+        self.neighbor_index.update(user)
+        user.add_listener(self._on_user_changed)
+        if self.result_cache is not None:
+            self.result_cache.user_changed(user_id)
+        self._notify_change("user", user, None)
         return user
+    
+    def _on_user_changed(self, user, fields):
+        """Keep user indexes and caches in sync with profile changes
+        
+        Args:
+            user (UserProfile): User profile that changed
+            fields (set): Names of the changed attributes
+        """
+        if self.users.get(user.user_id) is not user:
+            return
+            
+        if "viewing_history" in fields:
+            self.history_signatures.update(user.user_id, user.history_signature)
+        if "preferences" in fields:
+            self.preference_matrix.update(user.user_id, user.preferences)
+        self.neighbor_index.update(user)
+        
+        # Clear cached user similarities since preferences or history changed
+        self._clear_user_similarity_cache(user.user_id)
+        if self.result_cache is not None:
+            self.result_cache.user_changed(user.user_id)
+        self._notify_change("user", user, fields)
         
     def add_content(self, content_id, title, content_type):
         """Add new content to the database
@@ -54,7 +224,100 @@ class RecommendationEngine:
             
         content = Content(content_id, title, content_type)
         self.content_database[content_id] = content
+        self.content_index.index(content)
+        self.popularity_index.update(content)
+        
+        # Metadata is usually filled in after creation, so encode the row lazily
+        self._stale_content.add(content_id)
+        content.add_listener(self._on_content_changed)
+        if self.result_cache is not None:
+            self.result_cache.content_changed(content_id, added=True)
+        self._notify_change("content", content, None)
         return content
+    
+    def refresh_content(self, content_id, fields=None):
+        """Re-index a content item after changes the engine was not notified of
+        
+        Args:
+            content_id (str): Content identifier
+            fields (iterable, optional): Names of the changed attributes, such
+                as description for change listeners to pick up. Defaults to
+                every field that feeds scoring.
+        """
+        if content_id in self.content_database:
+            self._on_content_changed(
+                self.content_database[content_id],
+                set(fields) if fields is not None else set(Content.SCORING_FIELDS)
+            )
+            
+    def _on_content_changed(self, content, fields):
+        """Keep content indexes in sync with metadata changes
+        
+        Args:
+            content (Content): Content item that changed
+            fields (set): Names of the changed attributes
+        """
+        if self.content_database.get(content.content_id) is not content:
+            return
+            
+        if "genres" in fields or "tags" in fields:
+            self.content_index.index(content)
+            
+        if fields & {"popularity_score", "content_type", "genres"}:
+            self.popularity_index.update(content)
+            
+        # Ratings only feed the similarity score through the average rating
+        if fields & Content.SCORING_FIELDS or self._rating_term_changed(content):
+            self._stale_content.add(content.content_id)
+            if self.result_cache is not None:
+                self.result_cache.content_changed(content.content_id)
+        self._notify_change("content", content, fields)
+            
+    def _rating_term_changed(self, content):
+        """Check whether a content item's average rating differs from its encoded row
+        
+        Args:
+            content (Content): Content item whose ratings changed
+            
+        Returns:
+            bool: True if the rating term of its similarities changed
+        """
+        if content.content_id not in self.content_features:
+            return False  # Never encoded, so nothing was computed from it
+        return self.content_features.average_rating(content.content_id) != content.get_average_rating()
+    
+    def _sync_content_features(self):
+        """Re-encode feature rows for content added or changed since the last sync"""
+        if not self._stale_content:
+            return
+            
+        # Encode in catalog order so matrix rows follow content_database order
+        if len(self._stale_content) == len(self.content_database):
+            stale_ids = list(self.content_database)
+        else:
+            stale_ids = [content_id for content_id in self.content_database
+                         if content_id in self._stale_content]
+            
+        for content_id in stale_ids:
+            self.content_features.upsert(self.content_database[content_id])
+        self._stale_content.clear()
+        
+        if self.item_neighbors is not None and self.item_neighbors.built:
+            self.item_neighbors.refresh(stale_ids)
+            
+    def build_item_neighbors(self, workers=None):
+        """Build the item neighbour table ahead of the first request
+        
+        Args:
+            workers (int, optional): Number of threads. Defaults to the number of CPUs.
+            
+        Raises:
+            ValueError: If the engine was created without item_neighbors
+        """
+        if self.item_neighbors is None:
+            raise ValueError("Item neighbour table not enabled. Pass item_neighbors to the engine")
+        self._sync_content_features()
+        self.item_neighbors.build(workers)
         
     def update_user_preferences(self, user_id, preferences):
         """Update a user's genre preferences
@@ -66,11 +329,9 @@ class RecommendationEngine:
         if user_id not in self.users:
             self.add_user(user_id)
             
+        # The profile notifies the engine, which clears cached similarities
         self.users[user_id].update_preferences(preferences)
         
-        # Clear cached user similarities since preferences changed
-        self._clear_user_similarity_cache(user_id)
-        
     def add_viewing_record(self, user_id, content_id, watch_duration, completion_percentage):
         """Add a viewing record to user history
         
@@ -83,58 +344,19 @@ class RecommendationEngine:
         if user_id not in self.users:
             self.add_user(user_id)
             
+        # The profile notifies the engine, which clears cached similarities
         self.users[user_id].add_viewing_record(content_id, watch_duration, completion_percentage)
         
-        # Clear cached user similarities since viewing history changed
-        self._clear_user_similarity_cache(user_id)
-        
     def _clear_user_similarity_cache(self, user_id):
         """Clear user similarity cache entries for a specific user
         
+        Only the entries involving this user are touched, via the cache's
+        per-user adjacency map.
+        
         Args:
             user_id (str): User identifier
         """
-        keys_to_clear = []
-        for key in self.user_similarity_cache:
-            if user_id in key:
-                keys_to_clear.append(key)
-                
-        for key in keys_to_clear:
-            del self.user_similarity_cache[key]
-    
-    def _get_content_similarity(self, content_id1, content_id2):
-        """Get similarity between two content items, using cache if available
-        
-        Args:
-            content_id1 (str): First content identifier
-            content_id2 (str): Second content identifier
-            
-        Returns:
-            float: Similarity score between 0 and 1
-        """
-        # Check if items exist
-        if content_id1 not in self.content_database or content_id2 not in self.content_database:
-            return 0.0
-            
-        # Create a consistent key for the cache (smaller id first)
-        if content_id1 > content_id2:
-            content_id1, content_id2 = content_id2, content_id1
-            
-        cache_key = (content_id1, content_id2)
-        
-        # Return cached value if available
-        if cache_key in self.content_similarity_cache:
-            return self.content_similarity_cache[cache_key]
-            
-        # Calculate similarity
-        content1 = self.content_database[content_id1]
-        content2 = self.content_database[content_id2]
-        similarity = calculate_content_similarity(content1, content2)
-        
-        # Cache the result
-        self.content_similarity_cache[cache_key] = similarity
-        
-        return similarity
+        self.user_similarity_cache.invalidate(user_id)
     
     def _calculate_user_similarity(self, user_id1, user_id2):
         """Calculate similarity between two users based on preferences and history
@@ -151,14 +373,13 @@ class RecommendationEngine:
             return 0.0
             
         # Create a consistent key for the cache (smaller id first)
-        if user_id1 > user_id2:
-            user_id1, user_id2 = user_id2, user_id1
-            
-        cache_key = (user_id1, user_id2)
+        cache_key = self._user_cache_key(user_id1, user_id2)
+        user_id1, user_id2 = cache_key
         
         # Return cached value if available
-        if cache_key in self.user_similarity_cache:
-            return self.user_similarity_cache[cache_key]
+        cached = self.user_similarity_cache.get(cache_key)
+        if cached is not None:
+            return cached
             
         user1 = self.users[user_id1]
         user2 = self.users[user_id2]
@@ -177,6 +398,13 @@ class RecommendationEngine:
         
         return similarity
     
+    @staticmethod
+    def _user_cache_key(user_id1, user_id2):
+        """Order-independent user similarity cache key (smaller id first)"""
+        if user_id1 > user_id2:
+            return (user_id2, user_id1)
+        return (user_id1, user_id2)
+    
     def _calculate_preference_similarity(self, user1, user2):
         """Calculate similarity between users' genre preferences
         
@@ -187,6 +415,10 @@ class RecommendationEngine:
         Returns:
             float: Similarity score between 0 and 1
         """
+        # Engine users have a pre-normalized row in the preference matrix
+        if self.users.get(user1.user_id) is user1 and self.users.get(user2.user_id) is user2:
+            return self.preference_matrix.similarity(user1.user_id, user2.user_id)
+            
         # Get all genres from both users
         all_genres = set(user1.preferences.keys()) | set(user2.preferences.keys())
         
@@ -210,7 +442,7 @@ class RecommendationEngine:
         if sum_squares1 == 0 or sum_squares2 == 0:
             return 0.0
             
-        return sum_products / (np.sqrt(sum_squares1) * np.sqrt(sum_squares2))
+        return sum_products / (math.sqrt(sum_squares1) * math.sqrt(sum_squares2))
     
     def _calculate_history_similarity(self, user1, user2):
         """Calculate similarity between users' viewing histories
@@ -222,16 +454,19 @@ class RecommendationEngine:
         Returns:
             float: Similarity score between 0 and 1
         """
-        # Extract content IDs from viewing histories
-        history1 = {record["content_id"] for record in user1.viewing_history}
-        history2 = {record["content_id"] for record in user2.viewing_history}
+        if self.history_similarity == "minhash" and user1.minhasher == user2.minhasher:
+            return estimate_jaccard(user1.history_signature, user2.history_signature)
+            
+        # Distinct interned content indices from the history columns
+        history1 = user1.viewing_history.unique_content_indices()
+        history2 = user2.viewing_history.unique_content_indices()
         
-        if not history1 or not history2:
+        if not history1.size or not history2.size:
             return 0.0  # No history to compare
             
         # Calculate Jaccard similarity
-        intersection = len(history1 & history2)
-        union = len(history1 | history2)
+        intersection = np.intersect1d(history1, history2, assume_unique=True).size
+        union = history1.size + history2.size - intersection
         
         return intersection / union
     
@@ -248,40 +483,215 @@ class RecommendationEngine:
         if user_id not in self.users:
             return self.get_popular_content(limit)
             
-        user = self.users[user_id]
-        
-        # Get content items the user has watched
-        watched_content = {record["content_id"] for record in user.viewing_history}
+        watched_content, watched_weights = self._watched_weights(user_id)
         
-        # Calculate content scores based on similarity to watched content
-        content_scores = defaultdict(float)
+        if not watched_weights:
+            return []
+            
+        self._sync_content_features()
+        features = self.content_features
         
-        for watched_id in watched_content:
-            # Skip if content is no longer in database
-            if watched_id not in self.content_database:
-                continue
-                
-            for candidate_id in self.content_database:
-                # Skip already watched content
-                if candidate_id in watched_content:
-                    continue
-                    
-                # Get similarity between watched and candidate content
-                similarity = self._get_content_similarity(watched_id, candidate_id)
-                
-                # Find the viewing record for this content
-                for record in user.viewing_history:
-                    if record["content_id"] == watched_id:
-                        # Weight by completion percentage - higher completion means stronger signal
-                        weight = record["completion_percentage"]
-                        content_scores[candidate_id] += similarity * weight
-                        break
+        if self.item_neighbors is not None:
+            rows = self._merge_item_neighbors(watched_content, watched_weights, limit)
+            return [features.content_ids[row] for row in rows]
+            
+        # Only items sharing a genre or tag with watched content can score on
+        # the Jaccard terms; everything else is left to the fallback below
+        candidate_ids = self.content_index.candidates(
+            watched_id for watched_id, _ in watched_weights
+        ) - watched_content
+        rows = np.sort(np.fromiter((features.index[content_id] for content_id in candidate_ids),
+                                   dtype=np.int64, count=len(candidate_ids)))
         
-        # Sort by score
-        recommendations = sorted(content_scores.items(), key=lambda x: x[1], reverse=True)
+        scores = self._weighted_scores(watched_weights, rows)
+            
+        if self.candidate_fallback == "exact" and self._fallback_may_rank(watched_weights, scores, limit):
+            other_rows, other_scores = self._score_non_overlapping(watched_content, watched_weights, rows)
+            rows = np.concatenate([rows, other_rows])
+            scores = np.concatenate([scores, other_scores])
+            
+        # Select top N by score, ties keep catalog order
+        recommended = rows[top_k_indices(scores, limit, ties=rows)]
         
+        if self.candidate_fallback == "pad" and recommended.size < limit:
+            # Fill the remaining slots with the best floor-scored items
+            other_rows, other_scores = self._score_non_overlapping(watched_content, watched_weights, rows)
+            padding = other_rows[top_k_indices(other_scores, limit - recommended.size, ties=other_rows)]
+            recommended = np.concatenate([recommended, padding])
+            
         # Return top N content IDs
-        return [content_id for content_id, score in recommendations[:limit]]
+        return [features.content_ids[row] for row in recommended]
+    
+    def _watched_weights(self, user_id):
+        """Watched items of a user and their completion weights
+        
+        Args:
+            user_id (str): User identifier
+            
+        Returns:
+            tuple: (set of watched content IDs, list of (watched_id, weight)
+                pairs for the items still in the database)
+        """
+        history = self.users[user_id].viewing_history
+        content_ids = CONTENT_IDS.values
+        
+        # Weight each watched item by its completion percentage - higher
+        # completion means stronger signal. The weights are built once per
+        # history change, with repeat views combined per repeat_views.
+        watched_indices, weights = history.completion_weights(self.repeat_views)
+        watched_content = {content_ids[index] for index in watched_indices.tolist()}
+        
+        # Skip content that is no longer in the database
+        watched_weights = [(content_ids[index], weight)
+                           for index, weight in zip(watched_indices.tolist(), weights.tolist())
+                           if content_ids[index] in self.content_database]
+        return watched_content, watched_weights
+    
+    def _weighted_scores(self, watched_weights, rows, block_size=128):
+        """Completion-weighted sum of similarities to the watched items
+        
+        Watched items are scored in blocks against the candidate rows with
+        one matrix product per block; the weighted rows are then summed in
+        history order.
+        
+        Args:
+            watched_weights (list): (watched_id, weight) pairs
+            rows (np.ndarray): Candidate feature rows
+            block_size (int): Watched items scored per block
+            
+        Returns:
+            np.ndarray: Scores aligned with rows
+        """
+        features = self.content_features
+        watched_rows = np.array([features.index[watched_id] for watched_id, _ in watched_weights],
+                                dtype=np.int64)
+        weights = [weight for _, weight in watched_weights]
+        
+        scores = np.zeros(rows.size, dtype=np.float64)
+        if rows.size == 0:
+            return scores
+        for start in range(0, watched_rows.size, block_size):
+            block = features.block_scores(watched_rows[start:start + block_size], rows)
+            for similarities, weight in zip(block, weights[start:start + block_size]):
+                scores += similarities * weight
+        return scores
+    
+    def _merge_item_neighbors(self, watched_content, watched_weights, limit):
+        """Rank content by merging the precomputed neighbour lists of watched items
+        
+        Each neighbour scores the weighted sum of its similarities to the
+        watched items whose lists it appears in.
+        
+        Args:
+            watched_content (set): Content IDs the user has watched
+            watched_weights (list): (watched_id, weight) pairs
+            limit (int): Maximum number of recommendations
+            
+        Returns:
+            np.ndarray: Recommended feature rows, best first
+        """
+        return self._merge_item_neighbors_batch([(watched_content, watched_weights)], limit)[0]
+    
+    def _merge_item_neighbors_batch(self, watched, limit):
+        """Merge the neighbour lists of several users' watched items in one pass
+        
+        Each watched item's list is read once per chunk. The weighted
+        similarities of all users are keyed by (user, content row) and summed
+        with one bincount, in each user's watched order.
+        
+        Args:
+            watched (list): (watched_content, watched_weights) per user
+            limit (int): Maximum number of recommendations per user
+            
+        Returns:
+            list: Recommended feature rows per user, best first
+        """
+        table = self.item_neighbors
+        if not table.built:
+            table.build()
+        features = self.content_features
+        catalog_size = len(features)
+        
+        neighbors = {}  # watched_id -> (rows, scores)
+        neighbor_keys, neighbor_scores = [], []
+        for user_row, (_, watched_weights) in enumerate(watched):
+            for watched_id, weight in watched_weights:
+                if watched_id not in neighbors:
+                    neighbors[watched_id] = table.neighbors(watched_id)
+                rows, scores = neighbors[watched_id]
+                neighbor_keys.append(rows.astype(np.int64) + user_row * catalog_size)
+                neighbor_scores.append(scores * weight)
+        if not neighbor_keys:
+            return [np.zeros(0, dtype=np.int64) for _ in watched]
+            
+        keys, inverse = np.unique(np.concatenate(neighbor_keys), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(neighbor_scores), minlength=keys.size)
+        user_rows, rows = np.divmod(keys, catalog_size)
+        bounds = np.searchsorted(user_rows, np.arange(len(watched) + 1))
+        
+        index = features.index
+        ranked = []
+        for (watched_content, _), start, stop in zip(watched, bounds[:-1], bounds[1:]):
+            watched_rows = [index[content_id] for content_id in watched_content if content_id in index]
+            unwatched = start + np.flatnonzero(~np.isin(rows[start:stop], watched_rows))
+            candidate_rows = rows[unwatched]
+            # Ties keep catalog order
+            ranked.append(candidate_rows[top_k_indices(scores[unwatched], limit, ties=candidate_rows)])
+        return ranked
+    
+    def _fallback_may_rank(self, watched_weights, scores, limit):
+        """Check whether items outside the candidate set could reach the top-N
+        
+        Items sharing no genre or tag with any watched item score only on the
+        rating, popularity and type terms, each of which is at most 0.1.
+        
+        Args:
+            watched_weights (list): (watched_id, weight) pairs used for scoring
+            scores (np.ndarray): Candidate scores
+            limit (int): Number of recommendations requested
+            
+        Returns:
+            bool: True if the non-overlapping items must be scored as well
+        """
+        if scores.size < limit:
+            return True
+        if limit <= 0:
+            return False
+            
+        weights = [weight for _, weight in watched_weights]
+        if min(weights) < 0:
+            return True
+            
+        # Small slack covers float rounding of the floor terms
+        floor_bound = 0.3 * sum(weights) * (1 + 1e-9) + 1e-12
+        kth_score = -np.partition(-scores, limit - 1)[limit - 1]
+        return kth_score <= floor_bound
+    
+    def _score_non_overlapping(self, watched_content, watched_weights, candidate_rows):
+        """Floor-score every unwatched item outside the candidate set
+        
+        Args:
+            watched_content (set): Content IDs the user has watched
+            watched_weights (list): (watched_id, weight) pairs used for scoring
+            candidate_rows (np.ndarray): Rows already scored as candidates
+            
+        Returns:
+            tuple: (row indices, scores) of the remaining items
+        """
+        features = self.content_features
+        
+        remaining = np.ones(len(features), dtype=bool)
+        remaining[candidate_rows] = False
+        for content_id in watched_content:
+            if content_id in features.index:
+                remaining[features.index[content_id]] = False
+        rows = np.flatnonzero(remaining)
+        
+        scores = np.zeros(rows.size, dtype=np.float64)
+        for watched_id, weight in watched_weights:
+            scores += features.floor_scores(watched_id, rows) * weight
+            
+        return rows, scores
     
     def collaborative_filtering(self, user_id, limit=10):
         """Generate recommendations based on similar users' preferences
@@ -295,65 +705,473 @@ class RecommendationEngine:
         """
         if user_id not in self.users:
             return self.get_popular_content(limit)
+        return self._collaborative_ids(user_id, limit)
+    
+    def _collaborative_ids(self, user_id, limit, neighbors=None):
+        """Collaborative recommendations of a known user
+        
+        Args:
+            user_id (str): User identifier
+            limit (int): Maximum number of recommendations
+            neighbors (list, optional): The user's nearest users, as
+                _nearest_users returns them. Searched for if None.
             
-        user = self.users[user_id]
+        Returns:
+            list: List of recommended content IDs
+        """
+        content_ids = CONTENT_IDS.values
+        indices, scores, first_positions = self._collaborative_scores(user_id, neighbors)
         
-        # Get content items the user has already watched
-        watched_content = {record["content_id"] for record in user.viewing_history}
+        # Select top N content IDs by score, ties in order of first appearance
+        top = top_k_indices(scores, limit, ties=first_positions)
+        return [content_ids[index] for index in indices[top].tolist()]
+    
+    def _collaborative_scores(self, user_id, neighbors=None):
+        """Score the unwatched items the user's nearest neighbours watched
         
-        # Calculate user similarities
-        user_similarities = {}
-        for other_id in self.users:
-            if other_id != user_id:
-                user_similarities[other_id] = self._calculate_user_similarity(user_id, other_id)
+        Args:
+            user_id (str): User identifier
+            neighbors (list, optional): The user's nearest users, as
+                _nearest_users returns them. Searched for if None.
+            
+        Returns:
+            tuple: (interned content indices, scores, position of each item's
+                first record among the neighbours' histories), one entry per
+                eligible item
+        """
+        content_ids = CONTENT_IDS.values
         
-        # Sort users by similarity
-        similar_users = sorted(user_similarities.items(), key=lambda x: x[1], reverse=True)
+        # Take the top similar users
+        top_similar_users = neighbors
+        if top_similar_users is None:
+            top_similar_users = self._nearest_users(user_id, self.COLLABORATIVE_NEIGHBORS)
+        if not top_similar_users:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, np.zeros(0, dtype=np.float64), empty
+            
+        # Weight each of their viewing records by user similarity and
+        # completion percentage, in neighbour then history order
+        indices = np.concatenate([self.users[other_id].viewing_history.content_indices
+                                  for other_id, _ in top_similar_users])
+        weights = np.concatenate([similarity * self.users[other_id].viewing_history.completions.astype(np.float64)
+                                  for other_id, similarity in top_similar_users])
         
-        # Take top 10 similar users
-        top_similar_users = similar_users[:10]
+        # Calculate content scores, summing each item's weights in record order
+        unique_indices, first_positions, inverse = np.unique(indices, return_index=True, return_inverse=True)
+        content_scores = np.bincount(inverse, weights=weights, minlength=unique_indices.size)
         
-        # Calculate content scores based on similar users' histories
-        content_scores = defaultdict(float)
+        # Skip already watched content and content no longer in database
+        watched = np.isin(unique_indices, self.users[user_id].viewing_history.unique_content_indices())
+        eligible = np.flatnonzero(~watched & np.fromiter(
+            (content_ids[index] in self.content_database for index in unique_indices.tolist()),
+            dtype=bool, count=unique_indices.size
+        ))
+        return unique_indices[eligible], content_scores[eligible], first_positions[eligible]
+    
+    def _nearest_users(self, user_id, k, exact=False):
+        """Find the most similar users among the neighbour index candidates
+        
+        Args:
+            user_id (str): User identifier
+            k (int): Number of neighbours
+            exact (bool): Compare against every user instead of the index
+            
+        Returns:
+            list: Up to k (user_id, similarity) tuples, most similar first
+        """
+        if exact:
+            candidates = (other_id for other_id in self.users if other_id != user_id)
+        else:
+            candidates = self.neighbor_index.candidates(user_id)
+            
+        candidates = list(candidates)
+        user = self.users[user_id]
         
-        for other_id, similarity in top_similar_users:
-            other_user = self.users[other_id]
+        if self.history_similarity == "minhash":
+            # Both similarity terms for every candidate in one vectorized pass
+            preference_sims = self.preference_matrix.similarities(user_id, candidates)
+            history_sims = self.history_signatures.jaccard(user.history_signature, candidates)
+            similarities = 0.6 * preference_sims + 0.4 * history_sims
             
-            for record in other_user.viewing_history:
-                content_id = record["content_id"]
+            return [(candidates[position], float(similarities[position]))
+                    for position in top_k_indices(similarities, k)]
+            
+        # Exact history overlap is cached per pair; preference similarity for
+        # all cache misses comes from one matrix-vector product
+        user_similarities = dict.fromkeys(candidates)
+        misses = []
+        for other_id in candidates:
+            cached = self.user_similarity_cache.get(self._user_cache_key(user_id, other_id))
+            if cached is None:
+                misses.append(other_id)
+            else:
+                user_similarities[other_id] = cached
                 
-                # Skip already watched content
-                if content_id in watched_content:
-                    continue
-                    
-                # Skip if content is no longer in database
-                if content_id not in self.content_database:
-                    continue
-                    
-                # Weight by user similarity and completion percentage
-                weight = similarity * record["completion_percentage"]
-                content_scores[content_id] += weight
+        if misses:
+            preference_sims = self.preference_matrix.similarities(user_id, misses)
+            for other_id, preference_sim in zip(misses, preference_sims):
+                history_sim = self._calculate_history_similarity(user, self.users[other_id])
+                similarity = 0.6 * float(preference_sim) + 0.4 * history_sim
+                self.user_similarity_cache[self._user_cache_key(user_id, other_id)] = similarity
+                user_similarities[other_id] = similarity
+                
+        return top_k_items(user_similarities, k)
+    
+    def _nearest_users_batch(self, user_ids, k):
+        """Find the most similar users of several users in one pass
         
-        # Sort by score
-        recommendations = sorted(content_scores.items(), key=lambda x: x[1], reverse=True)
+        The users' neighbour index candidates are pooled and scored
+        together: preference similarity is one (users x candidates) matrix
+        product and history similarity one overlap count or MinHash
+        comparison for the whole chunk. Each user then selects from its own
+        candidates.
         
-        # Return top N content IDs
-        return [content_id for content_id, score in recommendations[:limit]]
+        Args:
+            user_ids (list): Identifiers of known users
+            k (int): Number of neighbours
+            
+        Returns:
+            list: Up to k (user_id, similarity) tuples per user, most similar first
+        """
+        candidate_lists = [list(self.neighbor_index.candidates(user_id)) for user_id in user_ids]
+        pool_ids = list(dict.fromkeys(chain.from_iterable(candidate_lists)))
+        pool = dict(zip(pool_ids, range(len(pool_ids))))  # candidate user_id -> column
+        
+        nearest = []
+        for user_similarities, candidates in zip(self._user_similarity_matrix(user_ids, pool_ids), candidate_lists):
+            columns = np.fromiter(map(pool.__getitem__, candidates), dtype=np.int64, count=len(candidates))
+            user_similarities = user_similarities[columns]
+            nearest.append([(candidates[position], float(user_similarities[position]))
+                            for position in top_k_indices(user_similarities, k)])
+        return nearest
     
-    def hybrid_filtering(self, user_id, limit=10):
+    def _user_similarity_matrix(self, user_ids, others):
+        """Combined preference and history similarity of several users against many
+        
+        Args:
+            user_ids (list): Identifiers of the users to compare
+            others (list): User identifiers to compare against
+            
+        Returns:
+            np.ndarray: (len(user_ids), len(others)) similarities
+        """
+        similarities = self.preference_matrix.similarity_matrix(user_ids, others)
+        similarities *= 0.6
+        if self.history_similarity == "minhash":
+            signatures = np.stack([self.users[user_id].history_signature for user_id in user_ids])
+            history_sims = self.history_signatures.jaccard_matrix(signatures, others)
+        else:
+            history_sims = self._history_similarity_matrix(user_ids, others)
+        history_sims *= 0.4
+        similarities += history_sims
+        return similarities
+    
+    def _history_similarity_matrix(self, user_ids, others):
+        """Exact history Jaccard similarity of several users against many
+        
+        Overlaps are counted through the others' item postings, so the work
+        is proportional to the pairs of records sharing an item.
+        
+        Args:
+            user_ids (list): Identifiers of the users to compare
+            others (list): User identifiers to compare against
+            
+        Returns:
+            np.ndarray: (len(user_ids), len(others)) similarities, 0.0 where
+                either history is empty
+        """
+        histories = [self.users[user_id].viewing_history.unique_content_indices() for user_id in user_ids]
+        other_histories = [self.users[other_id].viewing_history.unique_content_indices() for other_id in others]
+        sizes = np.array([history.size for history in histories], dtype=np.int64)
+        other_sizes = np.array([history.size for history in other_histories], dtype=np.int64)
+        
+        # Postings: the columns of the others watching each content index
+        items = np.concatenate(other_histories) if others else np.zeros(0, dtype=np.int64)
+        order = np.argsort(items, kind="stable")
+        owners = np.repeat(np.arange(len(others)), other_sizes)[order]
+        bounds = np.searchsorted(items[order], np.arange(len(CONTENT_IDS.values) + 1))
+        
+        # Every (user, posting) pair of a watched item adds one to the overlap
+        watched = np.concatenate(histories) if user_ids else np.zeros(0, dtype=np.int64)
+        counts = bounds[watched + 1] - bounds[watched]
+        ends = np.cumsum(counts)
+        postings = np.repeat(bounds[watched] - ends + counts, counts) + np.arange(ends[-1] if ends.size else 0)
+        keys = np.repeat(np.repeat(np.arange(len(user_ids)), sizes), counts) * len(others) + owners[postings]
+        intersection = np.bincount(keys, minlength=len(user_ids) * len(others)).reshape(len(user_ids), len(others))
+        
+        union = np.add.outer(sizes, other_sizes)
+        union -= intersection
+        
+        with np.errstate(invalid="ignore"):
+            similarity = np.divide(intersection, union)
+        # Either history empty means no overlap (0/0 when both are)
+        similarity[union == 0] = 0.0
+        return similarity
+    
+    def _collaborative_scores_batch(self, user_ids):
+        """Score the unwatched items the nearest neighbours of several users watched
+        
+        The neighbours' records of all users are keyed by (user, content)
+        and summed with one bincount, in the record order
+        _collaborative_scores sums them in.
+        
+        Args:
+            user_ids (list): Identifiers of known users
+            
+        Returns:
+            list: (interned content indices, scores, first positions) per
+                user, as returned by _collaborative_scores
+        """
+        if not user_ids:
+            return []
+        # Neighbour records in neighbour then history order, offset per user
+        record_rows, record_indices, record_weights, starts = [], [], [], []
+        records = 0
+        for user_row, neighbors in enumerate(self._nearest_users_batch(user_ids, self.COLLABORATIVE_NEIGHBORS)):
+            starts.append(records)
+            for other_id, similarity in neighbors:
+                history = self.users[other_id].viewing_history
+                record_rows.append(np.full(len(history), user_row, dtype=np.int64))
+                record_indices.append(history.content_indices)
+                record_weights.append(similarity * history.completions.astype(np.float64))
+                records += len(history)
+        if not records:
+            empty = np.zeros(0, dtype=np.int64)
+            return [(empty, np.zeros(0, dtype=np.float64), empty) for _ in user_ids]
+            
+        watched = [self.users[user_id].viewing_history.unique_content_indices() for user_id in user_ids]
+        # Taken once every history is read, as building profiles can intern new IDs
+        content_ids = CONTENT_IDS.values
+        vocabulary_size = len(content_ids)
+        
+        keys = np.concatenate(record_rows) * vocabulary_size + np.concatenate(record_indices)
+        keys, first_positions, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(record_weights), minlength=keys.size)
+        user_rows, indices = np.divmod(keys, vocabulary_size)
+        first_positions -= np.array(starts, dtype=np.int64)[user_rows]
+        
+        # Skip already watched content and content no longer in database
+        watched_keys = np.concatenate([history_indices.astype(np.int64) + user_row * vocabulary_size
+                                       for user_row, history_indices in enumerate(watched)])
+        scored_indices = np.unique(indices)
+        in_database = np.fromiter((content_ids[index] in self.content_database for index in scored_indices.tolist()),
+                                  dtype=bool, count=scored_indices.size)
+        eligible = np.flatnonzero(~np.isin(keys, watched_keys)
+                                  & in_database[np.searchsorted(scored_indices, indices)])
+        user_rows, indices, scores, first_positions = (
+            user_rows[eligible], indices[eligible], scores[eligible], first_positions[eligible])
+        
+        bounds = np.searchsorted(user_rows, np.arange(len(user_ids) + 1))
+        return [(indices[start:stop], scores[start:stop], first_positions[start:stop])
+                for start, stop in zip(bounds[:-1], bounds[1:])]
+    
+    def cache_stats(self):
+        """Hit, miss and eviction counters of the similarity and result caches
+        
+        Returns:
+            dict: 'user' and 'results' cache statistics
+        """
+        return {
+            "user": self.user_similarity_cache.stats(),
+            "results": self.result_cache.stats() if self.result_cache is not None else None
+        }
+    
+    def neighbor_recall(self, k=10, user_ids=None):
+        """Measure how many exact nearest neighbours the neighbour index finds
+        
+        Neighbours with zero similarity are ignored, since any of them is as
+        good as another.
+        
+        Args:
+            k (int): Number of neighbours per user
+            user_ids (list, optional): Users to evaluate. Defaults to all users.
+            
+        Returns:
+            dict: Mean recall@k, mean candidates scanned per query and the
+                number of users evaluated
+        """
+        if user_ids is None:
+            user_ids = list(self.users)
+            
+        recalls = []
+        candidate_counts = []
+        for user_id in user_ids:
+            if user_id not in self.users:
+                continue
+                
+            exact = [other_id for other_id, similarity in self._nearest_users(user_id, k, exact=True)
+                     if similarity > 0]
+            approximate = [other_id for other_id, _ in self._nearest_users(user_id, k)]
+            
+            recalls.append(recall_at_k(approximate, exact))
+            candidate_counts.append(len(self.neighbor_index.candidates(user_id)))
+            
+        return {
+            "k": k,
+            "users": len(recalls),
+            "recall_at_k": float(np.mean(recalls)) if recalls else 1.0,
+            "avg_candidates": float(np.mean(candidate_counts)) if candidate_counts else 0.0
+        }
+    
+    def hybrid_filtering(self, user_id, limit=10, fusion=None):
         """Combine content-based and collaborative filtering approaches
         
         Args:
             user_id (str): User identifier
             limit (int): Maximum number of recommendations
+            fusion (str, optional): One of 'rank', 'score' or 'rrf'. Defaults
+                to the engine's hybrid_fusion.
             
         Returns:
             list: List of recommended content IDs
         """
+        return self._hybrid_ids(user_id, limit, self._hybrid_fusion(fusion))
+    
+    def _hybrid_ids(self, user_id, limit, fusion, neighbors=None):
+        """Hybrid recommendations with a validated fusion mode
+        
+        Args:
+            user_id (str): User identifier
+            limit (int): Maximum number of recommendations
+            fusion (str): One of 'rank', 'score' or 'rrf'
+            neighbors (list, optional): Nearest users of a known user, as
+                _nearest_users returns them. Searched for if None.
+            
+        Returns:
+            list: List of recommended content IDs
+        """
+        if fusion != "rank":
+            return self._fused_hybrid(user_id, limit, fusion, neighbors)
+            
         # Get recommendations from both methods
         content_recs = self.content_based_filtering(user_id, limit=limit)
-        collab_recs = self.collaborative_filtering(user_id, limit=limit)
+        if neighbors is None:
+            collab_recs = self.collaborative_filtering(user_id, limit=limit)
+        else:
+            collab_recs = self._collaborative_ids(user_id, limit, neighbors)
+        return self._fuse_rankings(content_recs, collab_recs, limit)
+    
+    def _hybrid_fusion(self, fusion):
+        """Validate a fusion mode, falling back to the engine default"""
+        if fusion is None:
+            return self.hybrid_fusion
+        if fusion not in self.HYBRID_FUSIONS:
+            raise ValueError(f"Hybrid fusion {fusion} not supported. Use one of: {list(self.HYBRID_FUSIONS)}")
+        return fusion
+    
+    def _fused_hybrid(self, user_id, limit, fusion, neighbors=None):
+        """Hybrid recommendations fusing both signals' scores in one pass
+        
+        The candidates are the unwatched items sharing a genre or tag with
+        the watched ones plus those the nearest users watched. Both signals
+        are scored over this one set and the top N selected once. If it
+        holds fewer than limit items, every unwatched item is scored unless
+        candidate_fallback is 'none'.
+        
+        Args:
+            user_id (str): User identifier
+            limit (int): Maximum number of recommendations
+            fusion (str): Either 'score' or 'rrf'
+            neighbors (list, optional): Nearest users of a known user, as
+                _nearest_users returns them. Searched for if None.
+            
+        Returns:
+            list: List of recommended content IDs
+        """
+        if user_id not in self.users:
+            return self.get_popular_content(limit)
+            
+        watched_content, watched_weights = self._watched_weights(user_id)
+        return self._fuse_scores(watched_content, watched_weights, self._collaborative_scores(user_id, neighbors),
+                                 limit, fusion)
+    
+    def _fuse_scores(self, watched_content, watched_weights, collab, limit, fusion, content_scores=None):
+        """Rank one user's candidates by the fused content-based and collaborative scores
         
+        Args:
+            watched_content (set): Content IDs the user has watched
+            watched_weights (list): (watched_id, weight) pairs
+            collab (tuple): (interned content indices, scores, first
+                positions) from _collaborative_scores
+            limit (int): Maximum number of recommendations
+            fusion (str): Either 'score' or 'rrf'
+            content_scores (np.ndarray, optional): Content-based score of
+                every catalog row. Only the candidates are scored when omitted.
+            
+        Returns:
+            list: List of recommended content IDs
+        """
+        content_ids = CONTENT_IDS.values
+        collab_indices, collab_scores, first_positions = collab
+        if not watched_weights and collab_indices.size == 0:
+            return []
+            
+        self._sync_content_features()
+        features = self.content_features
+        
+        collab_ids = [content_ids[index] for index in collab_indices.tolist()]
+        candidate_ids = self.content_index.candidates(
+            watched_id for watched_id, _ in watched_weights
+        ) - watched_content
+        candidate_ids.update(collab_ids)
+        if len(candidate_ids) < limit and self.candidate_fallback != "none":
+            candidate_ids = set(features.index) - watched_content
+        rows = np.sort(np.fromiter((features.index[content_id] for content_id in candidate_ids),
+                                   dtype=np.int64, count=len(candidate_ids)))
+        
+        if content_scores is None:
+            content_scores = self._weighted_scores(watched_weights, rows)
+        else:
+            content_scores = content_scores[rows]
+        collab_rows = np.fromiter((features.index[content_id] for content_id in collab_ids),
+                                  dtype=np.int64, count=len(collab_ids))
+        collab_positions = np.searchsorted(rows, collab_rows)
+        
+        content_weight, collab_weight = self.HYBRID_WEIGHTS
+        if fusion == "score":
+            final_scores = content_weight * self._max_normalized(content_scores)
+            final_scores[collab_positions] += collab_weight * self._max_normalized(collab_scores)
+        else:
+            final_scores = content_weight * self._reciprocal_ranks(content_scores, rows)
+            final_scores[collab_positions] += collab_weight * self._reciprocal_ranks(collab_scores, first_positions)
+            
+        # Select top N by fused score, ties keep catalog order
+        recommended = rows[top_k_indices(final_scores, limit, ties=rows)]
+        return [features.content_ids[row] for row in recommended]
+    
+    @staticmethod
+    def _max_normalized(scores):
+        """Scale non-negative scores so the best is 1"""
+        best = scores.max() if scores.size else 0.0
+        return scores / best if best > 0 else scores.copy()
+    
+    @classmethod
+    def _reciprocal_ranks(cls, scores, ties):
+        """Reciprocal rank 1 / (RRF_K + rank) of each score, 0 for unscored items
+        
+        Args:
+            scores (np.ndarray): Scores, higher is better
+            ties (np.ndarray): Keys ordering equal scores, lower first
+            
+        Returns:
+            np.ndarray: Reciprocal ranks aligned with scores
+        """
+        ranks = np.empty(scores.size, dtype=np.float64)
+        ranks[np.lexsort((ties, -scores))] = np.arange(1, scores.size + 1)
+        return np.where(scores > 0, 1.0 / (cls.RRF_K + ranks), 0.0)
+    
+    @staticmethod
+    def _fuse_rankings(content_recs, collab_recs, limit):
+        """Merge content-based and collaborative rankings by weighted rank
+        
+        Args:
+            content_recs (list): Content-based recommendations, best first
+            collab_recs (list): Collaborative recommendations, best first
+            limit (int): Maximum number of recommendations
+            
+        Returns:
+            list: List of recommended content IDs
+        """
         # Combine recommendations with weights
         content_scores = {rec: 0.6 * (limit - i) for i, rec in enumerate(content_recs)}
         collab_scores = {rec: 0.4 * (limit - i) for i, rec in enumerate(collab_recs)}
@@ -365,57 +1183,344 @@ class RecommendationEngine:
         for rec, score in collab_scores.items():
             final_scores[rec] += score
         
-        # Sort by final score
-        recommendations = sorted(final_scores.items(), key=lambda x: x[1], reverse=True)
-        
-        # Return top N content IDs
-        return [content_id for content_id, score in recommendations[:limit]]
+        # Select top N content IDs by final score
+        return [content_id for content_id, score in top_k_items(final_scores, limit)]
     
-    def get_popular_content(self, limit=10):
+    def get_popular_content(self, limit=10, content_type=None, genre=None):
         """Get most popular content for cold start situations
         
         Args:
             limit (int): Maximum number of items to return
+            content_type (str, optional): Only include this content type
+            genre (str, optional): Only include content with this genre
             
         Returns:
             list: List of popular content IDs
         """
-        # Sort content by popularity score
-        popular_content = sorted(
-            self.content_database.items(),
-            key=lambda x: x[1].popularity_score,
-            reverse=True
-        )
-        
-        # Return top N content IDs
-        return [content_id for content_id, _ in popular_content[:limit]]
+        # Read top N content IDs from the maintained popularity ranking
+        return self.popularity_index.top(limit, content_type=content_type, genre=genre)
+    
+    def _algorithm_map(self):
+        """Map algorithm names to recommendation methods"""
+        return {
+            "content_based": self.content_based_filtering,
+            "collaborative": self.collaborative_filtering,
+            "hybrid": self.hybrid_filtering
+        }
     
-    def generate_recommendations(self, user_id, algorithm="hybrid", limit=10):
+    def generate_recommendations(self, user_id, algorithm="hybrid", limit=10, fusion=None):
         """Generate recommendations using the specified algorithm
         
         Args:
             user_id (str): User identifier
             algorithm (str): One of 'content_based', 'collaborative', or 'hybrid'
             limit (int): Maximum number of recommendations
+            fusion (str, optional): Hybrid fusion, one of 'rank', 'score' or
+                'rrf'. Defaults to the engine's hybrid_fusion.
             
         Returns:
             list: List of recommended content objects
         """
-        # Map algorithm name to method
-        algorithm_map = {
-            "content_based": self.content_based_filtering,
-            "collaborative": self.collaborative_filtering,
-            "hybrid": self.hybrid_filtering
-        }
+        algorithm_map = self._algorithm_map()
         
         if algorithm not in algorithm_map:
             raise ValueError(f"Algorithm {algorithm} not supported. Use one of: {list(algorithm_map.keys())}")
+        fusion = self._hybrid_fusion(fusion) if algorithm == "hybrid" else None
         
         # Generate recommendation IDs using the selected algorithm
-        recommendation_ids = algorithm_map[algorithm](user_id, limit)
+        if self.result_cache is not None and user_id in self.users:
+            recommendation_ids = self._cached_recommendations(user_id, algorithm, limit, fusion)
+        else:
+            recommendation_ids = self._recommend_ids(user_id, algorithm, limit, fusion)
         
         # Convert IDs to Content objects
         recommendations = [self.content_database[content_id] for content_id in recommendation_ids 
                           if content_id in self.content_database]
         
-        return recommendations
\ No newline at end of file
+        return recommendations
+    
+    def _recommend_ids(self, user_id, algorithm, limit, fusion=None, neighbors=None):
+        """Run one algorithm, passing the fusion mode on to hybrid and the
+        nearest users of a known user, if already found, to the collaborative signal"""
+        if algorithm == "hybrid":
+            return self._hybrid_ids(user_id, limit, self._hybrid_fusion(fusion), neighbors)
+        if algorithm == "collaborative" and neighbors is not None:
+            return self._collaborative_ids(user_id, limit, neighbors)
+        return self._algorithm_map()[algorithm](user_id, limit)
+    
+    def generate_recommendations_batch(self, user_ids, algorithm="hybrid", limit=10, chunk_size=256,
+                                       fusion=None):
+        """Generate recommendations for many users, streamed chunk by chunk
+        
+        Users are processed in chunks of chunk_size, so memory stays bounded
+        however many users are requested. Within a chunk, every algorithm is
+        scored for all users together: content-based scores accumulate one
+        (users x block) weight matrix times block similarity product per
+        block of watched items, and the neighbour search and neighbour
+        history scoring of collaborative filtering run over the whole chunk.
+        Results match generate_recommendations up to the floating-point
+        rounding of the matrix products.
+        
+        Args:
+            user_ids (iterable): User identifiers, consumed lazily
+            algorithm (str): One of 'content_based', 'collaborative', or 'hybrid'
+            limit (int): Maximum number of recommendations per user
+            chunk_size (int): Number of users scored together
+            fusion (str, optional): Hybrid fusion, one of 'rank', 'score' or
+                'rrf'. Defaults to the engine's hybrid_fusion.
+            
+        Yields:
+            tuple: (user_id, list of recommended content objects), in input order
+        """
+        algorithms = ("content_based", "collaborative", "hybrid")
+        if algorithm not in algorithms:
+            raise ValueError(f"Algorithm {algorithm} not supported. Use one of: {list(algorithms)}")
+        fusion = self._hybrid_fusion(fusion) if algorithm == "hybrid" else None
+            
+        user_ids = iter(user_ids)
+        while True:
+            chunk = list(islice(user_ids, chunk_size))
+            if not chunk:
+                return
+                
+            if algorithm == "content_based":
+                rankings = self._content_based_batch(chunk, limit)
+            elif algorithm == "collaborative":
+                rankings = self._collaborative_batch(chunk, limit)
+            elif fusion == "rank":
+                rankings = [self._fuse_rankings(content_recs, collab_recs, limit)
+                            for content_recs, collab_recs in zip(self._content_based_batch(chunk, limit),
+                                                                 self._collaborative_batch(chunk, limit))]
+            else:
+                rankings = self._fused_hybrid_batch(chunk, limit, fusion)
+                
+            for user_id, recommendation_ids in zip(chunk, rankings):
+                yield user_id, [self.content_database[content_id] for content_id in recommendation_ids
+                                if content_id in self.content_database]
+                
+    def _weighted_score_matrix(self, watched_weights, block_size=128):
+        """Completion-weighted similarity of every catalog item for several users
+        
+        The union of the users' watched items is scored in blocks: each block
+        is one block_scores call, accumulated into every user's scores by one
+        (users x block) weight matrix product.
+        
+        Args:
+            watched_weights (list): (watched_id, weight) pairs per user
+            block_size (int): Watched items scored per block
+            
+        Returns:
+            np.ndarray: (users x catalog) score matrix
+        """
+        features = self.content_features
+        scores = np.zeros((len(watched_weights), len(features)), dtype=np.float64)
+        entries = [(user_row, features.index[watched_id], weight)
+                   for user_row, pairs in enumerate(watched_weights) for watched_id, weight in pairs]
+        if not entries:
+            return scores
+            
+        user_rows, rows, weights = (np.array(column) for column in zip(*entries))
+        watched_rows, columns = np.unique(rows, return_inverse=True)
+        order = np.argsort(columns, kind="stable")
+        sorted_columns = columns[order]
+        
+        for start in range(0, watched_rows.size, block_size):
+            stop = min(start + block_size, watched_rows.size)
+            block = order[np.searchsorted(sorted_columns, start):np.searchsorted(sorted_columns, stop)]
+            block_weights = np.zeros((len(watched_weights), stop - start), dtype=np.float64)
+            block_weights[user_rows[block], columns[block] - start] = weights[block]
+            scores += block_weights @ features.block_scores(watched_rows[start:stop])
+        return scores
+    
+    def _content_based_batch(self, user_ids, limit):
+        """Content-based recommendations for a chunk of users
+        
+        Every catalog item is scored for every user with one weighted score
+        matrix, or from the merged item neighbour lists when the engine keeps
+        them. Each user then selects by candidate_fallback: 'exact' ranks
+        every unwatched item, 'none' only those sharing a genre or tag with
+        the history and 'pad' fills short lists from the remaining items.
+        
+        Args:
+            user_ids (list): User identifiers
+            limit (int): Maximum number of recommendations per user
+            
+        Returns:
+            list: List of recommended content IDs per user
+        """
+        self._sync_content_features()
+        features = self.content_features
+        
+        # Unknown users get popular content, users without scorable history nothing
+        rankings = [[] if user_id in self.users else self.get_popular_content(limit) for user_id in user_ids]
+        positions, watched = [], []  # per scored user: position in user_ids, (watched_content, watched_weights)
+        for position, user_id in enumerate(user_ids):
+            if user_id in self.users:
+                watched_content, watched_weights = self._watched_weights(user_id)
+                if watched_weights:
+                    positions.append(position)
+                    watched.append((watched_content, watched_weights))
+                    
+        if self.item_neighbors is not None:
+            for position, recommended in zip(positions, self._merge_item_neighbors_batch(watched, limit)):
+                rankings[position] = [features.content_ids[row] for row in recommended]
+            return rankings
+            
+        scores = self._weighted_score_matrix([watched_weights for _, watched_weights in watched])
+        index = features.index
+        for user_scores, position, (watched_content, watched_weights) in zip(scores, positions, watched):
+            eligible = np.ones(len(features), dtype=bool)
+            eligible[[index[content_id] for content_id in watched_content if content_id in index]] = False
+            if self.candidate_fallback == "exact":
+                rows = np.flatnonzero(eligible)
+            else:
+                candidate_ids = self.content_index.candidates(
+                    watched_id for watched_id, _ in watched_weights
+                ) - watched_content
+                rows = np.sort(np.fromiter((index[content_id] for content_id in candidate_ids),
+                                           dtype=np.int64, count=len(candidate_ids)))
+                
+            # Select top N by score, ties keep catalog order
+            recommended = rows[top_k_indices(user_scores[rows], limit, ties=rows)]
+            
+            if self.candidate_fallback == "pad" and recommended.size < limit:
+                # Fill the remaining slots with the best of the other items
+                eligible[rows] = False
+                other_rows = np.flatnonzero(eligible)
+                padding = other_rows[top_k_indices(user_scores[other_rows], limit - recommended.size,
+                                                   ties=other_rows)]
+                recommended = np.concatenate([recommended, padding])
+                
+            rankings[position] = [features.content_ids[row] for row in recommended]
+        return rankings
+    
+    def _collaborative_batch(self, user_ids, limit):
+        """Collaborative recommendations for a chunk of users
+        
+        Args:
+            user_ids (list): User identifiers
+            limit (int): Maximum number of recommendations per user
+            
+        Returns:
+            list: List of recommended content IDs per user
+        """
+        content_ids = CONTENT_IDS.values
+        scored = iter(self._collaborative_scores_batch([user_id for user_id in user_ids if user_id in self.users]))
+        
+        rankings = []
+        for user_id in user_ids:
+            if user_id not in self.users:
+                rankings.append(self.get_popular_content(limit))
+                continue
+            indices, scores, first_positions = next(scored)
+            # Select top N content IDs by score, ties in order of first appearance
+            top = top_k_indices(scores, limit, ties=first_positions)
+            rankings.append([content_ids[index] for index in indices[top].tolist()])
+        return rankings
+    
+    def _fused_hybrid_batch(self, user_ids, limit, fusion):
+        """Score- or rank-fused hybrid recommendations for a chunk of users
+        
+        Args:
+            user_ids (list): User identifiers
+            limit (int): Maximum number of recommendations per user
+            fusion (str): Either 'score' or 'rrf'
+            
+        Returns:
+            list: List of recommended content IDs per user
+        """
+        known = [user_id for user_id in user_ids if user_id in self.users]
+        self._sync_content_features()
+        watched = [self._watched_weights(user_id) for user_id in known]
+        content_scores = self._weighted_score_matrix([watched_weights for _, watched_weights in watched])
+        fused = iter([
+            self._fuse_scores(watched_content, watched_weights, collab, limit, fusion, user_scores)
+            for (watched_content, watched_weights), collab, user_scores
+            in zip(watched, self._collaborative_scores_batch(known), content_scores)
+        ])
+        return [next(fused) if user_id in self.users else self.get_popular_content(limit) for user_id in user_ids]
+    
+    def _cached_recommendations(self, user_id, algorithm, limit, fusion=None):
+        """Serve a recommendation list from the result cache, computing it on a miss
+        
+        Args:
+            user_id (str): User identifier
+            algorithm (str): Algorithm name
+            limit (int): Maximum number of recommendations
+            fusion (str, optional): Hybrid fusion mode, None for other algorithms
+            
+        Returns:
+            list: List of recommended content IDs
+        """
+        key = (user_id, algorithm, limit, fusion)
+        cached = self.result_cache.lookup(key, self._user_similarities)
+        if cached is not None:
+            content_ids, fresh = cached
+            if fresh:
+                return list(content_ids)
+            if self.stale_while_revalidate:
+                self.result_cache.queue_revalidation(key)
+                return list(content_ids)
+                
+        return self._compute_and_cache(key)
+    
+    def _compute_and_cache(self, key):
+        """Compute a recommendation list of a known user and cache it
+        
+        The list is stored with the items it was computed from and, for
+        neighbour-based algorithms, with the nearest users the
+        recommendation pass was given.
+        
+        Args:
+            key (tuple): (user_id, algorithm, limit, fusion)
+            
+        Returns:
+            list: List of recommended content IDs
+        """
+        user_id, algorithm, limit, fusion = key
+        nearest = neighbors = kth_similarity = None
+        if algorithm != "content_based":
+            nearest = self._nearest_users(user_id, self.COLLABORATIVE_NEIGHBORS)
+            neighbors = [other_id for other_id, _ in nearest]
+            if len(nearest) == self.COLLABORATIVE_NEIGHBORS:
+                kth_similarity = nearest[-1][1]
+                
+        content_ids = self._recommend_ids(user_id, algorithm, limit, fusion, nearest)
+        self.result_cache.store(key, content_ids, self.users[user_id].viewing_history.content_ids(),
+                                neighbors, kth_similarity)
+        return content_ids
+    
+    def _user_similarities(self, user_id, others):
+        """Similarity of a user to several others, for ResultCache.lookup
+        
+        Args:
+            user_id (str): User identifier
+            others (list): User identifiers to compare against
+            
+        Returns:
+            np.ndarray: One similarity per other user
+        """
+        return self._user_similarity_matrix([user_id], others)[0]
+    
+    def refresh_stale_results(self, max_entries=None):
+        """Recompute cached recommendation lists served stale
+        
+        Args:
+            max_entries (int, optional): Maximum number of lists to recompute
+            
+        Returns:
+            int: Number of lists recomputed
+        """
+        if self.result_cache is None:
+            return 0
+            
+        refreshed = 0
+        for key in self.result_cache.pop_revalidations(max_entries):
+            user_id, algorithm, limit, fusion = key
+            cached = self.result_cache.lookup(key, self._user_similarities)
+            if user_id not in self.users or (cached is not None and cached[1]):
+                continue  # user gone, or already recomputed
+            self._compute_and_cache(key)
+            refreshed += 1
+        return refreshed
+
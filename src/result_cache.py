@@ -0,0 +1,217 @@
+from collections import OrderedDict
+
+from src.cache import BoundedCache
+
+# Slack when comparing a changed user's similarity with a k-th neighbour's,
+# so that rounding differences between similarity paths count as a tie
+SIMILARITY_TOLERANCE = 1e-6
+
+
+class ResultCache(BoundedCache):
+    """
+    Materialized recommendation lists keyed by (user_id, algorithm, limit, fusion),
+    where fusion is the hybrid fusion mode and None for other algorithms.
+
+    Changes reach the cache as events, at two strengths:
+
+    - Direct changes drop entries outright. A user's own profile changes
+      drop all of that user's entries. A content item changing drops every
+      entry that recommended it or was scored from it.
+    - Other changes can still move a result without touching it directly.
+      Results computed from neighbours store the neighbour set and the k-th
+      neighbour's similarity. Another user's change marks the entries
+      listing that user as a neighbour stale through a reverse index, and
+      is logged. When an entry is next read, the users changed since it
+      was last checked are compared with its k-th neighbour, so it is stale
+      only if one of them is now at least as similar. Added items bump a
+      catalog generation and scoring metadata changes a content
+      generation, each in O(1), and entries computed under an older
+      generation they depend on are stale too.
+
+    Stale entries can be served while a recomputation is queued
+    (stale-while-revalidate), or simply recomputed.
+    """
+
+    # Generations each algorithm's results depend on: every algorithm can
+    # recommend an added item, but only content-based scores read metadata
+    DEPENDENCIES = {
+        "content_based": ("catalog", "content"),
+        "collaborative": ("catalog",),
+        "hybrid": ("catalog", "content")
+    }
+
+    # Users changed since an entry was last checked beyond which it is
+    # recomputed rather than compared with each of them
+    MAX_CHANGED_USERS = 1024
+
+    def __init__(self, max_entries=100_000, ttl=None, **kwargs):
+        """Initialize an empty cache
+
+        Args:
+            max_entries (int, optional): Maximum number of cached results
+            ttl (float, optional): Seconds a result may be served at all
+        """
+        self._by_user = {}  # user_id -> keys
+        self._by_content = {}  # content_id -> keys of entries depending on it
+        self._content_dependencies = {}  # key -> content_ids
+        # key -> [neighbour user_ids, k-th neighbour similarity, change checked up to]
+        self._neighborhoods = {}
+        self._by_neighbor = {}  # user_id -> keys of entries listing the user as a neighbour
+        self._changed_users = OrderedDict()  # user_id -> number of its latest change, oldest first
+        self._changes = 0
+        self._stale = set()  # keys marked stale by another user's change
+        self._revalidate = {}  # stale keys queued for recomputation, in order
+        self.generations = {"catalog": 0, "content": 0}
+        super().__init__(max_entries=max_entries, ttl=ttl, **kwargs)
+
+    def _entry_removed(self, key):
+        self._unindex(self._by_user, key[0], key)
+        for content_id in self._content_dependencies.pop(key, ()):
+            self._unindex(self._by_content, content_id, key)
+        neighborhood = self._neighborhoods.pop(key, None)
+        if neighborhood is not None:
+            for neighbor_id in neighborhood[0]:
+                self._unindex(self._by_neighbor, neighbor_id, key)
+        self._stale.discard(key)
+        self._revalidate.pop(key, None)
+
+    @staticmethod
+    def _unindex(index, member, key):
+        keys = index.get(member)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[member]
+
+    def _generations_for(self, algorithm):
+        return tuple(self.generations[name] for name in self.DEPENDENCIES[algorithm])
+
+    def lookup(self, key, similarities=None):
+        """Cached result for a key
+
+        Args:
+            key (tuple): (user_id, algorithm, limit, fusion)
+            similarities (callable, optional): Called as similarities(user_id,
+                other_ids), returns the user's similarity to each of them. It
+                checks neighbour-based entries against the users changed
+                since; without it such changes make them stale.
+
+        Returns:
+            tuple: (content IDs, fresh) or None when nothing is cached
+        """
+        entry = self.get(key)
+        if entry is None:
+            return None
+        content_ids, generations = entry
+        fresh = key not in self._stale and generations == self._generations_for(key[1])
+        if fresh and key in self._neighborhoods:
+            fresh = self._neighborhood_fresh(key, similarities)
+        return content_ids, fresh
+
+    def _neighborhood_fresh(self, key, similarities):
+        """Check whether a user changed since an entry was checked joins its neighbourhood"""
+        neighborhood = self._neighborhoods[key]
+        kth_similarity, checked = neighborhood[1], neighborhood[2]
+        changed = []
+        for user_id, change in reversed(self._changed_users.items()):
+            if change <= checked or len(changed) > self.MAX_CHANGED_USERS:
+                break
+            changed.append(user_id)
+
+        if changed and (similarities is None or kth_similarity == float("-inf")
+                        or len(changed) > self.MAX_CHANGED_USERS
+                        or max(similarities(key[0], changed)) >= kth_similarity - SIMILARITY_TOLERANCE):
+            self._stale.add(key)
+            return False
+        neighborhood[2] = self._changes
+        return True
+
+    def store(self, key, content_ids, dependencies=(), neighbors=None, kth_similarity=None):
+        """Cache a freshly computed result
+
+        Args:
+            key (tuple): (user_id, algorithm, limit, fusion)
+            content_ids (list): Recommended content IDs
+            dependencies (iterable): Other content IDs the result was computed
+                from, such as the user's watched items
+            neighbors (iterable, optional): IDs of the users the result was
+                computed from, for neighbour-based algorithms
+            kth_similarity (float, optional): Similarity of the k-th
+                neighbour, None when there were fewer than k so that any
+                user could join the neighbourhood
+        """
+        if key in self._entries:
+            self._remove(key)
+
+        self[key] = (tuple(content_ids), self._generations_for(key[1]))
+        self._by_user.setdefault(key[0], set()).add(key)
+
+        dependencies = set(content_ids).union(dependencies)
+        self._content_dependencies[key] = dependencies
+        for content_id in dependencies:
+            self._by_content.setdefault(content_id, set()).add(key)
+
+        if neighbors is not None:
+            neighbors = frozenset(neighbors)
+            self._neighborhoods[key] = [neighbors, float("-inf") if kth_similarity is None else kth_similarity,
+                                        self._changes]
+            for neighbor_id in neighbors:
+                self._by_neighbor.setdefault(neighbor_id, set()).add(key)
+
+    def queue_revalidation(self, key):
+        """Remember a stale key to recompute later
+
+        Args:
+            key (tuple): (user_id, algorithm, limit, fusion)
+        """
+        self._revalidate[key] = None
+
+    def pop_revalidations(self, max_entries=None):
+        """Take queued stale keys, oldest first
+
+        Args:
+            max_entries (int, optional): Maximum number of keys to take
+
+        Returns:
+            list: Keys to recompute
+        """
+        keys = list(self._revalidate)[:max_entries]
+        for key in keys:
+            del self._revalidate[key]
+        return keys
+
+    @property
+    def pending(self):
+        """Number of stale keys queued for recomputation"""
+        return len(self._revalidate)
+
+    def user_changed(self, user_id):
+        """Drop a user's results and mark the results listing it as a neighbour stale
+
+        Whether the user joins other neighbourhoods is checked when they are
+        next read.
+
+        Args:
+            user_id (str): User whose profile changed or who was added
+        """
+        for key in list(self._by_user.get(user_id, ())):
+            self._remove(key)
+        self._stale.update(self._by_neighbor.get(user_id, ()))
+
+        if not self._neighborhoods:
+            self._changed_users.clear()  # No entry left to check them against
+            return
+        self._changes += 1
+        self._changed_users[user_id] = self._changes
+        self._changed_users.move_to_end(user_id)
+
+    def content_changed(self, content_id, added=False):
+        """Drop results depending on an item and mark the others stale
+
+        Args:
+            content_id (str): Content item whose scoring metadata changed
+            added (bool): The item is new to the catalog
+        """
+        for key in list(self._by_content.get(content_id, ())):
+            self._remove(key)
+        self.generations["catalog" if added else "content"] += 1
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = ("content_based", "collaborative", "hybrid")
+
+FUSIONS = ("rank", "score", "rrf")
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+    503: "Service Unavailable"
+}
+
+
+class ServiceOverloaded(Exception):
+    """Raised when a request arrives while the pending-work queue is full"""
+
+
+class RecommendationService:
+    """
+    asyncio front-end serving recommendations over a local HTTP/JSON API.
+
+    Identical in-flight requests, meaning the same (user_id, algorithm,
+    limit, fusion), are coalesced: later callers await the computation already
+    running instead of starting their own. Scoring runs in a thread pool so
+    the event loop keeps accepting connections. The engine is not
+    thread-safe, so engine calls are serialized by a lock: only one
+    computation scores at a time, whatever the number of threads. When the
+    engine serves stale cached results (stale_while_revalidate), they are
+    refreshed in the background after the response.
+
+    Backpressure: at most max_concurrency computations are handed to the
+    executor at once, where they wait for the engine lock in turn, and at
+    most max_pending may be admitted (running or waiting). max_concurrency
+    therefore controls admission to the executor, not parallel scoring.
+    Requests beyond max_pending are rejected straight away with HTTP 503
+    and a Retry-After header instead of queueing without bound, which keeps
+    tail latency of admitted requests bounded during bursts. Unexpected
+    errors are logged and answered with HTTP 500.
+
+    Endpoints:
+        GET /recommendations?user_id=...&algorithm=hybrid&limit=10&fusion=rank
+        GET /stats
+        GET /health
+    """
+
+    def __init__(self, engine, max_concurrency=4, max_pending=64, max_limit=100, executor=None):
+        """Initialize the service
+
+        Args:
+            engine (RecommendationEngine): Engine to serve
+            max_concurrency (int): Computations handed to the executor at
+                once; the engine lock still scores them one at a time
+            max_pending (int): Computations admitted before requests are rejected
+            max_limit (int): Largest accepted limit parameter
+            executor (concurrent.futures.Executor, optional): Executor for
+                scoring. Defaults to a thread pool of max_concurrency threads.
+        """
+        self.engine = engine
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.max_limit = max_limit
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_concurrency)
+        self._owns_executor = executor is None
+        self._engine_lock = threading.Lock()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = {}  # (user_id, algorithm, limit, fusion) -> task
+        self._revalidation = None  # task refreshing stale cached results
+        self._server = None
+
+        self.requests = 0
+        self.computations = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def _recommend_sync(self, user_id, algorithm, limit, fusion):
+        """Run the engine in an executor thread"""
+        with self._engine_lock:
+            recommendations = self.engine.generate_recommendations(user_id, algorithm=algorithm, limit=limit,
+                                                                   fusion=fusion)
+        return [
+            {
+                "content_id": content.content_id,
+                "title": content.title,
+                "content_type": content.content_type,
+                "genres": list(content.genres),
+                "popularity_score": content.popularity_score
+            }
+            for content in recommendations
+        ]
+
+    async def recommend(self, user_id, algorithm="hybrid", limit=10, fusion=None):
+        """Recommendations for a user, sharing identical in-flight computations
+
+        Args:
+            user_id (str): User identifier
+            algorithm (str): One of 'content_based', 'collaborative', or 'hybrid'
+            limit (int): Maximum number of recommendations
+            fusion (str, optional): Hybrid fusion, one of 'rank', 'score' or
+                'rrf'. Defaults to the engine's default.
+
+        Returns:
+            list: Recommended content as JSON-ready dictionaries
+
+        Raises:
+            ServiceOverloaded: If max_pending computations are already admitted
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Algorithm {algorithm} not supported. Use one of: {list(ALGORITHMS)}")
+        if fusion is not None and fusion not in FUSIONS:
+            raise ValueError(f"Fusion {fusion} not supported. Use one of: {list(FUSIONS)}")
+
+        self.requests += 1
+        key = (user_id, algorithm, limit, fusion if algorithm == "hybrid" else None)
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            if len(self._in_flight) >= self.max_pending:
+                self.rejected += 1
+                raise ServiceOverloaded(f"{len(self._in_flight)} computations pending")
+
+            task = asyncio.ensure_future(self._compute(key))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # A cancelled caller must not cancel the computation others wait on
+        result = await asyncio.shield(task)
+        self._schedule_revalidation()
+        return result
+    
+    def _schedule_revalidation(self):
+        """Refresh results the engine served stale, in the background"""
+        result_cache = getattr(self.engine, "result_cache", None)
+        if result_cache is None or not result_cache.pending or self._revalidation is not None:
+            return
+        self._revalidation = asyncio.ensure_future(self._revalidate())
+        
+    async def _revalidate(self):
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, self._refresh_sync)
+        finally:
+            self._revalidation = None
+            
+    def _refresh_sync(self):
+        with self._engine_lock:
+            self.engine.refresh_stale_results()
+
+    async def _compute(self, key):
+        async with self._semaphore:
+            self.computations += 1
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._recommend_sync, *key)
+
+    def stats(self):
+        """Request counters
+
+        Returns:
+            dict: requests, computations, coalesced, rejected and in-flight counts
+        """
+        return {
+            "requests": self.requests,
+            "computations": self.computations,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "in_flight": len(self._in_flight)
+        }
+
+    async def handle(self, method, target):
+        """Route one HTTP request
+
+        Args:
+            method (str): HTTP method
+            target (str): Request target (path and query string)
+
+        Returns:
+            tuple: (status code, JSON-ready body, extra headers)
+        """
+        if method != "GET":
+            return 405, {"error": "Only GET is supported"}, {"Allow": "GET"}
+
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok"}, {}
+        if url.path == "/stats":
+            return 200, self.stats(), {}
+        if url.path != "/recommendations":
+            return 404, {"error": f"Unknown path {url.path}"}, {}
+
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        user_id = query.get("user_id")
+        algorithm = query.get("algorithm", "hybrid")
+        if not user_id:
+            return 400, {"error": "user_id is required"}, {}
+        if algorithm not in ALGORITHMS:
+            return 400, {"error": f"Algorithm {algorithm} not supported. Use one of: {list(ALGORITHMS)}"}, {}
+        fusion = query.get("fusion")
+        if fusion is not None and fusion not in FUSIONS:
+            return 400, {"error": f"Fusion {fusion} not supported. Use one of: {list(FUSIONS)}"}, {}
+        try:
+            limit = int(query.get("limit", 10))
+        except ValueError:
+            return 400, {"error": "limit must be an integer"}, {}
+        if not 1 <= limit <= self.max_limit:
+            return 400, {"error": f"limit must be between 1 and {self.max_limit}"}, {}
+
+        try:
+            recommendations = await self.recommend(user_id, algorithm, limit, fusion)
+        except ServiceOverloaded as error:
+            return 503, {"error": f"Service overloaded: {error}"}, {"Retry-After": "1"}
+
+        return 200, {
+            "user_id": user_id,
+            "algorithm": algorithm,
+            "limit": limit,
+            "recommendations": recommendations
+        }, {}
+
+    async def _handle_connection(self, reader, writer):
+        """Serve one HTTP/1.x request and close the connection"""
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # headers are not needed for GET requests
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) != 3:
+                status, body, headers = 400, {"error": "Malformed request line"}, {}
+            else:
+                try:
+                    status, body, headers = await self.handle(parts[0], parts[1])
+                except Exception:
+                    logger.exception("Error serving %s %s", parts[0], parts[1])
+                    status, body, headers = 500, {"error": "Internal server error"}, {}
+
+            payload = json.dumps(body).encode()
+            head = [f"HTTP/1.1 {status} {HTTP_REASONS[status]}",
+                    "Content-Type: application/json",
+                    f"Content-Length: {len(payload)}",
+                    "Connection: close"]
+            head.extend(f"{name}: {value}" for name, value in headers.items())
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8000):
+        """Start listening
+
+        Args:
+            host (str): Interface to bind
+            port (int): TCP port, 0 for any free port
+
+        Returns:
+            int: The port actually bound
+        """
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, host="127.0.0.1", port=8000):
+        """Start listening and serve until cancelled
+
+        Args:
+            host (str): Interface to bind
+            port (int): TCP port
+        """
+        await self.start(host, port)
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Stop listening and release the executor"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
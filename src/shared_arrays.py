@@ -0,0 +1,54 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Offsets are aligned so every array view starts on a cache line
+ALIGNMENT = 64
+
+
+class SharedArrays:
+    """
+    Named NumPy arrays packed into one shared memory segment.
+
+    The arrays are copied in once and read back as zero-copy read-only
+    views. Processes forked afterwards inherit the mapping, so they all
+    read the same physical pages.
+    """
+
+    def __init__(self, arrays):
+        """Create a segment holding `arrays`
+
+        Args:
+            arrays (dict): Name -> array to copy into the segment
+        """
+        self.layout = {}  # name -> (offset, dtype, shape)
+        offset = 0
+        for key, array in arrays.items():
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            self.layout[key] = (offset, array.dtype.str, array.shape)
+            offset += array.nbytes
+
+        self._segment = shared_memory.SharedMemory(create=True, size=max(1, offset))
+        for key, array in arrays.items():
+            np.copyto(self._view(key, writeable=True), array)
+
+    def __getitem__(self, key):
+        return self._view(key, writeable=False)
+
+    def _view(self, key, writeable):
+        offset, dtype, shape = self.layout[key]
+        view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=self._segment.buf, offset=offset)
+        view.flags.writeable = writeable
+        return view
+
+    def close(self):
+        """Detach from the segment and free it
+
+        If views are still referenced the mapping stays alive until they are
+        released; the segment name is freed either way.
+        """
+        try:
+            self._segment.close()
+        except BufferError:
+            pass
+        self._segment.unlink()
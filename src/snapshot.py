@@ -0,0 +1,535 @@
+import json
+import math
+import os
+from collections import defaultdict
+from collections.abc import Sequence
+from itertools import count
+
+import numpy as np
+
+from src.content_metadata import Content
+from src.lazy_mapping import LazyMapping
+from src.rating_map import RatingMap
+from src.user_index import ExactUserIndex
+from src.user_profile import UserProfile
+from src.viewing_history import ViewingHistory, from_epoch_micros, to_epoch_micros
+from src.vocabulary import CONTENT_IDS, USER_IDS
+
+MAGIC = b"RECSNAP1"
+VERSION = 1
+
+# Array offsets are aligned so every memory-mapped column starts on a cache line
+ALIGNMENT = 64
+
+# Stored release date of content without one
+_NO_DATE = np.iinfo(np.int64).min
+
+
+class StringTable(Sequence):
+    """
+    Strings stored as one UTF-8 blob, each followed by a NUL byte.
+
+    offsets[i] is the byte offset of string i, so single strings are decoded
+    on demand without touching the rest of the blob. Missing values (None)
+    are flagged in a separate mask.
+    """
+
+    def __init__(self, blob, offsets, missing):
+        """Wrap stored columns
+
+        Args:
+            blob (np.ndarray): uint8 string bytes
+            offsets (np.ndarray): int64 start offsets, one more than strings
+            missing (np.ndarray): bool mask of None values
+        """
+        self._blob = blob
+        self._offsets = offsets
+        self._missing = missing
+
+    @staticmethod
+    def pack(values):
+        """Encode strings into (blob, offsets, missing) columns
+
+        Args:
+            values (iterable): Strings or None
+
+        Returns:
+            tuple: uint8 blob, int64 offsets and bool missing mask
+        """
+        values = list(values)
+        missing = np.array([value is None for value in values], dtype=bool)
+        encoded = [b"" if value is None else str(value).encode() for value in values]
+        if any(b"\0" in value for value in encoded):
+            raise ValueError("Strings containing NUL characters cannot be stored in a snapshot")
+
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) + 1 for value in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(value + b"\0" for value in encoded), dtype=np.uint8)
+        return blob, offsets, missing
+
+    def __len__(self):
+        return self._offsets.size - 1
+
+    def __getitem__(self, position):
+        if self._missing[position]:
+            return None
+        return bytes(self._blob[self._offsets[position]:self._offsets[position + 1] - 1]).decode()
+
+    def tolist(self):
+        """Decode every string at once
+
+        Returns:
+            list: Strings, None where missing
+        """
+        if not len(self):
+            return []
+        values = bytes(self._blob).decode().split("\0")[:-1]
+        for position in np.flatnonzero(self._missing).tolist():
+            values[position] = None
+        return values
+
+
+def _csr(lists, dtype):
+    """Flatten lists into (offsets, values) columns"""
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(values) for values in lists], out=offsets[1:])
+    values = np.fromiter((value for values in lists for value in values), dtype=dtype, count=offsets[-1])
+    return offsets, values
+
+
+def _interned(vocabulary, values):
+    """Mapping from positions in a stored table to IDs in a live vocabulary"""
+    return np.fromiter((vocabulary.intern(value) for value in values), dtype=np.int64, count=len(values))
+
+
+def _is_identity(mapping):
+    return bool(np.array_equal(mapping, np.arange(mapping.size)))
+
+
+def save_snapshot(engine, filepath, metadata=None):
+    """Write an engine's model to a binary columnar snapshot
+
+    The file holds a header, string tables for IDs, genres, tags and display
+    text, and NumPy columns for content metadata, ratings, preferences and
+    viewing histories. It also holds the derived scoring structures: the
+    content feature matrix, the preference and MinHash signature matrices,
+    and the item neighbour table when built. The file is written under a
+    temporary name and renamed into place, so readers never see a partial
+    snapshot.
+
+    Args:
+        engine (RecommendationEngine): Engine to save
+        filepath (str): Snapshot path
+        metadata (dict, optional): JSON-serializable values stored in the
+            header, read back with snapshot_metadata()
+    """
+    engine._sync_content_features()
+    arrays = {}
+
+    def strings(name, values):
+        arrays[f"{name}/blob"], arrays[f"{name}/offsets"], arrays[f"{name}/missing"] = StringTable.pack(values)
+
+    contents = list(engine.content_database.values())
+    genres, tags, types, names = {}, {}, {}, {}
+
+    def codes(vocab, values):
+        return [vocab.setdefault(value, len(vocab)) for value in values]
+
+    strings("content/ids", [content.content_id for content in contents])
+    strings("content/titles", [content.title for content in contents])
+    strings("content/descriptions", [content.description for content in contents])
+    arrays["content/types"] = np.array(codes(types, [content.content_type for content in contents]),
+                                       dtype=np.int32)
+    arrays["content/popularity"] = np.array([content.popularity_score for content in contents], dtype=np.float64)
+    arrays["content/release_dates"] = np.array(
+        [_NO_DATE if content.release_date is None else to_epoch_micros(content.release_date)
+         for content in contents], dtype=np.int64)
+    arrays["content/durations"] = np.array(
+        [math.nan if content.duration is None else content.duration for content in contents], dtype=np.float64)
+    arrays["content/genre_offsets"], arrays["content/genres"] = _csr(
+        [codes(genres, content.genres) for content in contents], np.int32)
+    arrays["content/tag_offsets"], arrays["content/tags"] = _csr(
+        [codes(tags, content.tags) for content in contents], np.int32)
+    arrays["content/actor_offsets"], arrays["content/actors"] = _csr(
+        [codes(names, content.actors) for content in contents], np.int32)
+    arrays["content/director_offsets"], arrays["content/directors"] = _csr(
+        [codes(names, content.directors) for content in contents], np.int32)
+    arrays["content/rating_offsets"], arrays["content/rating_users"] = _csr(
+        [content.ratings._users for content in contents], np.int32)
+    arrays["content/ratings"] = np.concatenate(
+        [np.frombuffer(content.ratings._values, dtype=np.float64) for content in contents]
+    ) if contents else np.zeros(0, dtype=np.float64)
+    arrays["content/rating_totals"] = np.array([content.ratings._total for content in contents], dtype=np.float64)
+    popularity_index = engine.popularity_index
+    arrays["content/sequence"] = np.array([popularity_index._sequence[content.content_id] for content in contents],
+                                          dtype=np.int64)
+
+    users = list(engine.users.values())
+    preference_keys = {}
+    strings("users/ids", [user.user_id for user in users])
+    strings("users/names", [user.username for user in users])
+    arrays["users/preference_offsets"], arrays["users/preference_genres"] = _csr(
+        [codes(preference_keys, user.preferences) for user in users], np.int32)
+    arrays["users/preference_scores"] = np.fromiter(
+        (score for user in users for score in user.preferences.values()), dtype=np.float64,
+        count=arrays["users/preference_offsets"][-1])
+
+    histories = [user.viewing_history for user in users]
+    arrays["users/history_offsets"] = np.zeros(len(users) + 1, dtype=np.int64)
+    np.cumsum([len(history) for history in histories], out=arrays["users/history_offsets"][1:])
+    for name, empty in ViewingHistory._EMPTY.items():
+        arrays[f"history/{name[1:]}"] = (np.concatenate([getattr(history, name)[:len(history)] for history in histories])
+                                         if histories else empty)
+
+    # Derived scoring structures, in users order
+    signatures = engine.history_signatures
+    arrays["users/signatures"] = (signatures._signatures[[signatures.index[user.user_id] for user in users]]
+                                  if users else np.zeros((0, engine.minhasher.num_perm), dtype=np.uint32))
+    preference_matrix = engine.preference_matrix
+    arrays["users/preference_rows"] = (preference_matrix._rows[[preference_matrix.index[user.user_id]
+                                                                for user in users]]
+                                       if users else np.zeros((0, 1), dtype=np.float32))
+
+    features = engine.content_features
+    n = len(features)
+    content_positions = {content.content_id: position for position, content in enumerate(contents)}
+    arrays["features/content"] = np.array([content_positions[content_id] for content_id in features.content_ids],
+                                          dtype=np.int64)
+    for name in ("_genres", "_tags"):
+        arrays[f"features/{name[1:]}"] = np.ascontiguousarray(getattr(features, name)[:, :n])
+    for name in ("_genre_counts", "_tag_counts", "_types", "_ratings", "_popularity"):
+        arrays[f"features/{name[1:]}"] = getattr(features, name)[:n]
+    strings("features/genre_vocab", list(features.genre_vocab))
+    strings("features/tag_vocab", list(features.tag_vocab))
+    strings("features/type_vocab", list(features.type_vocab))
+
+    table = engine.item_neighbors
+    if table is not None and table.built:
+        for name in ("_neighbors", "_scores", "_counts"):
+            arrays[f"neighbors/{name[1:]}"] = getattr(table, name)[:len(table)]
+
+    # Global vocabularies that histories and rating maps index into, taken
+    # last: building deferred users and ratings above can intern new IDs
+    strings("watched_ids", list(CONTENT_IDS.values))
+    strings("rater_ids", list(USER_IDS.values))
+    strings("genres", list(genres))
+    strings("tags", list(tags))
+    strings("types", list(types))
+    strings("names", list(names))
+    strings("preference_keys", list(preference_keys))
+    strings("preference_vocab", list(preference_matrix.genre_vocab))
+
+    header = {
+        "version": VERSION,
+        "minhash": [engine.minhasher.num_perm, engine.minhasher.seed],
+        "item_neighbors": table.size if table is not None and table.built else None,
+        "metadata": metadata or {},
+        "arrays": {}
+    }
+    # Offsets are relative to the end of the header block
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        header["arrays"][name] = [offset, array.dtype.str, list(array.shape)]
+        offset += array.nbytes
+    encoded_header = json.dumps(header).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(encoded_header)) // ALIGNMENT) * ALIGNMENT
+
+    directory = os.path.dirname(filepath)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{filepath}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(MAGIC)
+        file.write(len(encoded_header).to_bytes(8, "little"))
+        file.write(encoded_header)
+        for name, array in arrays.items():
+            file.seek(data_start + header["arrays"][name][0])
+            file.write(np.ascontiguousarray(array).tobytes())
+        file.truncate(data_start + offset)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, filepath)
+
+
+class _Snapshot:
+    """Columns of a memory-mapped snapshot file"""
+
+    def __init__(self, filepath):
+        # Copy-on-write: restored model arrays stay writable, the file is never modified
+        raw = np.memmap(filepath, dtype=np.uint8, mode="c")
+        if bytes(raw[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{filepath} is not a recommendation snapshot")
+        header_length = int.from_bytes(bytes(raw[len(MAGIC):len(MAGIC) + 8]), "little")
+        header_end = len(MAGIC) + 8 + header_length
+        self.header = json.loads(bytes(raw[len(MAGIC) + 8:header_end]))
+        if self.header["version"] != VERSION:
+            raise ValueError(f"Snapshot version {self.header['version']} not supported. Use one of: [{VERSION}]")
+
+        # Plain ndarray views of the mapping slice faster than np.memmap ones
+        data_start = -(-header_end // ALIGNMENT) * ALIGNMENT
+        self._raw = np.asarray(raw)[data_start:]
+        self._arrays = {}
+
+    def __contains__(self, name):
+        return name in self.header["arrays"]
+
+    def __getitem__(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            offset, dtype, shape = self.header["arrays"][name]
+            dtype = np.dtype(dtype)
+            size = dtype.itemsize * math.prod(shape)
+            array = self._arrays[name] = self._raw[offset:offset + size].view(dtype).reshape(shape)
+        return array
+
+    def strings(self, name):
+        return StringTable(self[f"{name}/blob"], self[f"{name}/offsets"], self[f"{name}/missing"])
+
+
+def snapshot_metadata(filepath):
+    """Metadata stored by save_snapshot, without restoring the model
+
+    Args:
+        filepath (str): Snapshot path
+
+    Returns:
+        dict: The stored metadata
+    """
+    return _Snapshot(filepath).header.get("metadata", {})
+
+
+def snapshot_history_lengths(filepath):
+    """Number of viewing records of each stored user, without building users
+
+    Args:
+        filepath (str): Snapshot path
+
+    Returns:
+        dict: user_id -> number of viewing records
+    """
+    snapshot = _Snapshot(filepath)
+    return dict(zip(snapshot.strings("users/ids").tolist(), np.diff(snapshot["users/history_offsets"]).tolist()))
+
+
+class _SnapshotLoader:
+    """Restores an engine from a snapshot and builds its objects on demand"""
+
+    def __init__(self, engine, snapshot):
+        self.engine = engine
+        self.snapshot = snapshot
+
+        watched = _interned(CONTENT_IDS, snapshot.strings("watched_ids").tolist())
+        history_content = snapshot["history/content"]
+        if not _is_identity(watched):
+            history_content = watched[history_content].astype(np.int32)
+        self.history = (history_content, snapshot["history/duration"], snapshot["history/completion"],
+                        snapshot["history/timestamp"])
+
+        raters = _interned(USER_IDS, snapshot.strings("rater_ids").tolist())
+        self.raters = None if _is_identity(raters) else raters
+
+        self.genres = snapshot.strings("genres").tolist()
+        self.tags = snapshot.strings("tags").tolist()
+        self.types = snapshot.strings("types").tolist()
+        self.names = snapshot.strings("names")
+        self.preference_keys = snapshot.strings("preference_keys").tolist()
+        self.titles = snapshot.strings("content/titles")
+        self.descriptions = snapshot.strings("content/descriptions")
+        self.usernames = snapshot.strings("users/names")
+
+        self.content_ids = snapshot.strings("content/ids").tolist()
+        self.user_ids = snapshot.strings("users/ids").tolist()
+        self.content_positions = dict(zip(self.content_ids, range(len(self.content_ids))))
+        self.user_positions = dict(zip(self.user_ids, range(len(self.user_ids))))
+
+    def restore(self):
+        """Point the engine at the snapshot's users, content and model arrays"""
+        engine, snapshot = self.engine, self.snapshot
+        engine.content_database = LazyMapping(self.content_ids, self.content)
+        engine.users = LazyMapping(self.user_ids, self.user)
+
+        self._restore_features()
+        self._restore_content_indexes()
+
+        signatures = engine.history_signatures
+        signatures.keys = list(self.user_ids)
+        signatures.index = dict(self.user_positions)
+        if self.user_ids:
+            signatures._signatures = snapshot["users/signatures"]
+
+        preference_matrix = engine.preference_matrix
+        preference_matrix.keys = list(self.user_ids)
+        preference_matrix.index = dict(self.user_positions)
+        preference_matrix.genre_vocab = {genre: column for column, genre in
+                                         enumerate(snapshot.strings("preference_vocab").tolist())}
+        if self.user_ids:
+            preference_matrix._rows = snapshot["users/preference_rows"]
+
+        # The exact index only needs IDs; other indexes bucket whole profiles
+        if type(engine.neighbor_index) is ExactUserIndex:
+            engine.neighbor_index.update_ids(self.user_ids)
+        else:
+            for user_id in self.user_ids:
+                engine.neighbor_index.update(engine.users[user_id])
+
+        table = engine.item_neighbors
+        if table is not None and "neighbors/neighbors" in snapshot and table.size == snapshot.header["item_neighbors"]:
+            table._neighbors = snapshot["neighbors/neighbors"]
+            table._scores = snapshot["neighbors/scores"]
+            table._counts = snapshot["neighbors/counts"]
+            table._rows = table._counts.size
+            table.built = True
+
+    def _restore_features(self):
+        features, snapshot = self.engine.content_features, self.snapshot
+        features.content_ids = [self.content_ids[position] for position in snapshot["features/content"].tolist()]
+        features.index = dict(zip(features.content_ids, range(len(features.content_ids))))
+        features.genre_vocab = {genre: row for row, genre in enumerate(snapshot.strings("features/genre_vocab").tolist())}
+        features.tag_vocab = {tag: row for row, tag in enumerate(snapshot.strings("features/tag_vocab").tolist())}
+        features.type_vocab = {content_type: code
+                               for code, content_type in enumerate(snapshot.strings("features/type_vocab").tolist())}
+        if features.content_ids:
+            for name in ("_genres", "_tags", "_genre_counts", "_tag_counts", "_types", "_ratings", "_popularity"):
+                setattr(features, name, snapshot[f"features/{name[1:]}"])
+        features._operands = None
+
+    def _restore_content_indexes(self):
+        """Rebuild the popularity ranking and genre/tag postings from the columns"""
+        engine, snapshot = self.engine, self.snapshot
+        content_ids = self.content_ids
+        genre_offsets = snapshot["content/genre_offsets"].tolist()
+        genre_codes = snapshot["content/genres"].tolist()
+        tag_offsets = snapshot["content/tag_offsets"].tolist()
+        tag_codes = snapshot["content/tags"].tolist()
+        types = [self.types[code] for code in snapshot["content/types"].tolist()]
+        popularity = snapshot["content/popularity"]
+        sequence = snapshot["content/sequence"]
+
+        item_genres = [frozenset(self.genres[code] for code in genre_codes[start:stop])
+                       for start, stop in zip(genre_offsets, genre_offsets[1:])]
+        item_tags = [frozenset(self.tags[code] for code in tag_codes[start:stop])
+                     for start, stop in zip(tag_offsets, tag_offsets[1:])]
+
+        index = engine.popularity_index
+        index._sequence = dict(zip(content_ids, sequence.tolist()))
+        index._counter = count(int(sequence.max()) + 1 if sequence.size else 0)
+        popularity_list, sequence_list = popularity.tolist(), sequence.tolist()
+        by_type, by_genre = defaultdict(list), defaultdict(list)
+        ranking = []
+        for position in np.lexsort((sequence, -popularity)).tolist():
+            key = (-popularity_list[position], sequence_list[position], content_ids[position])
+            ranking.append(key)
+            by_type[types[position]].append(key)
+            for genre in item_genres[position]:
+                by_genre[genre].append(key)
+            index._entries[content_ids[position]] = (key, types[position], item_genres[position])
+        index._ranking, index._by_type, index._by_genre = ranking, by_type, by_genre
+
+        content_index = engine.content_index
+        empty = content_index.EMPTY
+        for content_id, genres, tags in zip(content_ids, item_genres, item_tags):
+            keys = frozenset([("genre", genre) for genre in genres] or [("genre", empty)]).union(
+                [("tag", tag) for tag in tags] or [("tag", empty)])
+            for key in keys:
+                content_index.postings[key].add(content_id)
+            content_index._keys[content_id] = keys
+
+    def content(self, content_id):
+        """Build the Content object of a stored item"""
+        snapshot = self.snapshot
+        position = self.content_positions[content_id]
+
+        content = Content(content_id, self.titles[position], self.types[int(snapshot["content/types"][position])])
+        content.popularity_score = float(snapshot["content/popularity"][position])
+        content.genres = [self.genres[code] for code in self._slice("content/genre", position).tolist()]
+        content.tags = [self.tags[code] for code in self._slice("content/tag", position).tolist()]
+
+        release_date = int(snapshot["content/release_dates"][position])
+        content.release_date = None if release_date == _NO_DATE else from_epoch_micros(release_date)
+        duration = float(snapshot["content/durations"][position])
+        content.duration = None if math.isnan(duration) else int(duration) if duration.is_integer() else duration
+
+        # Display text and rating maps are read from the columns on first access
+        start, stop = snapshot["content/rating_offsets"][position:position + 2].tolist()
+        content.defer(self.content_fields, stop - start, float(snapshot["content/rating_totals"][position]))
+
+        content.add_listener(self.engine._on_content_changed)
+        return content
+
+    def content_fields(self, content_id):
+        """Deferred fields of a stored item, see Content.defer()"""
+        snapshot = self.snapshot
+        position = self.content_positions[content_id]
+
+        start, stop = snapshot["content/rating_offsets"][position:position + 2].tolist()
+        raters = snapshot["content/rating_users"][start:stop]
+        ratings = snapshot["content/ratings"][start:stop]
+        if self.raters is not None:
+            raters = self.raters[raters]
+            order = np.argsort(raters, kind="stable")
+            raters, ratings = raters[order], ratings[order]
+
+        return {
+            "description": self.descriptions[position],
+            "actors": [self.names[code] for code in self._slice("content/actor", position).tolist()],
+            "directors": [self.names[code] for code in self._slice("content/director", position).tolist()],
+            "ratings": RatingMap.from_arrays(raters.tolist(), ratings.tolist(),
+                                             float(snapshot["content/rating_totals"][position]))
+        }
+
+    def _slice(self, name, position):
+        start, stop = self.snapshot[f"{name}_offsets"][position:position + 2].tolist()
+        return self.snapshot[f"{name}s"][start:stop]
+
+    def user(self, user_id):
+        """Build the UserProfile of a stored user"""
+        engine, snapshot = self.engine, self.snapshot
+        position = self.user_positions[user_id]
+
+        user = UserProfile(user_id, self.usernames[position], minhasher=engine.minhasher)
+        start, stop = snapshot["users/preference_offsets"][position:position + 2].tolist()
+        user.preferences = dict(zip(
+            [self.preference_keys[code] for code in snapshot["users/preference_genres"][start:stop].tolist()],
+            snapshot["users/preference_scores"][start:stop].tolist()
+        ))
+
+        start, stop = snapshot["users/history_offsets"][position:position + 2].tolist()
+        user.viewing_history = ViewingHistory.from_columns(*(column[start:stop] for column in self.history))
+        if stop > start:
+            user.history_signature = np.array(snapshot["users/signatures"][position])
+
+        user.add_listener(engine._on_user_changed)
+        return user
+
+
+def load_snapshot(filepath, engine=None):
+    """Restore an engine from a snapshot written by save_snapshot
+
+    The file is memory-mapped: model arrays are used in place (copy-on-write,
+    so the engine can still change them) and pages are read only when
+    touched. UserProfile and Content objects are built on first access, so
+    startup cost does not depend on history or catalog detail.
+
+    Args:
+        filepath (str): Snapshot path
+        engine (RecommendationEngine, optional): Empty engine to restore
+            into. Defaults to a new engine matching the snapshot's MinHash
+            and item neighbour settings.
+
+    Returns:
+        RecommendationEngine: The restored engine
+    """
+    snapshot = _Snapshot(filepath)
+    num_perm, seed = snapshot.header["minhash"]
+    if engine is None:
+        from src.recommendation_engine import RecommendationEngine
+        engine = RecommendationEngine(minhash_permutations=num_perm, item_neighbors=snapshot.header["item_neighbors"])
+    elif engine.users or engine.content_database:
+        raise ValueError("Snapshots can only be loaded into an empty engine")
+    if (engine.minhasher.num_perm, engine.minhasher.seed) != (num_perm, seed):
+        raise ValueError(f"Snapshot signatures use {num_perm} MinHash permutations (seed {seed}), "
+                         f"the engine uses {engine.minhasher.num_perm} (seed {engine.minhasher.seed})")
+
+    _SnapshotLoader(engine, snapshot).restore()
+    return engine
@@ -0,0 +1,407 @@
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from src.change_tracker import ChangeTracker
+from src.lazy_mapping import LazyMapping
+from src.rating_map import RatingMap
+from src.storage import Storage
+from src.user_index import ExactUserIndex
+from src.user_profile import UserProfile
+from src.viewing_history import ViewingHistory, from_epoch_micros, to_epoch_micros
+from src.vocabulary import CONTENT_IDS, USER_IDS
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    username TEXT,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS preferences (
+    user_id TEXT NOT NULL,
+    genre TEXT NOT NULL,
+    score REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS preferences_user ON preferences (user_id);
+CREATE TABLE IF NOT EXISTS viewing_history (
+    user_id TEXT NOT NULL,
+    content_id TEXT NOT NULL,
+    watch_duration REAL,
+    completion_percentage REAL NOT NULL,
+    timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS viewing_history_user ON viewing_history (user_id);
+CREATE INDEX IF NOT EXISTS viewing_history_content ON viewing_history (content_id);
+CREATE INDEX IF NOT EXISTS viewing_history_timestamp ON viewing_history (timestamp);
+CREATE TABLE IF NOT EXISTS content (
+    content_id TEXT PRIMARY KEY,
+    title TEXT,
+    content_type TEXT,
+    description TEXT,
+    genres TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    actors TEXT NOT NULL,
+    directors TEXT NOT NULL,
+    popularity_score REAL,
+    release_date INTEGER,
+    duration,
+    rating_count INTEGER NOT NULL,
+    rating_total REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ratings (
+    content_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    rating REAL NOT NULL,
+    PRIMARY KEY (content_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS ratings_user ON ratings (user_id);
+"""
+
+_UPSERT_USER = ("INSERT INTO users (user_id, username, signature) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET username = excluded.username, signature = excluded.signature")
+
+_UPSERT_CONTENT = (
+    "INSERT INTO content (content_id, title, content_type, description, genres, tags, actors, directors, "
+    "popularity_score, release_date, duration, rating_count, rating_total) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (content_id) DO UPDATE SET title = excluded.title, content_type = excluded.content_type, "
+    "description = excluded.description, genres = excluded.genres, tags = excluded.tags, "
+    "actors = excluded.actors, directors = excluded.directors, popularity_score = excluded.popularity_score, "
+    "release_date = excluded.release_date, duration = excluded.duration, "
+    "rating_count = excluded.rating_count, rating_total = excluded.rating_total"
+)
+
+# Columns of items whose description, actors, directors and ratings were never loaded
+_UPDATE_INDEXED_CONTENT = ("UPDATE content SET title = ?, content_type = ?, genres = ?, tags = ?, "
+                           "popularity_score = ?, release_date = ?, duration = ? WHERE content_id = ?")
+
+
+class SQLiteStorage(Storage):
+    """
+    Users, content and viewing history in a SQLite database.
+
+    Viewing history is indexed by user, content and timestamp, and every
+    save runs in one transaction. Content is loaded up front with its
+    description, credits and ratings deferred; users are only listed, and a
+    profile and its history are read from the database the first time the
+    engine touches it. The preference and MinHash signature rows every user
+    needs for similarity are loaded in bulk, so with history_similarity=
+    'minhash' collaborative filtering reads just the nearest neighbours'
+    histories. Exact history similarity reads every candidate's history, so
+    loading into such an engine logs a warning. With max_loaded_users set,
+    loading a profile beyond the limit evicts the least recently loaded
+    ones, keeping memory bounded when the user base outgrows RAM. Profiles
+    with unsaved changes stay loaded until the next save.
+
+    After the first load or save, the storage follows the engine's change
+    notifications (see ChangeTracker) and saves write only the users and
+    content that changed, and only new viewing records. As with EventLog,
+    attributes the engine is not notified of (username, description,
+    release_date, duration, actors, directors) are written with the next
+    change of the same object. Profiles are rebuilt after eviction, so
+    changes made through a reference kept after its profile was saved and
+    evicted are ignored.
+
+    Each thread gets its own connection, and the database runs in WAL mode
+    so deferred fields load on request threads while a save is writing.
+    """
+
+    def __init__(self, path, fallback=None, max_loaded_users=None):
+        """Open or create the database
+
+        Args:
+            path (str): Database file
+            fallback (Storage, optional): Loaded while the database is
+                empty; its data is written on the next save
+            max_loaded_users (int, optional): Profiles kept built at a
+                time. None to keep every profile once loaded.
+        """
+        self.path = path
+        self.fallback = fallback
+        self.max_loaded_users = max_loaded_users
+        self.engine = None
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._changes = ChangeTracker()
+        self._resident = OrderedDict()  # user_id -> None, least recently loaded first
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        """The calling thread's connection"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self):
+        """Stop following the engine and close every thread's connection"""
+        if self.engine is not None:
+            self.engine.remove_change_listener(self._changes)
+            self.engine = None
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _is_empty(self, connection):
+        return (connection.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+                and connection.execute("SELECT 1 FROM content LIMIT 1").fetchone() is None)
+
+    def _metadata(self, connection):
+        return {key: json.loads(value) for key, value in connection.execute("SELECT key, value FROM metadata")}
+
+    def load(self, engine, progress=None):
+        connection = self._connection()
+        if self._is_empty(connection):
+            if self.fallback is not None:
+                self.fallback.load(engine, progress)
+            return
+        if engine.users or engine.content_database:
+            raise ValueError("SQLite databases can only be loaded into an empty engine")
+
+        if engine.history_similarity == "exact":
+            logger.warning("Exact history similarity loads the viewing history of every candidate user "
+                           "from %s; use history_similarity='minhash' to load only nearest neighbours", self.path)
+
+        metadata = self._metadata(connection)
+        num_perm, seed = metadata["minhash"]
+        if (engine.minhasher.num_perm, engine.minhasher.seed) != (num_perm, seed):
+            raise ValueError(f"Stored signatures use {num_perm} MinHash permutations (seed {seed}), "
+                             f"the engine uses {engine.minhasher.num_perm} (seed {engine.minhasher.seed})")
+
+        for row in connection.execute(
+                "SELECT content_id, title, content_type, genres, tags, popularity_score, release_date, duration, "
+                "rating_count, rating_total FROM content ORDER BY rowid"):
+            content_id, title, content_type, genres, tags, popularity, release_date, duration, count, total = row
+            content = engine.add_content(content_id, title, content_type)
+            content.defer(self._content_fields, count, total)
+            content.update_metadata({
+                "genres": json.loads(genres), "tags": json.loads(tags), "popularity_score": popularity,
+                "release_date": None if release_date is None else from_epoch_micros(release_date),
+                "duration": duration
+            })
+
+        preferences = {}
+        for user_id, genre, score in connection.execute("SELECT user_id, genre, score FROM preferences ORDER BY rowid"):
+            preferences.setdefault(user_id, {})[genre] = score
+
+        user_ids, signatures = [], []
+        for user_id, signature in connection.execute("SELECT user_id, signature FROM users ORDER BY rowid"):
+            user_ids.append(user_id)
+            signatures.append(signature)
+        positions = dict(zip(user_ids, range(len(user_ids))))
+
+        signature_matrix = engine.history_signatures
+        signature_matrix.keys = list(user_ids)
+        signature_matrix.index = dict(positions)
+        if user_ids:
+            signature_matrix._signatures = np.frombuffer(b"".join(signatures), dtype=np.uint32).reshape(
+                len(user_ids), num_perm).copy()
+
+        # Restoring the column order keeps similarity sums bit-identical
+        preference_matrix = engine.preference_matrix
+        preference_matrix.genre_vocab = {genre: column for column, genre in enumerate(metadata["preference_vocab"])}
+        for user_id in user_ids:
+            preference_matrix.update(user_id, preferences.get(user_id, {}))
+
+        engine.users = LazyMapping(user_ids, self._load_user)
+        self._attach(engine, {})
+        # The exact index only needs IDs; other indexes bucket whole profiles
+        if type(engine.neighbor_index) is ExactUserIndex:
+            engine.neighbor_index.update_ids(user_ids)
+        else:
+            for user_id in user_ids:
+                engine.neighbor_index.update(engine.users[user_id])
+
+    def _attach(self, engine, history_lengths):
+        """Follow an engine whose state matches the database"""
+        self.engine = engine
+        self._changes.reset(history_lengths)
+        engine.add_change_listener(self._changes)
+
+    def _load_user(self, user_id):
+        """Build a stored user's profile and history"""
+        connection = self._connection()
+        engine = self.engine
+        username, = connection.execute("SELECT username FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        user = UserProfile(user_id, username, minhasher=engine.minhasher)
+        user.preferences = dict(connection.execute(
+            "SELECT genre, score FROM preferences WHERE user_id = ? ORDER BY rowid", (user_id,)))
+
+        rows = connection.execute(
+            "SELECT content_id, watch_duration, completion_percentage, timestamp FROM viewing_history "
+            "WHERE user_id = ? ORDER BY rowid", (user_id,)).fetchall()
+        if rows:
+            content_ids, durations, completions, timestamps = zip(*rows)
+            user.viewing_history = ViewingHistory.from_columns(
+                np.array([CONTENT_IDS.intern(content_id) for content_id in content_ids], dtype=np.int32),
+                np.array(durations, dtype=np.float64), np.array(completions, dtype=np.float64),
+                np.array(timestamps, dtype=np.int64)
+            )
+            signatures = engine.history_signatures
+            user.history_signature = np.array(signatures._signatures[signatures.index[user_id]])
+
+        self._changes.history_marks[user_id] = len(rows)
+        if self.max_loaded_users is not None:
+            # Make room before the new profile is counted
+            self._evict(engine, self.max_loaded_users - 1)
+        self._resident[user_id] = None
+        self._resident.move_to_end(user_id)
+        user.add_listener(engine._on_user_changed)
+        return user
+
+    def _content_fields(self, content_id):
+        """Deferred fields of a stored item, see Content.defer()"""
+        connection = self._connection()
+        description, actors, directors, total = connection.execute(
+            "SELECT description, actors, directors, rating_total FROM content WHERE content_id = ?",
+            (content_id,)).fetchone()
+        entries = sorted((USER_IDS.intern(user_id), rating) for user_id, rating in connection.execute(
+            "SELECT user_id, rating FROM ratings WHERE content_id = ?", (content_id,)))
+        return {
+            "description": description,
+            "actors": json.loads(actors),
+            "directors": json.loads(directors),
+            "ratings": RatingMap.from_arrays([user_index for user_index, _ in entries],
+                                             [rating for _, rating in entries], total)
+        }
+
+    def save(self, engine):
+        """Persist the engine in one transaction
+
+        The first save of an engine not loaded from this database writes
+        everything and requires an empty database; later saves write only
+        what changed.
+
+        Args:
+            engine (RecommendationEngine): Engine to save
+        """
+        connection = self._connection()
+        if engine is not self.engine:
+            if not self._is_empty(connection):
+                raise ValueError(f"Database {self.path} already holds data. Load it before saving")
+            with connection:
+                history_lengths = self._write_all(connection, engine)
+            self._attach(engine, history_lengths)
+            return
+
+        history_marks = {}
+        with connection:
+            for content, fields in self._changes.content.values():
+                added = ChangeTracker.ADDED in fields
+                self._write_content(connection, content, added, added or "ratings" in fields)
+            for user, fields in self._changes.users.values():
+                mark = self._changes.history_mark(user, fields)
+                self._write_user(connection, user, mark, ChangeTracker.ADDED in fields or "preferences" in fields)
+                history_marks[user.user_id] = len(user.viewing_history)
+            self._write_metadata(connection, engine)
+        self._changes.saved(history_marks)
+
+        for user_id in history_marks:
+            self._resident[user_id] = None
+            self._resident.move_to_end(user_id)
+        if self.max_loaded_users is not None:
+            self._evict(engine, self.max_loaded_users)
+
+    def _evict(self, engine, capacity):
+        """Drop the least recently loaded profiles until at most capacity stay built
+
+        Profiles with unsaved changes are kept, as rebuilding them from the
+        database would lose the changes.
+        """
+        if not isinstance(engine.users, LazyMapping):
+            return
+        unsaved = []
+        while self._resident and len(self._resident) + len(unsaved) > capacity:
+            user_id, _ = self._resident.popitem(last=False)
+            if user_id in self._changes.users:
+                unsaved.append(user_id)
+            elif user_id in engine.users:
+                engine.users.unload(user_id)
+        for user_id in reversed(unsaved):
+            self._resident[user_id] = None
+            self._resident.move_to_end(user_id, last=False)
+
+    def _write_all(self, connection, engine):
+        """Insert every user and content item
+
+        Returns:
+            dict: user_id -> viewing records written
+        """
+        for content in engine.content_database.values():
+            self._write_content(connection, content, True, True)
+        history_lengths = {}
+        for user_id, user in engine.users.items():
+            self._write_user(connection, user, 0, True)
+            history_lengths[user_id] = len(user.viewing_history)
+        self._write_metadata(connection, engine)
+        return history_lengths
+
+    def _write_metadata(self, connection, engine):
+        connection.executemany(
+            "INSERT INTO metadata (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            [("minhash", json.dumps([engine.minhasher.num_perm, engine.minhasher.seed])),
+             ("preference_vocab", json.dumps(list(engine.preference_matrix.genre_vocab)))]
+        )
+
+    def _write_user(self, connection, user, mark, preferences):
+        """Upsert a user row and append the viewing records after mark"""
+        user_id = user.user_id
+        connection.execute(_UPSERT_USER, (user_id, user.username, user.history_signature.tobytes()))
+        if preferences:
+            connection.execute("DELETE FROM preferences WHERE user_id = ?", (user_id,))
+            connection.executemany("INSERT INTO preferences (user_id, genre, score) VALUES (?, ?, ?)",
+                                   [(user_id, genre, score) for genre, score in user.preferences.items()])
+
+        history = user.viewing_history
+        if len(history) > mark:
+            values = CONTENT_IDS.values
+            connection.executemany(
+                "INSERT INTO viewing_history (user_id, content_id, watch_duration, completion_percentage, timestamp) "
+                "VALUES (?, ?, ?, ?, ?)",
+                zip([user_id] * (len(history) - mark),
+                    [values[index] for index in history.content_indices[mark:].tolist()],
+                    history.durations[mark:].tolist(), history.completions[mark:].tolist(),
+                    history.timestamps[mark:].tolist())
+            )
+
+    def _write_content(self, connection, content, added, ratings):
+        """Upsert a content item, rewriting its ratings if asked to"""
+        release_date = None if content.release_date is None else to_epoch_micros(content.release_date)
+        if not added and not content.hydrated:
+            # Deferred fields still match the database
+            connection.execute(_UPDATE_INDEXED_CONTENT, (
+                content.title, content.content_type, json.dumps(list(content.genres)),
+                json.dumps(list(content.tags)), content.popularity_score, release_date, content.duration,
+                content.content_id
+            ))
+            return
+
+        connection.execute(_UPSERT_CONTENT, (
+            content.content_id, content.title, content.content_type, content.description,
+            json.dumps(list(content.genres)), json.dumps(list(content.tags)), json.dumps(list(content.actors)),
+            json.dumps(list(content.directors)), content.popularity_score, release_date, content.duration,
+            len(content.ratings), content.ratings._total
+        ))
+        if ratings:
+            connection.execute("DELETE FROM ratings WHERE content_id = ?", (content.content_id,))
+            connection.executemany("INSERT INTO ratings (content_id, user_id, rating) VALUES (?, ?, ?)",
+                                   [(content.content_id, user_id, rating)
+                                    for user_id, rating in content.ratings.items()])
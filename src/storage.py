@@ -0,0 +1,166 @@
+import os
+from abc import ABC, abstractmethod
+
+from src.event_log import EventLog
+from src.snapshot import load_snapshot, save_snapshot
+from src.streaming_loader import NDJSON_EXTENSIONS, StreamingLoader
+from src.utils import save_json_data, save_ndjson_data
+
+
+class Storage(ABC):
+    """
+    Persistence backend behind RecommendationSystem.load_data/save_data.
+
+    load() fills an empty engine, save() persists the engine's current
+    state and close() releases files or connections. Backends with a
+    fallback load it while they hold no data of their own, so an existing
+    data directory migrates on the first save.
+    """
+
+    @abstractmethod
+    def load(self, engine, progress=None):
+        """Fill an empty engine from storage
+
+        Args:
+            engine (RecommendationEngine): Engine to load into
+            progress (callable, optional): Called as progress(kind, records,
+                bytes_read, total_bytes) while files are read
+        """
+
+    @abstractmethod
+    def save(self, engine):
+        """Persist an engine's users and content
+
+        Args:
+            engine (RecommendationEngine): Engine to save
+        """
+
+    def close(self):
+        """Release files and connections held by the backend"""
+
+
+class JSONStorage(Storage):
+    """Users and content as JSON objects keyed by ID, or NDJSON records, rewritten on every save"""
+
+    def __init__(self, users_file, content_file):
+        """Initialize the backend
+
+        Args:
+            users_file (str): Users file; .ndjson or .jsonl for one record per line
+            content_file (str): Content file, in the same format
+        """
+        self.users_file = users_file
+        self.content_file = content_file
+
+    def load(self, engine, progress=None):
+        # Records are parsed one at a time, so memory holds the built model
+        loader = StreamingLoader(engine, progress=progress)
+        loader.load_users(self.users_file)
+        loader.load_content(self.content_file)
+
+    def save(self, engine):
+        if self.users_file.endswith(NDJSON_EXTENSIONS):
+            # Records are written as they are built
+            save_ndjson_data(({"user_id": user_id, **self.user_record(user)}
+                              for user_id, user in engine.users.items()), self.users_file)
+            save_ndjson_data((self.content_record(content)
+                              for content in engine.content_database.values()), self.content_file)
+        else:
+            save_json_data({user_id: self.user_record(user) for user_id, user in engine.users.items()},
+                           self.users_file)
+            save_json_data({content_id: self.content_record(content)
+                            for content_id, content in engine.content_database.items()},
+                           self.content_file)
+
+    @staticmethod
+    def user_record(user):
+        """JSON-serializable dictionary of a user profile"""
+        # Need to convert viewing history to be JSON serializable
+        serializable_history = []
+        for record in user.viewing_history:
+            record_copy = record.copy()
+            # Convert datetime to string if present
+            if "timestamp" in record_copy:
+                record_copy["timestamp"] = record_copy["timestamp"].isoformat()
+            serializable_history.append(record_copy)
+
+        return {
+            "username": user.username,
+            "preferences": user.preferences,
+            "viewing_history": serializable_history
+        }
+
+    @staticmethod
+    def content_record(content):
+        """JSON-serializable dictionary of a content item"""
+        content_dict = {
+            "content_id": content.content_id,
+            "title": content.title,
+            "content_type": content.content_type,
+            "description": content.description,
+            "genres": list(content.genres),
+            "tags": list(content.tags),
+            "popularity_score": content.popularity_score,
+            "ratings": content.ratings.copy()
+        }
+
+        # Handle release_date if it exists
+        if content.release_date:
+            content_dict["release_date"] = content.release_date.isoformat()
+
+        return content_dict
+
+
+class SnapshotStorage(Storage):
+    """The whole model as a memory-mapped binary snapshot, rewritten on every save"""
+
+    def __init__(self, snapshot_file, fallback=None):
+        """Initialize the backend
+
+        Args:
+            snapshot_file (str): Snapshot path
+            fallback (Storage, optional): Loaded while no snapshot exists
+        """
+        self.snapshot_file = snapshot_file
+        self.fallback = fallback
+
+    def load(self, engine, progress=None):
+        if os.path.exists(self.snapshot_file):
+            # Users and content are built when first used
+            load_snapshot(self.snapshot_file, engine)
+        elif self.fallback is not None:
+            self.fallback.load(engine, progress)
+
+    def save(self, engine):
+        save_snapshot(engine, self.snapshot_file)
+
+
+class EventLogStorage(Storage):
+    """A snapshot plus an append-only log of changes, see EventLog"""
+
+    def __init__(self, snapshot_file, log_file, fallback=None):
+        """Initialize the backend
+
+        Args:
+            snapshot_file (str): Snapshot path
+            log_file (str): Event log path
+            fallback (Storage, optional): Loaded while no snapshot exists;
+                its data becomes the first snapshot
+        """
+        self.event_log = EventLog(snapshot_file, log_file)
+        self.fallback = fallback
+
+    def load(self, engine, progress=None):
+        if not os.path.exists(self.event_log.snapshot_path) and self.fallback is not None:
+            self.fallback.load(engine, progress)
+        self.event_log.open(engine)
+
+    def save(self, engine):
+        if self.event_log.engine is not engine:
+            # Without the loaded state the log cannot tell what changed
+            raise ValueError("Event log is not open for this engine. Load data before saving")
+        # Only the changes since loading are appended
+        self.event_log.flush()
+
+    def close(self):
+        self.event_log.close()
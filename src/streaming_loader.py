@@ -0,0 +1,431 @@
+import codecs
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from src.rating_map import RatingMap
+from src.viewing_history import to_epoch_micros
+
+# Files with these extensions hold one JSON record per line
+NDJSON_EXTENSIONS = (".ndjson", ".jsonl")
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# datetime.isoformat() output without a UTC offset, which NumPy parses in bulk
+_NAIVE_ISO_LENGTHS = (19, 26)
+
+
+class JSONObjectReader:
+    """
+    Incremental reader of the members of one top-level JSON object.
+
+    Iterating yields (key, value) pairs one member at a time, so memory holds
+    one value plus a read buffer instead of the whole document. The buffer
+    grows only while a single value does not fit in it.
+
+    With track_offsets, value_span holds the (start, end) byte offsets of the
+    last value yielded, so it can be read again later without the rest of
+    the file.
+    """
+
+    def __init__(self, file, chunk_size=1 << 20, track_offsets=False):
+        """Initialize the reader
+
+        Args:
+            file (file object): File opened in binary mode
+            chunk_size (int): Bytes read at a time
+            track_offsets (bool): Record the byte span of each value
+        """
+        self._file = file
+        self._chunk_size = chunk_size
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+        self.bytes_read = 0
+        self._track_offsets = track_offsets
+        self._cursor = (0, 0)  # (buffer position, its byte offset in the file)
+        self.value_span = None
+
+    def _fill(self):
+        """Read another chunk, dropping consumed text
+
+        Returns:
+            bool: False if the input was already exhausted
+        """
+        if self._eof:
+            return False
+        chunk = self._file.read(max(self._chunk_size, len(self._buffer) - self._position))
+        self.bytes_read += len(chunk)
+        self._eof = not chunk
+        if self._track_offsets:
+            self._cursor = (0, self._byte_offset(self._position))
+        self._buffer = self._buffer[self._position:] + self._text.decode(chunk, final=self._eof)
+        self._position = 0
+        return True
+
+    def _byte_offset(self, position):
+        """File byte offset of a buffer position at or after the last one asked for"""
+        start, offset = self._cursor
+        offset += len(self._buffer[start:position].encode())
+        self._cursor = (position, offset)
+        return offset
+
+    def _peek(self):
+        """Next non-whitespace character, or '' at the end of the input"""
+        while True:
+            self._position = _WHITESPACE.match(self._buffer, self._position).end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                return ""
+
+    def _expect(self, characters):
+        """Consume one of the given structural characters"""
+        character = self._peek()
+        if not character or character not in characters:
+            raise ValueError(f"Expected one of {characters!r} near byte {self.bytes_read}, "
+                             f"got {character or 'end of input'!r}")
+        self._position += 1
+        return character
+
+    def _decode(self):
+        """Decode the JSON value at the current position"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                # Usually a value cut off by the end of the buffer
+                if self._fill():
+                    continue
+                raise
+            # A number at the end of the buffer may continue in the next chunk
+            if end < len(self._buffer) or not self._fill():
+                if self._track_offsets:
+                    self.value_span = (self._byte_offset(self._position), self._byte_offset(end))
+                self._position = end
+                return value
+
+    def __iter__(self):
+        self._expect("{")
+        if self._peek() == "}":
+            self._position += 1
+            return
+        while True:
+            key = self._decode()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected an object key near byte {self.bytes_read}")
+            self._expect(":")
+            yield key, self._decode()
+            if self._expect(",}") == "}":
+                return
+
+
+class NDJSONReader:
+    """
+    Reader of newline-delimited JSON records, one object per line.
+
+    Iterating yields (id, record) pairs, the ID taken from each record's
+    id_field. Blank lines are skipped. value_span holds the (start, end)
+    byte offsets of the last record's line.
+    """
+
+    def __init__(self, file, id_field):
+        """Initialize the reader
+
+        Args:
+            file (file object): File opened in binary mode
+            id_field (str): Record field holding the record's ID
+        """
+        self._file = file
+        self._id_field = id_field
+        self.bytes_read = 0
+        self.value_span = None
+
+    def __iter__(self):
+        for number, line in enumerate(self._file, 1):
+            self.value_span = (self.bytes_read, self.bytes_read + len(line))
+            self.bytes_read += len(line)
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not isinstance(record, dict) or self._id_field not in record:
+                raise ValueError(f"Line {number} is not an object with a {self._id_field!r} field")
+            yield record[self._id_field], record
+
+
+def open_records(file, filepath, id_field, chunk_size=1 << 20, track_offsets=False):
+    """Reader matching a file's format, chosen by extension
+
+    Args:
+        file (file object): The file opened in binary mode
+        filepath (str): Path of the file
+        id_field (str): ID field of NDJSON records
+        chunk_size (int): Bytes read at a time from JSON files
+        track_offsets (bool): Record the byte span of each JSON value;
+            NDJSON readers always do
+
+    Returns:
+        JSONObjectReader or NDJSONReader: Iterable of (id, record) pairs
+    """
+    if filepath.endswith(NDJSON_EXTENSIONS):
+        return NDJSONReader(file, id_field)
+    return JSONObjectReader(file, chunk_size, track_offsets)
+
+
+class RecordSource:
+    """
+    Reads the deferred fields of content records back from their file.
+
+    Holds the file open and a content_id -> (start, end) byte span index,
+    so a record is re-read and parsed on its own. Keeping the file open
+    lets records be read after the file was replaced by renaming, as
+    save_json_data and save_ndjson_data do.
+    """
+
+    # Content fields left in the file until first accessed
+    FIELDS = ("description", "actors", "directors", "ratings")
+
+    def __init__(self, filepath):
+        """Initialize the source
+
+        Args:
+            filepath (str): JSON or NDJSON content file
+        """
+        self._file = open(filepath, "rb")
+        self._lock = threading.Lock()
+        self.spans = {}
+
+    def __call__(self, content_id):
+        start, end = self.spans[content_id]
+        with self._lock:
+            self._file.seek(start)
+            record = json.loads(self._file.read(end - start))
+        return {
+            "description": record.get("description", ""),
+            "actors": record.get("actors", []),
+            "directors": record.get("directors", []),
+            "ratings": RatingMap.from_dict(record.get("ratings") or {})
+        }
+
+    def close(self):
+        """Close the file; deferred fields not yet read can no longer load"""
+        self._file.close()
+
+    def __del__(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def _rating_summary(ratings):
+    """Count and running sum of ratings, as RatingMap would store them"""
+    if not ratings:
+        return 0, 0.0
+    # Sum in insertion order, one addition at a time, exactly like RatingMap
+    total = 0.0
+    for rating in ratings.values():
+        total += float(rating)
+    return len(ratings), total
+
+
+def parse_timestamps(values):
+    """Convert ISO 8601 timestamps to epoch microseconds in one pass
+
+    Naive timestamps in datetime.isoformat() layout are parsed by NumPy in
+    bulk; anything else goes through datetime.fromisoformat. Missing or
+    unparseable timestamps become the current time.
+
+    Args:
+        values (list): Timestamp strings, or None where missing
+
+    Returns:
+        np.ndarray: int64 epoch microseconds
+    """
+    micros = np.empty(len(values), dtype=np.int64)
+    strings = np.array(values)
+    if strings.dtype.kind == "U":
+        # All strings: pick the bulk-parseable ones without a Python loop
+        naive = np.isin(np.char.str_len(strings), _NAIVE_ISO_LENGTHS) & (np.char.find(strings, "T") == 10)
+        bulk, others = np.flatnonzero(naive), np.flatnonzero(~naive).tolist()
+    else:
+        bulk, others = [], []
+        for position, value in enumerate(values):
+            if isinstance(value, str) and len(value) in _NAIVE_ISO_LENGTHS and value[10] == "T":
+                bulk.append(position)
+            else:
+                others.append(position)
+    if len(bulk):
+        try:
+            micros[bulk] = np.array([values[position] for position in bulk],
+                                    dtype="datetime64[us]").astype(np.int64)
+        except ValueError:
+            others = range(len(values))
+
+    now = None
+    for position in others:
+        value = values[position]
+        try:
+            micros[position] = to_epoch_micros(datetime.fromisoformat(value))
+        except (ValueError, TypeError):
+            if now is None:
+                now = to_epoch_micros(datetime.now())
+            micros[position] = now
+    return micros
+
+
+class StreamingLoader:
+    """
+    Builds an engine's users and content from JSON or NDJSON files, one
+    record at a time.
+
+    Viewing-history timestamps are not parsed per record: records are
+    buffered as raw strings and converted in bulk every flush_records
+    records, then appended to each history with one change notification per
+    user. Peak memory is the built model plus one record, the read buffer
+    and at most flush_records pending viewing records.
+
+    With defer_content, each content item's description, actors, directors
+    and ratings stay in the file: the loader keeps the byte span of every
+    record and Content reads them back on first access, while scoring uses
+    the rating count and sum taken at load time. Resident memory and load
+    time then follow the scoring fields, not the catalog's display text and
+    rating maps.
+
+    progress, if given, is called every progress_every records and once at
+    the end of each file as progress(kind, records, bytes_read, total_bytes),
+    where kind is 'users' or 'content'.
+    """
+
+    def __init__(self, engine, progress=None, progress_every=100_000, flush_records=65_536,
+                 chunk_size=1 << 20, defer_content=True):
+        """Initialize the loader
+
+        Args:
+            engine (RecommendationEngine): Engine to add users and content to
+            progress (callable, optional): Progress callback
+            progress_every (int): Records between progress reports
+            flush_records (int): Viewing records buffered before timestamps
+                are parsed and histories extended
+            chunk_size (int): Bytes read at a time from JSON files
+            defer_content (bool): Load heavyweight content fields on first
+                access instead of while reading
+        """
+        self.engine = engine
+        self.progress = progress
+        self.progress_every = progress_every
+        self.flush_records = flush_records
+        self.chunk_size = chunk_size
+        self.defer_content = defer_content
+        self._pending = []  # (user, content_ids, durations, completions, timestamps)
+        self._pending_records = 0
+
+    def _records(self, filepath, kind, id_field, track_offsets=False):
+        """Yield (id, record, byte span) triples from a file, reporting progress"""
+        if not os.path.exists(filepath):
+            return
+        total_bytes = os.path.getsize(filepath)
+        with open(filepath, "rb") as file:
+            reader = open_records(file, filepath, id_field, self.chunk_size, track_offsets)
+            count = 0
+            for count, (record_id, record) in enumerate(reader, 1):
+                yield record_id, record, reader.value_span
+                if self.progress is not None and count % self.progress_every == 0:
+                    self.progress(kind, count, reader.bytes_read, total_bytes)
+            if self.progress is not None:
+                self.progress(kind, count, reader.bytes_read, total_bytes)
+
+    def load_users(self, filepath):
+        """Add every user in a file
+
+        Args:
+            filepath (str): users.json, or an NDJSON file of records with a
+                'user_id' field. Missing files are skipped.
+
+        Returns:
+            int: Number of users read
+        """
+        count = 0
+        for user_id, user_data, _ in self._records(filepath, "users", "user_id"):
+            user = self.engine.add_user(user_id, user_data.get("username"))
+
+            if "preferences" in user_data:
+                user.preferences = user_data["preferences"]
+
+            history = user_data.get("viewing_history")
+            if history:
+                self._pending.append((
+                    user,
+                    [record["content_id"] for record in history],
+                    [record.get("watch_duration", 0) for record in history],
+                    [record.get("completion_percentage", 0.0) for record in history],
+                    [record.get("timestamp") for record in history]
+                ))
+                self._pending_records += len(history)
+                if self._pending_records >= self.flush_records:
+                    self._flush()
+            count += 1
+
+        self._flush()
+        return count
+
+    def _flush(self):
+        """Parse buffered timestamps and append buffered viewing records"""
+        if not self._pending:
+            return
+        timestamps = parse_timestamps([timestamp for *_, user_timestamps in self._pending
+                                       for timestamp in user_timestamps])
+        start = 0
+        for user, content_ids, durations, completions, _ in self._pending:
+            end = start + len(content_ids)
+            user.add_viewing_records(content_ids, durations, completions, timestamps[start:end])
+            start = end
+        self._pending = []
+        self._pending_records = 0
+
+    def load_content(self, filepath):
+        """Add every content item in a file
+
+        Args:
+            filepath (str): content.json, or an NDJSON file of records with a
+                'content_id' field. Missing files are skipped.
+
+        Returns:
+            int: Number of content items read
+        """
+        count = 0
+        source = RecordSource(filepath) if self.defer_content and os.path.exists(filepath) else None
+        for content_id, content_info, span in self._records(filepath, "content", "content_id",
+                                                             track_offsets=source is not None):
+            added = content_id not in self.engine.content_database
+            content = self.engine.add_content(
+                content_id,
+                content_info.get("title", "Untitled"),
+                content_info.get("content_type", "movie")
+            )
+            
+            if source is not None and added:
+                # Leave the heavyweight fields in the file
+                ratings = content_info.get("ratings")
+                for field in RecordSource.FIELDS:
+                    content_info.pop(field, None)
+                source.spans[content_id] = span
+                content.defer(source, *_rating_summary(ratings))
+
+            # Convert release_date string back to datetime if it exists
+            if content_info.get("release_date"):
+                try:
+                    content_info["release_date"] = datetime.fromisoformat(content_info["release_date"])
+                except (ValueError, TypeError):
+                    content_info["release_date"] = None
+
+            if content_info.get("ratings"):
+                content_info["ratings"] = RatingMap.from_dict(content_info["ratings"])
+            content.update_metadata(content_info)
+            count += 1
+        return count
@@ -0,0 +1,211 @@
+from collections import defaultdict
+import numpy as np
+from src.minhash import MERSENNE_PRIME, MinHasher, stable_hash
+
+
+class ExactUserIndex:
+    """
+    Neighbour index that offers every other user as a candidate.
+    
+    This reproduces brute-force collaborative filtering and serves as the
+    reference when measuring the recall of approximate indexes.
+    """
+    
+    def __init__(self):
+        """Initialize an empty index"""
+        self._user_ids = {}  # user_id -> None, keeps insertion order
+        
+    def __len__(self):
+        return len(self._user_ids)
+    
+    def update(self, user):
+        """Add a user or record that their profile changed
+        
+        Args:
+            user (UserProfile): User profile
+        """
+        self._user_ids[user.user_id] = None
+        
+    def update_ids(self, user_ids):
+        """Add many users by ID
+        
+        The index keeps nothing but IDs, so storage backends can register
+        users without building their profiles.
+        
+        Args:
+            user_ids (iterable): User identifiers
+        """
+        self._user_ids.update(dict.fromkeys(user_ids))
+        
+    def remove(self, user_id):
+        """Remove a user from the index
+        
+        Args:
+            user_id (str): User identifier
+        """
+        self._user_ids.pop(user_id, None)
+        
+    def candidates(self, user_id):
+        """Users that may be among the nearest neighbours of a user
+        
+        Args:
+            user_id (str): User identifier
+            
+        Returns:
+            list: Candidate user IDs, in insertion order
+        """
+        return [other_id for other_id in self._user_ids if other_id != user_id]
+
+
+class LSHUserIndex:
+    """
+    Locality-sensitive hashing index over user embeddings.
+    
+    A user's embedding is their genre-preference vector plus a MinHash
+    signature of their viewing history. The signature is split into bands
+    (users agreeing on a whole band share a bucket, which favours high
+    history Jaccard), and the preference vector is hashed by the signs of
+    random projections (users on the same side of every hyperplane in a
+    table share a bucket, which favours high cosine similarity). Candidates
+    are the users sharing at least one bucket, so a query touches only the
+    matching buckets rather than every user.
+    
+    Buckets are refreshed lazily on the next query, so profile updates on the
+    write path cost O(1).
+    """
+    
+    def __init__(self, num_perm=64, bands=16, projection_tables=8, projection_bits=6, seed=42):
+        """Initialize an empty index
+        
+        Args:
+            num_perm (int): MinHash signature length
+            bands (int): Number of signature bands; num_perm must divide evenly
+            projection_tables (int): Number of random-projection hash tables
+            projection_bits (int): Hyperplanes per projection table
+            seed (int): Seed for the MinHash family and hyperplanes
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+            
+        self.minhasher = MinHasher(num_perm, seed)
+        self.bands = bands
+        self.projection_tables = projection_tables
+        self.projection_bits = projection_bits
+        self.seed = seed
+        
+        self._users = {}  # user_id -> UserProfile, keeps insertion order
+        self._sequence = {}  # user_id -> insertion position
+        self._dirty = set()  # user_ids whose buckets are out of date
+        self._keys = {}  # user_id -> tuple of bucket keys
+        self._buckets = defaultdict(set)  # bucket key -> user_ids
+        self._hyperplanes = {}  # genre -> projection weights
+        
+    def __len__(self):
+        return len(self._users)
+    
+    def update(self, user):
+        """Add a user or record that their profile changed
+        
+        Args:
+            user (UserProfile): User profile
+        """
+        if user.user_id not in self._users:
+            self._sequence[user.user_id] = len(self._sequence)
+        self._users[user.user_id] = user
+        self._dirty.add(user.user_id)
+        
+    def remove(self, user_id):
+        """Remove a user from the index
+        
+        Args:
+            user_id (str): User identifier
+        """
+        self._users.pop(user_id, None)
+        self._dirty.discard(user_id)
+        self._unbucket(user_id)
+        
+    def _unbucket(self, user_id):
+        """Remove a user from all of their buckets"""
+        for key in self._keys.pop(user_id, ()):
+            bucket = self._buckets[key]
+            bucket.discard(user_id)
+            if not bucket:
+                del self._buckets[key]
+                
+    def _hyperplane(self, genre):
+        """Random projection weights for one genre dimension"""
+        weights = self._hyperplanes.get(genre)
+        if weights is None:
+            # Seeded per genre so projections do not depend on vocabulary order
+            rng = np.random.default_rng([self.seed, stable_hash(genre)])
+            weights = rng.standard_normal(self.projection_tables * self.projection_bits)
+            self._hyperplanes[genre] = weights
+        return weights
+    
+    def _bucket_keys(self, user):
+        """Bucket keys for a user's current embedding"""
+        keys = []
+        
+        # Profiles keep a signature up to date; reuse it when the hash family matches
+        if user.minhasher == self.minhasher:
+            signature = user.history_signature
+        else:
+            signature = self.minhasher.signature(user.viewing_history.content_ids())
+            
+        if signature[0] != MERSENNE_PRIME:
+            for band, rows in enumerate(np.split(signature, self.bands)):
+                keys.append(("history", band, rows.tobytes()))
+                
+        projection = np.zeros(self.projection_tables * self.projection_bits)
+        for genre, score in user.preferences.items():
+            if score:
+                projection += score * self._hyperplane(genre)
+        if projection.any():
+            signs = (projection > 0).reshape(self.projection_tables, self.projection_bits)
+            for table, bits in enumerate(signs):
+                keys.append(("preferences", table, np.packbits(bits).tobytes()))
+                
+        return tuple(keys)
+    
+    def refresh(self):
+        """Re-bucket users whose profiles changed since the last query"""
+        for user_id in self._dirty:
+            self._unbucket(user_id)
+            keys = self._bucket_keys(self._users[user_id])
+            for key in keys:
+                self._buckets[key].add(user_id)
+            self._keys[user_id] = keys
+        self._dirty.clear()
+        
+    def candidates(self, user_id):
+        """Users sharing at least one LSH bucket with a user
+        
+        Args:
+            user_id (str): User identifier
+            
+        Returns:
+            list: Candidate user IDs, in insertion order
+        """
+        self.refresh()
+        
+        candidates = set()
+        for key in self._keys.get(user_id, ()):
+            candidates.update(self._buckets[key])
+        candidates.discard(user_id)
+        
+        return sorted(candidates, key=self._sequence.__getitem__)
+
+
+def recall_at_k(approximate, exact):
+    """Fraction of the exact nearest neighbours found by an approximate search
+    
+    Args:
+        approximate (list): Neighbour IDs returned by the approximate index
+        exact (list): Neighbour IDs returned by exhaustive search
+        
+    Returns:
+        float: Recall between 0 and 1 (1.0 when exact is empty)
+    """
+    if not exact:
+        return 1.0
+    return len(set(approximate) & set(exact)) / len(exact)
@@ -1,11 +1,28 @@
-from datetime import datetime
+import numpy as np
+from src.minhash import DEFAULT_MINHASHER
+from src.observable import Observable, TrackedAttribute
+from src.viewing_history import ViewingHistory
 
-class UserProfile:
-    def __init__(self, user_id, username=None):
+class UserProfile(Observable):
+    __slots__ = (
+        "user_id", "username", "_preferences", "viewing_history",
+        "minhasher", "history_signature"
+    )
+    
+    # Fields that feed user similarity and the engine's user indexes
+    preferences = TrackedAttribute()
+    
+    def __init__(self, user_id, username=None, minhasher=None):
+        super().__init__()
+        
         self.user_id = user_id
         self.username = username
         self.preferences = {}  # genre -> preference score
-        self.viewing_history = []
+        self.viewing_history = ViewingHistory()
+        
+        # MinHash sketch of the set of watched content IDs
+        self.minhasher = minhasher if minhasher is not None else DEFAULT_MINHASHER
+        self.history_signature = self.minhasher.shared_empty_signature
         
     def update_preferences(self, preferences):
         """Update user genre preferences
@@ -13,27 +30,47 @@ class UserProfile:
         Args:
             preferences (dict): Dictionary mapping genre to preference score (0-1)
         """
-        for genre, score in preferences.items():
-            if 0 <= score <= 1:
-                self.preferences[genre] = score
-            else:
-                raise ValueError(f"Preference score must be between 0 and 1, got {score}")
+        with self.batch_changes():
+            for genre, score in preferences.items():
+                if 0 <= score <= 1:
+                    self.preferences[genre] = score
+                    self._field_changed("preferences")
+                else:
+                    raise ValueError(f"Preference score must be between 0 and 1, got {score}")
     
-    def add_viewing_record(self, content_id, watch_duration, completion_percentage):
+    def add_viewing_record(self, content_id, watch_duration, completion_percentage, timestamp=None):
         """Add a viewing record to user history
         
         Args:
             content_id (str): ID of the watched content
             watch_duration (int): Duration watched in seconds
             completion_percentage (float): Percentage of content watched (0-1)
+            timestamp (datetime, optional): When the content was watched.
+                Defaults to now.
+        """
+        self.viewing_history.add(content_id, watch_duration, completion_percentage, timestamp)
+        if not self.history_signature.flags.writeable:
+            # First record, stop sharing the empty signature
+            self.history_signature = self.minhasher.empty_signature()
+        self.minhasher.update(self.history_signature, content_id)
+        self._field_changed("viewing_history")
+        
+    def add_viewing_records(self, content_ids, watch_durations, completion_percentages, timestamps):
+        """Add many viewing records with a single change notification
+        
+        Args:
+            content_ids (list): IDs of the watched content
+            watch_durations (list): Durations watched in seconds
+            completion_percentages (list): Percentages of content watched (0-1)
+            timestamps (np.ndarray): When each was watched, in epoch microseconds
         """
-        record = {
-            "content_id": content_id,
-            "watch_duration": watch_duration,
-            "completion_percentage": completion_percentage,
-            "timestamp": datetime.now()
-        }
-        self.viewing_history.append(record)
+        if not content_ids:
+            return
+        self.viewing_history.extend(content_ids, watch_durations, completion_percentages, timestamps)
+        if not self.history_signature.flags.writeable:
+            self.history_signature = self.minhasher.empty_signature()
+        np.minimum(self.history_signature, self.minhasher.signature(content_ids), out=self.history_signature)
+        self._field_changed("viewing_history")
     
     def get_favorite_genres(self, top_n=3):
         """Get user's top preferred genres
@@ -1,6 +1,8 @@
 import numpy as np
+import heapq
 import json
 import os
+from operator import itemgetter
 
 def calculate_content_similarity(content1, content2):
     """Calculate similarity between two content items
@@ -56,6 +58,59 @@ def calculate_jaccard_similarity(set1, set2):
     
     return intersection / union if union > 0 else 0.0
 
+def top_k_items(scores, k):
+    """Select the k highest-scoring items without sorting all of them
+    
+    Uses a bounded heap, so selection costs O(n log k). Ties keep their
+    original iteration order, exactly like a stable descending sort.
+    
+    Args:
+        scores (dict or iterable): Mapping of item -> score, or (item, score) pairs
+        k (int): Number of items to select
+        
+    Returns:
+        list: Up to k (item, score) tuples, highest score first
+    """
+    if k <= 0:
+        return []
+        
+    items = scores.items() if isinstance(scores, dict) else scores
+    return heapq.nlargest(k, items, key=itemgetter(1))
+
+def top_k_indices(scores, k, ties=None):
+    """Select the indices of the k highest values in a score array
+    
+    Uses np.argpartition, so selection costs O(n) plus O(k log k) to order the
+    result. Equal scores are ordered by ascending tie-break key.
+    
+    Args:
+        scores (np.ndarray): 1-D array of scores
+        k (int): Number of indices to select
+        ties (np.ndarray, optional): Tie-break keys aligned with scores.
+            Defaults to the array position.
+            
+    Returns:
+        np.ndarray: Up to k indices into scores, highest score first
+    """
+    scores = np.asarray(scores)
+    positions = np.arange(scores.size)
+    if ties is None:
+        ties = positions
+        
+    if k <= 0 or scores.size == 0:
+        return positions[:0]
+        
+    if k < scores.size:
+        # Everything above the k-th score is selected, the boundary score is
+        # shared out by tie-break key
+        threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        selected = np.flatnonzero(scores > threshold)
+        boundary = np.flatnonzero(scores == threshold)
+        boundary = boundary[np.argsort(ties[boundary], kind="stable")][:k - selected.size]
+        positions = np.concatenate([selected, boundary])
+        
+    return positions[np.lexsort((ties[positions], -scores[positions]))]
+
 def load_json_data(filepath):
     """Load data from JSON file
     
@@ -82,5 +137,27 @@ def save_json_data(data, filepath):
     if directory and not os.path.exists(directory):
         os.makedirs(directory)
         
-    with open(filepath, 'w') as f:
-        json.dump(data, f, indent=2)
\ No newline at end of file
+    # Written under a temporary name, so readers of the old file are unaffected
+    temporary = filepath + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temporary, filepath)
+
+def save_ndjson_data(records, filepath):
+    """Save records to a newline-delimited JSON file, one record per line
+    
+    Args:
+        records (iterable): Dictionaries to save, consumed lazily
+        filepath (str): Path to NDJSON file
+    """
+    directory = os.path.dirname(filepath)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+        
+    # Records may still be read from the old file while this one is written
+    temporary = filepath + '.tmp'
+    with open(temporary, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record))
+            f.write('\n')
+    os.replace(temporary, filepath)
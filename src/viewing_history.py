@@ -0,0 +1,313 @@
+import math
+from collections.abc import Mapping, Sequence
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from src.vocabulary import CONTENT_IDS
+
+# Timestamps are stored as microseconds since this epoch. Naive datetimes are
+# kept as wall-clock time, aware datetimes are converted to UTC first.
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_micros(timestamp):
+    """Convert a datetime to integer microseconds since the epoch
+    
+    Args:
+        timestamp (datetime): Naive or timezone-aware datetime
+        
+    Returns:
+        int: Microseconds since 1970-01-01
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - _EPOCH) // _MICROSECOND
+
+
+def from_epoch_micros(micros):
+    """Convert microseconds since the epoch back to a naive datetime
+    
+    Args:
+        micros (int): Microseconds since 1970-01-01
+        
+    Returns:
+        datetime: Naive datetime
+    """
+    return _EPOCH + timedelta(microseconds=int(micros))
+
+
+def _duration_value(duration):
+    """Stored watch duration as given: None, an int, or a float"""
+    if math.isnan(duration):
+        return None
+    return int(duration) if duration.is_integer() else duration
+
+
+def _stored_duration(duration):
+    """Column value of a watch duration, NaN standing in for None"""
+    return math.nan if duration is None else duration
+
+
+class ViewingRecord(Mapping):
+    """
+    Read-only dict-like view of one entry in a ViewingHistory.
+    
+    Supports record["content_id"], record["watch_duration"],
+    record["completion_percentage"] and record["timestamp"] like the plain
+    dicts histories used to hold. copy() returns a regular dict.
+    """
+    
+    __slots__ = ("_history", "_position")
+    
+    KEYS = ("content_id", "watch_duration", "completion_percentage", "timestamp")
+    
+    def __init__(self, history, position):
+        self._history = history
+        self._position = position
+        
+    def __getitem__(self, key):
+        history = self._history
+        position = self._position
+        if key == "content_id":
+            return CONTENT_IDS.lookup(history._content[position])
+        if key == "watch_duration":
+            return _duration_value(float(history._duration[position]))
+        if key == "completion_percentage":
+            return float(history._completion[position])
+        if key == "timestamp":
+            return from_epoch_micros(history._timestamp[position])
+        raise KeyError(key)
+    
+    def __iter__(self):
+        return iter(self.KEYS)
+    
+    def __len__(self):
+        return len(self.KEYS)
+    
+    def __repr__(self):
+        return f"ViewingRecord({dict(self)!r})"
+    
+    def copy(self):
+        """Copy the record into a plain dict
+        
+        Returns:
+            dict: Mutable copy of the record
+        """
+        return dict(self)
+
+
+class ViewingHistory(Sequence):
+    """
+    Columnar, append-only store of a user's viewing records.
+    
+    Each record takes 28 bytes: an int32 interned content index, float64
+    watch duration in seconds (NaN when none was given), float64 completion
+    percentage and int64 timestamp in epoch microseconds. Durations and
+    completions read back exactly as they were added, so records round-trip
+    through save and load unchanged. Columns grow geometrically. Indexing or
+    iterating yields read-only ViewingRecord views, so code written against
+    the old list of dicts keeps working; hot paths should use the columns.
+    """
+    
+    __slots__ = ("_size", "_content", "_duration", "_completion", "_timestamp", "_unique", "_weights")
+    
+    # How repeat views of one item combine into its weight: the completion of
+    # the first view, the best completion, or the total over all views
+    WEIGHT_AGGREGATIONS = ("first", "max", "sum")
+    
+    # Shared zero-length columns, so users without history allocate nothing
+    _EMPTY = {
+        "_content": np.empty(0, dtype=np.int32),
+        "_duration": np.empty(0, dtype=np.float64),
+        "_completion": np.empty(0, dtype=np.float64),
+        "_timestamp": np.empty(0, dtype=np.int64)
+    }
+    
+    def __init__(self, initial_capacity=0):
+        """Initialize an empty history
+        
+        Args:
+            initial_capacity (int): Number of records to preallocate
+        """
+        self._size = 0
+        for name, empty in self._EMPTY.items():
+            setattr(self, name, np.empty(initial_capacity, dtype=empty.dtype) if initial_capacity else empty)
+        self._unique = None  # cached sorted unique content indices
+        self._weights = None  # cached (aggregation, indices, weights)
+        
+    @classmethod
+    def from_columns(cls, content_indices, durations, completions, timestamps):
+        """Wrap existing column arrays without copying them
+        
+        The arrays are used as the history's storage, so appending to a full
+        history copies them into new columns first.
+        
+        Args:
+            content_indices (np.ndarray): int32 interned content indices
+            durations (np.ndarray): float64 watch durations in seconds
+            completions (np.ndarray): float64 completion percentages
+            timestamps (np.ndarray): int64 epoch microseconds
+            
+        Returns:
+            ViewingHistory: History holding one record per array entry
+        """
+        history = cls()
+        if content_indices.size:
+            history._content = content_indices
+            history._duration = durations
+            history._completion = completions
+            history._timestamp = timestamps
+            history._size = content_indices.size
+        return history
+        
+    def __len__(self):
+        return self._size
+    
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [ViewingRecord(self, i) for i in range(*position.indices(self._size))]
+        if position < 0:
+            position += self._size
+        if not 0 <= position < self._size:
+            raise IndexError("viewing history index out of range")
+        return ViewingRecord(self, position)
+    
+    def __iter__(self):
+        for position in range(self._size):
+            yield ViewingRecord(self, position)
+            
+    def _grow(self, needed=0):
+        """Double the capacity of every column, or more to fit `needed` records"""
+        capacity = max(8, 2 * self._content.shape[0], needed)
+        for name, empty in self._EMPTY.items():
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=empty.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+            
+    def add(self, content_id, watch_duration, completion_percentage, timestamp=None):
+        """Append a viewing record
+        
+        Args:
+            content_id (str): ID of the watched content
+            watch_duration (int or float): Duration watched in seconds, or None
+            completion_percentage (float): Percentage of content watched (0-1)
+            timestamp (datetime, optional): When the content was watched.
+                Defaults to now.
+        """
+        if self._size == self._content.shape[0]:
+            self._grow()
+            
+        position = self._size
+        self._content[position] = CONTENT_IDS.intern(content_id)
+        self._duration[position] = _stored_duration(watch_duration)
+        self._completion[position] = completion_percentage
+        self._timestamp[position] = to_epoch_micros(timestamp if timestamp is not None else datetime.now())
+        self._size += 1
+        self._unique = None
+        self._weights = None
+        
+    def extend(self, content_ids, watch_durations, completion_percentages, timestamps):
+        """Append many viewing records at once
+        
+        Args:
+            content_ids (list): IDs of the watched content
+            watch_durations (list): Durations watched in seconds, or None
+            completion_percentages (list): Percentages of content watched (0-1)
+            timestamps (np.ndarray): When each was watched, in epoch microseconds
+        """
+        count = len(content_ids)
+        if not count:
+            return
+        if self._size + count > self._content.shape[0]:
+            self._grow(self._size + count)
+            
+        end = self._size + count
+        self._content[self._size:end] = [CONTENT_IDS.intern(content_id) for content_id in content_ids]
+        self._duration[self._size:end] = [_stored_duration(duration) for duration in watch_durations]
+        self._completion[self._size:end] = completion_percentages
+        self._timestamp[self._size:end] = timestamps
+        self._size = end
+        self._unique = None
+        self._weights = None
+        
+    @property
+    def content_indices(self):
+        """Interned content index of each record (read-only view)"""
+        return self._readonly(self._content)
+    
+    @property
+    def durations(self):
+        """Watch duration in seconds of each record (read-only view)"""
+        return self._readonly(self._duration)
+    
+    @property
+    def completions(self):
+        """Completion percentage of each record (read-only view)"""
+        return self._readonly(self._completion)
+    
+    @property
+    def timestamps(self):
+        """Epoch microseconds of each record (read-only view)"""
+        return self._readonly(self._timestamp)
+    
+    def _readonly(self, column):
+        view = column[:self._size]
+        view.flags.writeable = False
+        return view
+    
+    def unique_content_indices(self):
+        """Sorted distinct content indices in the history
+        
+        Returns:
+            np.ndarray: int32 array of interned content indices
+        """
+        if self._unique is None:
+            self._unique = np.unique(self._content[:self._size])
+            self._unique.flags.writeable = False
+        return self._unique
+    
+    def completion_weights(self, aggregation="first"):
+        """Per-item weights built from the completion of every view
+        
+        Computed with one sort over the history and cached until the next
+        record is added.
+        
+        Args:
+            aggregation (str): One of 'first', 'max' or 'sum'
+            
+        Returns:
+            tuple: (sorted distinct content indices, float64 weights)
+        """
+        if aggregation not in self.WEIGHT_AGGREGATIONS:
+            raise ValueError(f"Aggregation {aggregation} not supported. "
+                             f"Use one of: {list(self.WEIGHT_AGGREGATIONS)}")
+            
+        if self._weights is not None and self._weights[0] == aggregation:
+            return self._weights[1], self._weights[2]
+            
+        content = self._content[:self._size]
+        completions = self._completion[:self._size].astype(np.float64, copy=False)
+        indices, first_positions, inverse = np.unique(content, return_index=True, return_inverse=True)
+        
+        if aggregation == "first":
+            weights = completions[first_positions]
+        elif aggregation == "max":
+            weights = np.full(indices.size, -np.inf)
+            np.maximum.at(weights, inverse, completions)
+        else:
+            weights = np.bincount(inverse, weights=completions, minlength=indices.size)
+            
+        indices.flags.writeable = False
+        weights.flags.writeable = False
+        self._weights = (aggregation, indices, weights)
+        return indices, weights
+    
+    def content_ids(self):
+        """Distinct content IDs in the history
+        
+        Returns:
+            set: Watched content IDs
+        """
+        values = CONTENT_IDS.values
+        return {values[index] for index in self.unique_content_indices().tolist()}
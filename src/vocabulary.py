@@ -0,0 +1,68 @@
+class Vocabulary:
+    """
+    Interns values (content IDs, genres, tags...) to dense integer IDs.
+    
+    IDs are assigned in first-seen order and never reused, so arrays indexed
+    by them stay valid as the vocabulary grows.
+    """
+    
+    def __init__(self):
+        """Initialize an empty vocabulary"""
+        self._ids = {}  # value -> id
+        self.values = []  # id -> value
+        
+    def __len__(self):
+        return len(self.values)
+    
+    def __contains__(self, value):
+        return value in self._ids
+    
+    def intern(self, value):
+        """Get the ID of a value, assigning a new one if it is unseen
+        
+        Args:
+            value: Hashable value to intern
+            
+        Returns:
+            int: Integer ID of the value
+        """
+        value_id = self._ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self._ids[value] = value_id
+            self.values.append(value)
+        return value_id
+    
+    def get(self, value, default=None):
+        """Get the ID of a value without interning it
+        
+        Args:
+            value: Value to look up
+            default: Returned if the value was never interned
+            
+        Returns:
+            int: Integer ID of the value, or default
+        """
+        return self._ids.get(value, default)
+    
+    def lookup(self, value_id):
+        """Get the value for an ID
+        
+        Args:
+            value_id (int): Integer ID
+            
+        Returns:
+            The interned value
+        """
+        return self.values[value_id]
+
+
+# Content IDs shared by every viewing history in the process
+CONTENT_IDS = Vocabulary()
+
+# Genres and tags shared by every content item in the process
+GENRES = Vocabulary()
+TAGS = Vocabulary()
+
+# User IDs shared by every rating map in the process
+USER_IDS = Vocabulary()
@@ -0,0 +1,123 @@
+import pytest
+from src.content_metadata import Content
+from src.rating_map import RatingMap
+from src.user_profile import UserProfile
+
+def test_slotted_models_have_no_instance_dict():
+    content = Content('c1', 'Avengers', 'movie')
+    user = UserProfile('u1', 'User One')
+    assert not hasattr(content, '__dict__')
+    assert not hasattr(user, '__dict__')
+
+def test_genres_and_tags_are_interned():
+    first = Content('c1', 'Avengers', 'movie')
+    second = Content('c2', 'Inception', 'movie')
+    first.genres = ['Action', 'Adventure', 'Action']
+    second.update_metadata({'genres': ['Adventure'], 'tags': ['dream'], 'unknown_field': 1})
+
+    assert first.genres == ['Action', 'Adventure', 'Action']
+    assert first.genre_ids[1] == second.genre_ids[0]
+    assert second.tags == ('dream',)
+    assert first.to_feature_vector()['genres'] == ['Action', 'Adventure', 'Action']
+
+def test_genre_and_tag_list_methods_write_back():
+    content = Content('c1', 'Avengers', 'movie')
+    changes = []
+    content.add_listener(lambda obj, fields: changes.append(fields))
+    content.genres = ['Action']
+    content.genres.append('Sci-Fi')
+    content.genres[0] = 'Drama'
+    content.tags.extend(['hero', 'dark'])
+    content.tags.remove('hero')
+    assert content.genres == ['Drama', 'Sci-Fi'] and content.tags == ['dark']
+    assert changes == [{'genres'}] * 3 + [{'tags'}] * 2
+
+def test_ratings_read_back_exactly():
+    content = Content('c1', 'Avengers', 'movie')
+    content.ratings.update({'u1': 3, 'u2': 4.3, 'u3': 0.1})
+    assert content.ratings.copy() == {'u1': 3, 'u2': 4.3, 'u3': 0.1}
+    assert [type(rating) for rating in content.ratings.values()] == [int, float, float]
+    assert content.get_average_rating() == (3 + 4.3 + 0.1) / 3
+
+def test_rating_map_behaves_like_a_dict():
+    content = Content('c1', 'Avengers', 'movie')
+    content.ratings['u2'] = 4
+    content.ratings['u1'] = 5
+    content.ratings['u2'] = 2
+    assert len(content.ratings) == 2
+    assert content.ratings['u1'] == 5
+    assert content.ratings.copy() == {'u1': 5.0, 'u2': 2.0}
+    assert content.get_average_rating() == 3.5
+
+    del content.ratings['u1']
+    assert 'u1' not in content.ratings
+    with pytest.raises(KeyError):
+        content.ratings['u1']
+
+    content.ratings = {'u3': 1}
+    assert isinstance(content.ratings, RatingMap)
+    assert dict(content.ratings) == {'u3': 1.0}
+
+def test_running_average_handles_overwrites_and_removals():
+    content = Content('c1', 'Avengers', 'movie')
+    content.add_rating('u1', 5)
+    content.add_rating('u2', 3)
+    content.add_rating('u1', 1)
+    assert content.get_average_rating() == 2.0
+
+    content.update_rating('u2', 4)
+    assert content.get_average_rating() == 2.5
+    with pytest.raises(KeyError):
+        content.update_rating('u3', 4)
+
+    assert content.remove_rating('u1') == 1
+    assert content.get_average_rating() == 4.0
+    content.remove_rating('u2')
+    assert content.get_average_rating() == 0.0
+
+def test_rating_changes_reencode_content_features():
+    from src.recommendation_engine import RecommendationEngine
+    from src.utils import calculate_content_similarity
+
+    engine = RecommendationEngine()
+    first = engine.add_content('c1', 'Avengers', 'movie')
+    second = engine.add_content('c2', 'Inception', 'movie')
+    first.add_rating('u1', 5)
+    engine._sync_content_features()
+    before = engine.content_features.similarity('c1', 'c2')
+
+    second.add_rating('u1', 5)
+    engine._sync_content_features()
+    after = engine.content_features.similarity('c1', 'c2')
+    assert after > before
+    assert after == calculate_content_similarity(first, second)
+
+def test_deferred_fields_load_once_on_first_access():
+    calls = []
+    def source(content_id):
+        calls.append(content_id)
+        return {'description': 'Heroes', 'actors': ['Robert'], 'directors': ['Joss'], 'ratings': {'u1': 5, 'u2': 2}}
+
+    content = Content('c1', 'Avengers', 'movie')
+    notified = []
+    content.add_listener(lambda obj, fields: notified.append(fields))
+    content.defer(source, 2, 7.0)
+    assert content.get_average_rating() == 3.5
+    assert not content.hydrated and calls == []
+
+    assert content.actors == ['Robert']
+    assert content.description == 'Heroes' and content.ratings.copy() == {'u1': 5.0, 'u2': 2.0}
+    assert content.hydrated and calls == ['c1'] and notified == []
+
+    content.defer(source, 2, 7.0)
+    content.ratings['u3'] = 2
+    assert content.get_average_rating() == 3.0 and notified == [{'ratings'}]
+
+def test_bulk_built_ratings_match_single_inserts():
+    ratings = {f'bulk{i}': (i * 7) % 5 + 0.1 * (i % 3) for i in range(200, 0, -1)}
+    inserted = RatingMap()
+    for user_id, rating in ratings.items():
+        inserted[user_id] = rating
+    for built in (RatingMap(ratings), RatingMap.from_dict(ratings)):
+        assert built._users == inserted._users and built._values == inserted._values
+        assert built._total == inserted._total and built.copy() == ratings
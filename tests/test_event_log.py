@@ -0,0 +1,132 @@
+import json
+from datetime import datetime
+from src.event_log import EventLog
+from src.recommendation_engine import RecommendationEngine
+from tests.test_snapshot import build_engine, recommendations, state
+
+def change(engine):
+    engine.add_viewing_record('u3', 'c2', 100, 0.6)
+    engine.users['u1'].add_viewing_record('c5', 100, 0.9, datetime(2024, 1, 1))
+    content = engine.add_content('c6', 'C6', 'movie')
+    content.description = 'Set after creation, without a notification'
+    content.genres = ['Comedy']
+    engine.content_database['c2'].popularity_score = 9.9
+    engine.content_database['c3'].ratings['u1'] = 1
+    engine.update_user_preferences('u4', {'Comedy': 0.4})
+
+def log_lines(log):
+    with open(log.log_path) as file:
+        return [json.loads(line) for line in file]
+
+def test_engine_reports_additions_and_changes():
+    engine = RecommendationEngine()
+    changes = []
+    engine.add_change_listener(lambda kind, obj, fields: changes.append((kind, obj, fields)))
+    user = engine.add_user('u1')
+    user.update_preferences({'Action': 0.5})
+    content = engine.add_content('c1', 'C1', 'movie')
+    content.ratings['u1'] = 4
+    assert changes == [('user', user, None), ('user', user, {'preferences'}),
+                       ('content', content, None), ('content', content, {'ratings'})]
+
+def test_flush_appends_only_changes_and_replays(tmp_path):
+    path = str(tmp_path / 'model.snapshot')
+    log = EventLog(path, compact_bytes=None)
+    engine = log.open(build_engine())
+    assert log_lines(log) == [{'generation': 1}]
+
+    change(engine)
+    assert log.flush() == 8
+    engine.users['u1'].add_viewing_record('c2', 10, 0.2)
+    assert log.flush() == 1
+    assert log.flush() == 0
+    log.close()
+
+    lines = log_lines(log)
+    assert [line['op'] for line in lines[1:]] == [
+        'add_content', 'update_content', 'update_content', 'update_ratings', 'add_viewing_record',
+        'add_viewing_record', 'add_user', 'update_preferences', 'commit', 'add_viewing_record', 'commit']
+    assert lines[-2]['content_ids'] == ['c2']
+
+    restored = EventLog(path).open()
+    assert state(restored) == state(engine)
+    assert recommendations(restored) == recommendations(engine)
+
+    # Replayed users are not logged again, later records are
+    restored_log = EventLog(path, compact_bytes=None)
+    restored = restored_log.open()
+    restored.users['u1'].add_viewing_record('c4', 10, 0.3)
+    restored.users['u2'].add_viewing_record('c4', 10, 0.3)
+    restored_log.flush()
+    assert [(line['user_id'], line['content_ids']) for line in log_lines(restored_log)[-3:-1]] == [
+        ('u1', ['c4']), ('u2', ['c4'])]
+
+def test_uncommitted_tail_is_dropped(tmp_path):
+    path = str(tmp_path / 'model.snapshot')
+    log = EventLog(path)
+    engine = log.open(build_engine())
+    engine.add_viewing_record('u3', 'c2', 100, 0.6)
+    log.close()
+    expected = state(engine)
+    with open(log.log_path, 'a') as file:
+        file.write('{"op": "add_user", "user_id": "u9", "username": null}\n{"op": "add_vie')
+
+    restored_log = EventLog(path)
+    restored = restored_log.open()
+    assert state(restored) == expected
+    restored.add_viewing_record('u3', 'c1', 50, 0.5)
+    restored_log.close()
+    assert state(EventLog(path).open())[0]['u3'] == state(restored)[0]['u3']
+
+def test_compaction_resets_the_log(tmp_path):
+    path = str(tmp_path / 'model.snapshot')
+    log = EventLog(path, compact_bytes=None)
+    engine = log.open(build_engine())
+    change(engine)
+    assert log.flush() == 8
+    stale_log = (tmp_path / 'model.log').read_bytes()
+    log.compact_bytes = 1
+    engine.add_viewing_record('u3', 'c1', 50, 0.5)
+    assert log.flush() == 1
+    assert log.generation == 2 and log_lines(log) == [{'generation': 2}]
+    log.close()
+    assert state(EventLog(path).open()) == state(engine)
+
+    # A log left behind by an interrupted compaction is not replayed
+    (tmp_path / 'model.log').write_bytes(stale_log)
+    stale = EventLog(path)
+    assert state(stale.open()) == state(engine)
+    assert log_lines(stale) == [{'generation': 2}]
+
+def test_content_changes_log_only_what_changed(tmp_path):
+    path = str(tmp_path / 'model.snapshot')
+    log = EventLog(path, compact_bytes=None)
+    log.open(build_engine())
+    log.close()
+
+    log = EventLog(path, compact_bytes=None)
+    engine = log.open()
+    content = engine.content_database['c2']
+    assert not content.hydrated
+    content.popularity_score = 9.9
+    log.flush()
+    assert not content.hydrated
+    assert log_lines(log)[-2] == {'op': 'update_content', 'content_id': 'c2', 'metadata': {'popularity_score': 9.9}}
+
+    rated = engine.content_database['c3']
+    rated.ratings['u4'] = 2
+    rated.ratings['u1'] = 4
+    del rated.ratings['u4']
+    log.flush()
+    assert log_lines(log)[-2] == {'op': 'update_ratings', 'content_id': 'c3', 'user_ids': ['u1', 'u4'],
+                                  'ratings': [4, None], 'total': rated.ratings._total}
+
+    engine.content_database['c4'].description = 'Set without a notification'
+    engine.refresh_content('c4', ['description'])
+    log.flush()
+    assert log_lines(log)[-2]['metadata'] == {'description': 'Set without a notification'}
+    log.close()
+
+    restored = EventLog(path).open()
+    assert restored.content_database['c3'].ratings.copy() == rated.ratings.copy()
+    assert state(restored) == state(engine)
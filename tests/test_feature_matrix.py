@@ -0,0 +1,46 @@
+import pytest
+from src.content_metadata import Content
+from src.feature_matrix import ContentFeatureMatrix
+from src.utils import calculate_content_similarity
+
+@pytest.fixture
+def catalog():
+    items = []
+    specs = [
+        ('c1', 'movie', ['Action', 'Adventure'], ['hero', 'team'], 9.5, {'u1': 5}),
+        ('c2', 'movie', ['Sci-Fi', 'Thriller'], ['dream', 'mind'], 8.7, {}),
+        ('c3', 'series', ['Comedy', 'Romance'], ['sitcom', 'funny'], 8.2, {'u1': 3, 'u2': 4}),
+        ('c4', 'series', ['Action'], ['team', 'funny'], 3, {'u2': 1}),
+        ('c5', 'documentary', [], [], 0.0, {}),
+        ('c6', 'short', [], ['dream'], 9.9, {}),
+    ]
+    for content_id, content_type, genres, tags, popularity, ratings in specs:
+        content = Content(content_id, content_id.upper(), content_type)
+        content.genres = genres
+        content.tags = tags
+        content.popularity_score = popularity
+        content.ratings = ratings
+        items.append(content)
+    return items
+
+def test_scores_match_pairwise_similarity(catalog):
+    matrix = ContentFeatureMatrix(initial_capacity=2)
+    for content in catalog:
+        matrix.upsert(content)
+
+    for content in catalog:
+        batch = matrix.scores(content.content_id)
+        expected = [calculate_content_similarity(content, other) for other in catalog]
+        assert list(batch) == expected
+
+def test_upsert_reencodes_changed_content(catalog):
+    matrix = ContentFeatureMatrix()
+    for content in catalog:
+        matrix.upsert(content)
+
+    catalog[1].genres = ['Action', 'Adventure']
+    catalog[1].tags = ['hero']
+    matrix.upsert(catalog[1])
+
+    assert len(matrix) == len(catalog)
+    assert matrix.similarity('c1', 'c2') == calculate_content_similarity(catalog[0], catalog[1])
@@ -0,0 +1,52 @@
+import pytest
+from src.recommendation_engine import RecommendationEngine
+
+@pytest.fixture
+def engine():
+    engine = RecommendationEngine()
+    specs = [
+        ('c1', 'movie', ['Action', 'Adventure'], ['hero', 'team'], 9.5),
+        ('c2', 'movie', ['Sci-Fi', 'Thriller'], ['dream', 'mind'], 8.7),
+        ('c3', 'series', ['Comedy', 'Romance'], ['sitcom', 'funny'], 8.2),
+        ('c4', 'movie', ['Action'], ['dark'], 9.0),
+        ('c5', 'documentary', ['History'], ['educational'], 9.4),
+    ]
+    for content_id, content_type, genres, tags, popularity in specs:
+        content = engine.add_content(content_id, content_id.upper(), content_type)
+        content.genres = genres
+        content.tags = tags
+        content.popularity_score = popularity
+
+    engine.add_viewing_record('u1', 'c1', 7000, 1.0)
+    return engine
+
+def test_index_follows_metadata_updates(engine):
+    assert engine.content_index.candidates(['c1']) == {'c1', 'c4'}
+
+    engine.content_database['c3'].update_metadata({'genres': ['Adventure'], 'tags': ['sitcom']})
+    engine.content_database['c4'].tags = ['hero']
+    engine.content_database['c4'].genres = ['Drama']
+
+    assert engine.content_index.candidates(['c1']) == {'c1', 'c3', 'c4'}
+    assert ('tag', 'dark') not in engine.content_index.postings
+
+@pytest.mark.parametrize('limit', [1, 2, 4])
+def test_exact_fallback_matches_unpruned_ranking(engine, limit):
+    recs = engine.content_based_filtering('u1', limit=limit)
+
+    features = engine.content_features
+    full_scores = features.scores('c1')
+    expected = sorted(
+        (content_id for content_id in features.content_ids if content_id != 'c1'),
+        key=lambda content_id: -full_scores[features.index[content_id]]
+    )
+    assert recs == expected[:limit]
+
+def test_pad_fallback_fills_short_candidate_lists(engine):
+    engine.candidate_fallback = 'pad'
+    recs = engine.content_based_filtering('u1', limit=3)
+    assert recs[0] == 'c4'
+    assert len(recs) == 3
+
+    engine.candidate_fallback = 'none'
+    assert engine.content_based_filtering('u1', limit=3) == ['c4']
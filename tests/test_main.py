@@ -0,0 +1,19 @@
+from main import RecommendationSystem
+
+def test_user_stats_total_fractional_and_missing_durations(tmp_path):
+    system = RecommendationSystem(str(tmp_path))
+    system.engine.add_content('c1', 'C1', 'movie')
+    system.engine.add_viewing_record('u1', 'c1', 1.5, 0.5)
+    system.engine.add_viewing_record('u1', 'c1', 2.5, 0.5)
+    system.engine.add_viewing_record('u1', 'c1', None, 0.5)
+    stats = system.get_user_stats('u1')
+    assert stats['total_watch_time'] == 4 and isinstance(stats['total_watch_time'], int)
+
+    system.engine.add_viewing_record('u1', 'c1', 0.25, 0.5)
+    assert system.get_user_stats('u1')['total_watch_time'] == 4.25
+    assert system.get_user_stats('u1')['total_items_watched'] == 4
+
+def test_history_similarity_does_not_depend_on_the_data_format(tmp_path):
+    assert RecommendationSystem(str(tmp_path), 'sqlite').engine.history_similarity == 'exact'
+    system = RecommendationSystem(str(tmp_path), 'json', history_similarity='minhash')
+    assert system.engine.history_similarity == 'minhash'
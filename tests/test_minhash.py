@@ -0,0 +1,53 @@
+import numpy as np
+from src.minhash import MinHasher, SignatureMatrix, estimate_jaccard
+from src.recommendation_engine import RecommendationEngine
+from src.user_profile import UserProfile
+
+def test_incremental_signature_matches_batch_signature():
+    hasher = MinHasher(num_perm=32)
+    user = UserProfile('u1', minhasher=hasher)
+    watched = [f'c{i % 40}' for i in range(100)]
+    for content_id in watched:
+        user.add_viewing_record(content_id, 60, 0.5)
+
+    assert np.array_equal(user.history_signature, hasher.signature(watched))
+
+def test_signature_matrix_estimates_jaccard():
+    hasher = MinHasher(num_perm=256)
+    sets = {
+        'a': {f'c{i}' for i in range(0, 100)},
+        'b': {f'c{i}' for i in range(50, 150)},
+        'c': {f'c{i}' for i in range(200, 300)},
+        'd': set(),
+    }
+    matrix = SignatureMatrix(hasher, initial_capacity=1)
+    for key, items in sets.items():
+        matrix.update(key, hasher.signature(items))
+
+    estimates = matrix.jaccard(hasher.signature(sets['a']))
+    assert abs(estimates[1] - 1 / 3) < 0.1
+    assert estimates[2] < 0.05
+    assert estimates[3] == 0.0
+    assert estimate_jaccard(hasher.signature(sets['a']), hasher.signature(sets['a'])) == 1.0
+
+    signatures = np.stack([hasher.signature(sets[key]) for key in ('a', 'd', 'c')])
+    pairs = matrix.jaccard_matrix(signatures, list(sets), block_size=3)
+    assert np.array_equal(pairs[0], estimates)
+    assert not pairs[1].any()
+    assert np.array_equal(pairs[2], matrix.jaccard(signatures[2]))
+
+def test_minhash_history_similarity_in_collaborative_filtering():
+    exact = RecommendationEngine()
+    sketched = RecommendationEngine(history_similarity='minhash', minhash_permutations=128)
+    for engine in (exact, sketched):
+        for i in range(30):
+            engine.add_content(f'c{i}', f'Content {i}', 'movie')
+        for j in range(6):
+            engine.update_user_preferences(f'u{j}', {'Drama': 0.5 + j / 20})
+            for i in range(j, j + 12):
+                engine.add_viewing_record(f'u{j}', f'c{i}', 600, 1.0)
+
+    for j in range(1, 6):
+        assert abs(exact._calculate_user_similarity('u0', f'u{j}')
+                   - sketched._calculate_user_similarity('u0', f'u{j}')) < 0.1
+    assert sketched.collaborative_filtering('u0', limit=3) == exact.collaborative_filtering('u0', limit=3)
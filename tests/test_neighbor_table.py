@@ -0,0 +1,85 @@
+import random
+import numpy as np
+import pytest
+from src.recommendation_engine import RecommendationEngine
+from src.utils import top_k_indices
+
+GENRES = ['Action', 'Comedy', 'Drama', 'Sci-Fi', 'Horror']
+TAGS = ['hero', 'space', 'funny', 'dark', 'team', 'mind']
+
+def add_random_content(engine, rng, content_id):
+    content = engine.add_content(content_id, content_id.upper(), rng.choice(['movie', 'series']))
+    content.update_metadata({
+        'genres': rng.sample(GENRES, rng.randint(0, 2)),
+        'tags': rng.sample(TAGS, rng.randint(0, 2)),
+        'popularity_score': rng.choice([0.2, 0.5, 0.9])
+    })
+
+@pytest.fixture
+def engine():
+    rng = random.Random(7)
+    engine = RecommendationEngine(item_neighbors=5)
+    for i in range(40):
+        add_random_content(engine, rng, f'c{i:02d}')
+    for i in range(8):
+        engine.add_viewing_record('u1', f'c{rng.randrange(40):02d}', 600, rng.random())
+    return engine
+
+def brute_force_neighbors(features, size):
+    expected = {}
+    for row, content_id in enumerate(features.content_ids):
+        scores = features.scores(content_id)
+        scores[row] = -np.inf
+        expected[content_id] = list(top_k_indices(scores, min(size, len(features) - 1)))
+    return expected
+
+def table_neighbors(engine):
+    table = engine.item_neighbors
+    return {content_id: list(table.neighbors(content_id)[0])
+            for content_id in engine.content_features.content_ids}
+
+def test_block_scores_match_single_item_scores(engine):
+    engine._sync_content_features()
+    features = engine.content_features
+    rows = np.array([3, 0, 17])
+    for i, scores in enumerate(features.block_scores(rows)):
+        assert np.array_equal(scores, features.scores(features.content_ids[rows[i]]))
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_build_matches_brute_force(engine, workers):
+    engine.build_item_neighbors(workers=workers)
+    assert table_neighbors(engine) == brute_force_neighbors(engine.content_features, 5)
+
+def test_refresh_matches_full_rebuild(engine):
+    rng = random.Random(11)
+    engine.build_item_neighbors()
+    for content_id in ('c03', 'c10', 'c27'):
+        engine.content_database[content_id].update_metadata({
+            'genres': rng.sample(GENRES, 2), 'popularity_score': 0.1
+        })
+    add_random_content(engine, rng, 'c40')
+    engine.content_database['c05'].add_rating('u2', 4)
+
+    engine._sync_content_features()
+    assert table_neighbors(engine) == brute_force_neighbors(engine.content_features, 5)
+
+def test_content_based_filtering_merges_neighbor_lists(engine):
+    recs = engine.content_based_filtering('u1', limit=5)
+    assert engine.item_neighbors.built
+    assert len(recs) == 5
+
+    watched = set(engine.users['u1'].viewing_history.content_ids())
+    assert not watched & set(recs)
+
+    # With lists covering the whole catalog the merge is the exact ranking
+    exact = RecommendationEngine()
+    full = RecommendationEngine(item_neighbors=100)
+    for other in (exact, full):
+        for content_id, content in engine.content_database.items():
+            copy = other.add_content(content_id, content.title, content.content_type)
+            copy.update_metadata({'genres': content.genres, 'tags': content.tags,
+                                  'popularity_score': content.popularity_score})
+        for record in engine.users['u1'].viewing_history:
+            other.add_viewing_record('u1', record['content_id'], record['watch_duration'],
+                                     record['completion_percentage'])
+    assert full.content_based_filtering('u1', limit=10) == exact.content_based_filtering('u1', limit=10)
@@ -0,0 +1,62 @@
+from src.pair_cache import PairCache
+from src.recommendation_engine import RecommendationEngine
+
+def test_invalidate_touches_only_entries_of_one_member():
+    cache = PairCache()
+    cache[('u1', 'u2')] = 0.5
+    cache[('u1', 'u3')] = 0.25
+    cache[('u2', 'u3')] = 0.75
+    cache[('u4', 'u4')] = 1.0
+
+    assert cache.invalidate('u1') == 2
+    assert dict(cache) == {('u2', 'u3'): 0.75, ('u4', 'u4'): 1.0}
+    assert cache.partners('u2') == {'u3'}
+    assert cache.partners('u1') == set()
+
+    del cache[('u2', 'u3')]
+    assert cache.partners('u3') == set()
+    assert cache.invalidate('u4') == 1
+    assert len(cache) == 0
+
+def test_profile_updates_drop_cached_user_similarities():
+    engine = RecommendationEngine()
+    for user_id in ('u1', 'u2', 'u3'):
+        engine.update_user_preferences(user_id, {'Action': 0.5})
+    engine._calculate_user_similarity('u1', 'u2')
+    engine._calculate_user_similarity('u2', 'u3')
+
+    engine.add_viewing_record('u1', 'c1', 600, 1.0)
+    assert list(engine.user_similarity_cache) == [('u2', 'u3')]
+
+def test_lru_eviction_keeps_adjacency_consistent():
+    cache = PairCache(max_entries=2)
+    cache[('a', 'b')] = 1.0
+    cache[('a', 'c')] = 2.0
+    assert cache.get(('a', 'b')) == 1.0
+    cache[('c', 'd')] = 3.0
+
+    assert list(cache) == [('a', 'b'), ('c', 'd')]
+    assert cache.partners('a') == {'b'}
+    assert cache.stats()['evictions'] == 1
+    assert cache.get(('a', 'c')) is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+def test_ttl_and_byte_budget():
+    now = [0.0]
+    cache = PairCache(ttl=10, clock=lambda: now[0])
+    cache[('a', 'b')] = 1.0
+    now[0] = 5.0
+    cache[('b', 'c')] = 2.0
+    now[0] = 12.0
+    assert ('a', 'b') not in cache
+    assert cache.get(('b', 'c')) == 2.0
+    assert cache.partners('a') == set()
+    now[0] = 20.0
+    assert cache.purge_expired() == 1
+    assert cache.stats()['expirations'] == 2
+
+    budgeted = PairCache(max_bytes=2000)
+    for i in range(100):
+        budgeted[(f'u{i}', f'u{i + 1}')] = 0.5
+    assert 0 < len(budgeted) < 100
+    assert budgeted.stats()['bytes'] <= 2000
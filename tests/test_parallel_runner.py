@@ -0,0 +1,45 @@
+import pytest
+from src.parallel_runner import ParallelRecommendationRunner
+from src.recommendation_engine import RecommendationEngine
+
+@pytest.fixture
+def engine():
+    engine = RecommendationEngine(item_neighbors=3)
+    specs = [
+        ('c1', 'movie', ['Action', 'Adventure'], ['hero', 'team']),
+        ('c2', 'movie', ['Sci-Fi', 'Thriller'], ['dream', 'mind']),
+        ('c3', 'series', ['Comedy', 'Romance'], ['sitcom', 'funny']),
+        ('c4', 'movie', ['Action'], ['dark']),
+        ('c5', 'series', ['Comedy'], ['funny']),
+    ]
+    for content_id, content_type, genres, tags in specs:
+        content = engine.add_content(content_id, content_id.upper(), content_type)
+        content.update_metadata({'genres': genres, 'tags': tags})
+
+    views = {'u1': ['c1', 'c3'], 'u2': ['c2', 'c4'], 'u3': ['c1', 'c5'], 'u4': ['c3']}
+    for user_id, content_ids in views.items():
+        engine.update_user_preferences(user_id, {'Action': 0.5, 'Comedy': 0.25})
+        for content_id in content_ids:
+            engine.add_viewing_record(user_id, content_id, 3600, 0.75)
+    return engine
+
+@pytest.mark.parametrize('algorithm', ['content_based', 'collaborative', 'hybrid'])
+def test_workers_match_in_process_batch(engine, algorithm):
+    user_ids = ['u1', 'u2', 'u3', 'u4', 'unknown']
+    expected = [(user_id, [c.content_id for c in recs])
+                for user_id, recs in engine.generate_recommendations_batch(user_ids, algorithm, 2)]
+
+    with ParallelRecommendationRunner(engine, workers=2, chunk_size=2) as runner:
+        assert not engine.content_features._genres.flags.writeable
+        results = [(user_id, [c.content_id for c in recs]) for user_id, recs in runner.run(user_ids, algorithm, 2)]
+    assert results == expected
+
+def test_close_restores_a_writable_model(engine):
+    with ParallelRecommendationRunner(engine, workers=2) as runner:
+        list(runner.run(['u1']))
+        with pytest.raises(ValueError):
+            engine.content_features._ratings[0] = 1.0
+
+    engine.add_viewing_record('u1', 'c2', 60, 0.5)
+    engine.content_database['c4'].genres = ['Drama']
+    assert 'c2' not in engine.content_based_filtering('u1')
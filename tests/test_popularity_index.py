@@ -0,0 +1,34 @@
+from src.recommendation_engine import RecommendationEngine
+
+def build_engine():
+    engine = RecommendationEngine()
+    specs = [
+        ('c1', 'movie', ['Action', 'Adventure'], 9.5),
+        ('c2', 'movie', ['Sci-Fi', 'Thriller'], 8.7),
+        ('c3', 'series', ['Comedy', 'Romance'], 8.2),
+        ('c4', 'series', ['Action'], 8.7),
+    ]
+    for content_id, content_type, genres, popularity in specs:
+        content = engine.add_content(content_id, content_id.upper(), content_type)
+        content.genres = genres
+        content.popularity_score = popularity
+    return engine
+
+def test_popular_content_tracks_popularity_changes():
+    engine = build_engine()
+    assert engine.get_popular_content(10) == ['c1', 'c2', 'c4', 'c3']
+
+    engine.content_database['c3'].popularity_score = 9.9
+    engine.content_database['c1'].update_metadata({'popularity_score': 1.0})
+    assert engine.get_popular_content(2) == ['c3', 'c2']
+    assert engine.content_based_filtering('unknown', limit=1) == ['c3']
+
+def test_popular_content_by_type_and_genre():
+    engine = build_engine()
+    assert engine.get_popular_content(10, content_type='series') == ['c4', 'c3']
+    assert engine.get_popular_content(10, genre='Action') == ['c1', 'c4']
+    assert engine.get_popular_content(10, content_type='movie', genre='Action') == ['c1']
+
+    engine.content_database['c4'].genres = ['Drama']
+    assert engine.get_popular_content(10, genre='Action') == ['c1']
+    assert engine.get_popular_content(10, genre='Horror') == []
@@ -0,0 +1,42 @@
+import math
+import pytest
+from src.preference_matrix import PreferenceMatrix
+from src.recommendation_engine import RecommendationEngine
+
+def cosine(prefs1, prefs2):
+    genres = set(prefs1) | set(prefs2)
+    dot = sum(prefs1.get(g, 0.0) * prefs2.get(g, 0.0) for g in genres)
+    norm1 = math.sqrt(sum(v * v for v in prefs1.values()))
+    norm2 = math.sqrt(sum(v * v for v in prefs2.values()))
+    return dot / (norm1 * norm2) if norm1 and norm2 else 0.0
+
+def test_batched_cosine_matches_pairwise():
+    profiles = {
+        'u1': {'Action': 0.9, 'Comedy': 0.5},
+        'u2': {'Action': 0.8},
+        'u3': {'Drama': 0.7, 'Comedy': 0.1, 'Horror': 0.3},
+        'u4': {},
+    }
+    matrix = PreferenceMatrix(initial_capacity=1, initial_genres=1)
+    for user_id, preferences in profiles.items():
+        matrix.update(user_id, preferences)
+
+    similarities = matrix.similarities('u1')
+    for position, user_id in enumerate(profiles):
+        assert similarities[position] == pytest.approx(cosine(profiles['u1'], profiles[user_id]), abs=1e-6)
+
+    pairs = matrix.similarity_matrix(['u1', 'u3'], list(profiles))
+    assert pairs.shape == (2, 4)
+    assert pairs[0] == pytest.approx(similarities, abs=1e-6)
+    assert pairs[1] == pytest.approx(matrix.similarities('u3'), abs=1e-6)
+
+def test_rows_follow_preference_updates():
+    engine = RecommendationEngine()
+    engine.update_user_preferences('u1', {'Action': 1.0})
+    engine.update_user_preferences('u2', {'Comedy': 1.0})
+    assert engine._calculate_preference_similarity(engine.users['u1'], engine.users['u2']) == 0.0
+
+    engine.users['u2'].update_preferences({'Action': 1.0})
+    assert engine._calculate_preference_similarity(
+        engine.users['u1'], engine.users['u2']) == pytest.approx(math.sqrt(0.5), abs=1e-6)
+    assert len(engine.preference_matrix) == 2
@@ -49,3 +49,72 @@ def test_hybrid_recommendation(setup_engine):
     recs = setup_engine.generate_recommendations('u1', algorithm='hybrid')
     assert isinstance(recs, list)
     assert len(recs) > 0
+
+@pytest.mark.parametrize('algorithm', ['content_based', 'collaborative', 'hybrid'])
+def test_batch_recommendations_match_single_user_calls(setup_engine, algorithm):
+    engine = setup_engine
+    engine.add_content('c4', 'Dark Knight', 'movie').genres = ['Action']
+    engine.add_viewing_record('u2', 'c2', 7000, 0.9)
+    engine.add_viewing_record('u2', 'c4', 7000, 0.5)
+    engine.add_viewing_record('u3', 'c1', 7000, 0.7)
+
+    user_ids = ['u1', 'u2', 'u3', 'unknown']
+    batch = engine.generate_recommendations_batch(iter(user_ids), algorithm, limit=2, chunk_size=3)
+    assert not isinstance(batch, list)
+    assert [(user_id, [c.content_id for c in recs]) for user_id, recs in batch] == [
+        (user_id, [c.content_id for c in engine.generate_recommendations(user_id, algorithm, 2)])
+        for user_id in user_ids
+    ]
+
+@pytest.mark.parametrize('options', [
+    {'candidate_fallback': 'pad'},
+    {'candidate_fallback': 'none', 'neighbor_index': 'lsh'},
+    {'item_neighbors': 2, 'history_similarity': 'minhash'},
+])
+def test_batch_recommendations_match_single_user_calls_for_every_option(options):
+    engine = RecommendationEngine(**options)
+    genres = ['Action', 'Drama', 'Comedy', 'Sci-Fi']
+    for i in range(12):
+        engine.add_content(f'c{i}', f'Content {i}', 'movie' if i % 3 else 'series').genres = [genres[i % 4]]
+    for j in range(8):
+        engine.update_user_preferences(f'u{j}', {genres[j % 4]: 0.5 + j / 20, genres[(j + 1) % 4]: 0.3})
+        for i in range(j, j + 4):
+            engine.add_viewing_record(f'u{j}', f'c{(i * 5) % 12}', 600, 1.0 - i / 20)
+
+    user_ids = [f'u{j}' for j in range(8)] + ['unknown']
+    for algorithm, fusion in [('content_based', None), ('collaborative', None), ('hybrid', 'rank'),
+                              ('hybrid', 'score'), ('hybrid', 'rrf')]:
+        batch = engine.generate_recommendations_batch(user_ids, algorithm, limit=3, chunk_size=4, fusion=fusion)
+        assert [(user_id, [c.content_id for c in recs]) for user_id, recs in batch] == [
+            (user_id, [c.content_id for c in engine.generate_recommendations(user_id, algorithm, 3, fusion)])
+            for user_id in user_ids
+        ]
+
+def test_batch_recommendations_reject_unknown_algorithm(setup_engine):
+    with pytest.raises(ValueError):
+        list(setup_engine.generate_recommendations_batch(['u1'], 'random'))
+
+@pytest.mark.parametrize('fusion', ['score', 'rrf'])
+def test_hybrid_score_fusion(setup_engine, fusion):
+    engine = setup_engine
+    engine.add_content('c4', 'Dark Knight', 'movie').genres = ['Action']
+    recs = engine.hybrid_filtering('u1', limit=2, fusion=fusion)
+    # Without similar users the content-based signal decides alone
+    assert recs == engine.content_based_filtering('u1', limit=2)
+
+    engine.add_viewing_record('u2', 'c1', 7000, 1.0)
+    engine.add_viewing_record('u2', 'c2', 7000, 0.9)
+    recs = engine.generate_recommendations('u1', 'hybrid', limit=5, fusion=fusion)
+    assert sorted(c.content_id for c in recs) == ['c2', 'c4']
+    batch = engine.generate_recommendations_batch(['u1', 'u2'], 'hybrid', limit=5, fusion=fusion)
+    assert [(user_id, [c.content_id for c in recs]) for user_id, recs in batch] == [
+        (user_id, engine.hybrid_filtering(user_id, limit=5, fusion=fusion)) for user_id in ['u1', 'u2']
+    ]
+
+def test_hybrid_fusion_defaults_and_validation(setup_engine):
+    engine = setup_engine
+    assert engine.hybrid_filtering('u1', fusion='rank') == engine.hybrid_filtering('u1')
+    with pytest.raises(ValueError):
+        engine.generate_recommendations('u1', 'hybrid', fusion='average')
+    with pytest.raises(ValueError):
+        RecommendationEngine(hybrid_fusion='average')
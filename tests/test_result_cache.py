@@ -0,0 +1,107 @@
+import pytest
+from src.recommendation_engine import RecommendationEngine
+from src.result_cache import ResultCache
+
+def ids(recommendations):
+    return [content.content_id for content in recommendations]
+
+@pytest.fixture
+def engine():
+    engine = RecommendationEngine(result_cache_size=100)
+    for content_id, genre, popularity in [('c1', 'Action', 0.9), ('c2', 'Action', 0.5),
+                                          ('c3', 'Comedy', 0.7), ('c4', 'Drama', 0.2)]:
+        content = engine.add_content(content_id, content_id.upper(), 'movie')
+        content.update_metadata({'genres': [genre], 'popularity_score': popularity})
+    engine.add_viewing_record('u1', 'c1', 3600, 1.0)
+    engine.add_viewing_record('u2', 'c3', 3600, 1.0)
+    return engine
+
+def test_direct_events_drop_only_dependent_entries():
+    cache = ResultCache()
+    cache.store(('u1', 'content_based', 2), ['c2', 'c3'], dependencies={'c1'})
+    cache.store(('u2', 'content_based', 2), ['c4'], dependencies={'c5'})
+
+    cache.content_changed('c1')
+    assert cache.lookup(('u1', 'content_based', 2)) is None
+    assert cache.lookup(('u2', 'content_based', 2)) == (('c4',), False)
+
+    cache.store(('u2', 'collaborative', 2), ['c4'])
+    cache.user_changed('u2')
+    assert len(cache) == 0
+
+def test_repeat_requests_are_served_from_cache(engine):
+    first = ids(engine.generate_recommendations('u1', 'content_based', 2))
+    for _ in range(3):
+        assert ids(engine.generate_recommendations('u1', 'content_based', 2)) == first
+    assert engine.cache_stats()['results']['hits'] == 3
+
+    # The user's own history changes the result
+    engine.add_viewing_record('u1', 'c2', 3600, 1.0)
+    assert 'c2' not in ids(engine.generate_recommendations('u1', 'content_based', 2))
+
+def test_unrelated_changes_mark_results_stale(engine):
+    assert ids(engine.generate_recommendations('u1', 'content_based', 1)) == ['c2']
+
+    engine.add_content('c5', 'C5', 'movie').update_metadata({'genres': ['Action'], 'popularity_score': 0.9})
+    assert ids(engine.generate_recommendations('u1', 'content_based', 1)) == ['c5']
+
+def test_stale_while_revalidate(engine):
+    engine.stale_while_revalidate = True
+    assert ids(engine.generate_recommendations('u1', 'content_based', 1)) == ['c2']
+
+    engine.add_content('c5', 'C5', 'movie').update_metadata({'genres': ['Action'], 'popularity_score': 0.9})
+    assert ids(engine.generate_recommendations('u1', 'content_based', 1)) == ['c2']
+    assert engine.result_cache.pending == 1
+
+    assert engine.refresh_stale_results() == 1
+    assert ids(engine.generate_recommendations('u1', 'content_based', 1)) == ['c5']
+    assert engine.result_cache.pending == 0
+
+def test_user_changes_only_stale_neighborhoods_they_can_enter():
+    similarity = {'u9': 0.2, 'u8': 0.5, 'u3': 0.1}
+    compared = []
+    def similarities(user_id, others):
+        compared.append((user_id, others))
+        return [similarity[other_id] for other_id in others]
+
+    cache = ResultCache()
+    cache.store(('u1', 'collaborative', 2, None), ['c4'], neighbors=['u2', 'u3'], kth_similarity=0.5)
+    cache.store(('u5', 'collaborative', 2, None), ['c4'], neighbors=['u6'])  # fewer than k neighbours
+    cache.store(('u7', 'content_based', 2, None), ['c4'])
+
+    # Writes only log the change; reads compare it with the k-th neighbour
+    cache.user_changed('u9')
+    assert compared == []
+    assert cache.lookup(('u1', 'collaborative', 2, None), similarities) == (('c4',), True)
+    assert cache.lookup(('u5', 'collaborative', 2, None), similarities) == (('c4',), False)
+    assert cache.lookup(('u7', 'content_based', 2, None), similarities) == (('c4',), True)
+    assert compared == [('u1', ['u9'])]
+    assert cache.lookup(('u1', 'collaborative', 2, None), similarities) == (('c4',), True)
+    assert len(compared) == 1
+
+    cache.user_changed('u8')
+    assert cache.lookup(('u1', 'collaborative', 2, None), similarities) == (('c4',), False)
+
+    # A neighbour's change is found through the reverse index
+    cache.store(('u1', 'collaborative', 2, None), ['c4'], neighbors=['u2', 'u3'], kth_similarity=0.5)
+    cache.user_changed('u3')
+    assert cache.lookup(('u1', 'collaborative', 2, None), similarities) == (('c4',), False)
+    assert compared[-1] == ('u1', ['u8'])
+
+    # Metadata changes only reach content-based scores; added items reach all
+    cache.store(('u1', 'collaborative', 2, None), ['c4'], neighbors=['u2', 'u3'], kth_similarity=0.5)
+    cache.content_changed('c9')
+    assert cache.lookup(('u1', 'collaborative', 2, None), similarities) == (('c4',), True)
+    assert cache.lookup(('u7', 'content_based', 2, None)) == (('c4',), False)
+    cache.content_changed('c10', added=True)
+    assert cache.lookup(('u1', 'collaborative', 2, None), similarities) == (('c4',), False)
+
+def test_collaborative_results_follow_neighbor_changes(engine):
+    engine.add_viewing_record('u2', 'c1', 3600, 1.0)
+    assert ids(engine.generate_recommendations('u1', 'collaborative', 2)) == ['c3']
+
+    engine.content_database['c4'].update_metadata({'popularity_score': 0.8})
+    assert engine.result_cache.lookup(('u1', 'collaborative', 2, None)) == (('c3',), True)
+
+    engine.add_viewing_record('u2', 'c4', 3600, 1.0)
+    assert ids(engine.generate_recommendations('u1', 'collaborative', 2)) == ['c3', 'c4']
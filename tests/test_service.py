@@ -0,0 +1,119 @@
+import asyncio
+import json
+import threading
+from src.recommendation_engine import RecommendationEngine
+from src.service import RecommendationService, ServiceOverloaded
+
+def make_engine():
+    engine = RecommendationEngine()
+    for content_id, genre in [('c1', 'Action'), ('c2', 'Action'), ('c3', 'Comedy')]:
+        content = engine.add_content(content_id, content_id.upper(), 'movie')
+        content.genres = [genre]
+    engine.add_viewing_record('u1', 'c1', 3600, 1.0)
+    return engine
+
+def slow_engine(calls, release):
+    engine = make_engine()
+    generate = engine.generate_recommendations
+
+    def blocking_generate(*args, **kwargs):
+        calls.append(args)
+        release.wait(5)
+        return generate(*args, **kwargs)
+
+    engine.generate_recommendations = blocking_generate
+    return engine
+
+def test_identical_requests_are_coalesced():
+    calls, release = [], threading.Event()
+    service = RecommendationService(slow_engine(calls, release))
+
+    async def scenario():
+        requests = [asyncio.ensure_future(service.recommend('u1', 'content_based', 2)) for _ in range(5)]
+        other = asyncio.ensure_future(service.recommend('u1', 'content_based', 1))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*requests), await other
+
+    results, other = asyncio.run(scenario())
+    assert [r['content_id'] for r in results[0]] == ['c2', 'c3']
+    assert all(result == results[0] for result in results)
+    assert len(other) == 1
+    assert len(calls) == 2
+    assert service.stats()['coalesced'] == 4
+
+def test_requests_beyond_max_pending_are_rejected():
+    calls, release = [], threading.Event()
+    service = RecommendationService(slow_engine(calls, release), max_concurrency=1, max_pending=2)
+
+    async def scenario():
+        admitted = [asyncio.ensure_future(service.recommend('u1', 'content_based', limit)) for limit in (1, 2)]
+        await asyncio.sleep(0)
+        try:
+            await service.recommend('u1', 'content_based', 3)
+        except ServiceOverloaded:
+            rejected = True
+        else:
+            rejected = False
+        release.set()
+        await asyncio.gather(*admitted)
+        return rejected
+
+    assert asyncio.run(scenario())
+    assert service.stats()['rejected'] == 1
+
+async def get(port, target):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+def test_http_round_trip():
+    service = RecommendationService(make_engine())
+
+    async def scenario():
+        port = await service.start(port=0)
+        try:
+            return (await get(port, '/recommendations?user_id=u1&algorithm=content_based&limit=1'),
+                    await get(port, '/recommendations?user_id=u1&limit=abc'),
+                    await get(port, '/recommendations?user_id=u1&fusion=average'),
+                    await get(port, '/missing'))
+        finally:
+            await service.close()
+
+    ok, bad, bad_fusion, missing = asyncio.run(scenario())
+    assert ok == (200, {'user_id': 'u1', 'algorithm': 'content_based', 'limit': 1,
+                        'recommendations': [{'content_id': 'c2', 'title': 'C2', 'content_type': 'movie',
+                                             'genres': ['Action'], 'popularity_score': 0.0}]})
+    assert bad[0] == 400
+    assert bad_fusion[0] == 400
+    assert missing[0] == 404
+
+def test_unexpected_errors_are_answered_with_500(caplog):
+    engine = make_engine()
+    generate = engine.generate_recommendations
+    failures = [RuntimeError('engine failure')]
+
+    def failing_generate(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return generate(*args, **kwargs)
+
+    engine.generate_recommendations = failing_generate
+    service = RecommendationService(engine)
+
+    async def scenario():
+        port = await service.start(port=0)
+        try:
+            return (await get(port, '/recommendations?user_id=u1&limit=1'),
+                    await get(port, '/recommendations?user_id=u1&limit=1'))
+        finally:
+            await service.close()
+
+    failed, ok = asyncio.run(scenario())
+    assert failed == (500, {'error': 'Internal server error'})
+    assert ok[0] == 200
+    assert 'engine failure' in caplog.text
@@ -0,0 +1,128 @@
+import json
+from datetime import datetime
+import pytest
+from src.lazy_mapping import LazyMapping
+from src.recommendation_engine import RecommendationEngine
+from src.snapshot import _Snapshot, load_snapshot, save_snapshot
+from src.streaming_loader import StreamingLoader
+
+WATCHED_AT = datetime(2024, 5, 17, 20, 30, 15, 123456)
+
+def build_engine(**options):
+    engine = RecommendationEngine(**options)
+    for content_id, content_type, genres, tags, popularity in [
+        ('c1', 'movie', ['Action', 'Adventure'], ['hero'], 9.5),
+        ('c2', 'movie', ['Sci-Fi'], ['dream', 'mind'], 8.7),
+        ('c3', 'series', ['Comedy'], [], 8.2),
+        ('c4', 'movie', ['Action'], ['hero', 'dark'], 8.7),
+        ('c5', 'short', [], ['funny'], 3.0)
+    ]:
+        content = engine.add_content(content_id, content_id.upper(), content_type)
+        content.update_metadata({'genres': genres, 'tags': tags, 'popularity_score': popularity})
+    engine.content_database['c1'].update_metadata({
+        'description': 'Heroes assemble', 'release_date': datetime(2012, 5, 4),
+        'actors': ['Robert', 'Scarlett'], 'directors': ['Joss'], 'duration': 143
+    })
+
+    engine.update_user_preferences('u1', {'Action': 0.9, 'Comedy': 0.5})
+    engine.add_user('u2', 'Zoë').update_preferences({'Sci-Fi': 0.7})
+    engine.add_user('u3')
+    for user_id, content_id, completion in [('u1', 'c1', 1.0), ('u1', 'c3', 0.3), ('u2', 'c1', 0.8),
+                                            ('u2', 'c2', 0.9), ('u2', 'c4', 0.5), ('u1', 'c1', 0.4)]:
+        engine.users[user_id].add_viewing_record(content_id, 600, completion, WATCHED_AT)
+    engine.content_database['c1'].ratings.update({'u1': 5, 'u2': 4, 'critic': 3})
+    engine.content_database['c4'].ratings['u2'] = 2
+    return engine
+
+def state(engine):
+    return (
+        {user_id: (user.username, dict(user.preferences), [dict(record) for record in user.viewing_history],
+                   user.history_signature.tolist())
+         for user_id, user in engine.users.items()},
+        {content_id: (content.title, content.content_type, content.description, content.genres, content.tags,
+                      content.popularity_score, dict(content.ratings), content.get_average_rating(),
+                      content.release_date, content.actors, content.directors, content.duration)
+         for content_id, content in engine.content_database.items()}
+    )
+
+def recommendations(engine):
+    return {(user_id, algorithm): [content.content_id for content in
+                                   engine.generate_recommendations(user_id, algorithm, limit=3)]
+            for user_id in ['u1', 'u2', 'u3', 'unknown']
+            for algorithm in ['content_based', 'collaborative', 'hybrid']}
+
+def test_snapshot_round_trip_is_lazy_and_equivalent(tmp_path):
+    engine = build_engine()
+    path = str(tmp_path / 'model.snapshot')
+    save_snapshot(engine, path)
+
+    restored = load_snapshot(path)
+    assert list(restored.users) == ['u1', 'u2', 'u3']
+    assert restored.users.loaded() == restored.content_database.loaded() == 0
+    assert recommendations(restored) == recommendations(engine)
+    assert restored.get_popular_content(3, genre='Action') == engine.get_popular_content(3, genre='Action')
+    assert state(restored) == state(engine)
+
+def test_restored_engine_accepts_changes(tmp_path):
+    engine = build_engine()
+    path = str(tmp_path / 'model.snapshot')
+    save_snapshot(engine, path)
+    restored = load_snapshot(path)
+
+    for target in (engine, restored):
+        target.add_viewing_record('u3', 'c2', 100, 0.6)
+        target.users['u1'].add_viewing_record('c5', 100, 0.9, WATCHED_AT)
+        target.add_content('c6', 'C6', 'movie').genres = ['Comedy']
+        target.content_database['c2'].popularity_score = 9.9
+        target.content_database['c3'].ratings['u1'] = 1
+    assert recommendations(restored) == recommendations(engine)
+
+    # The file is mapped copy-on-write and stays unchanged
+    assert state(load_snapshot(path)) == state(build_engine())
+
+def test_item_neighbor_table_is_persisted(tmp_path):
+    engine = build_engine(item_neighbors=2)
+    engine.build_item_neighbors()
+    path = str(tmp_path / 'model.snapshot')
+    save_snapshot(engine, path)
+
+    restored = load_snapshot(path)
+    assert restored.item_neighbors.built
+    assert restored.item_neighbors.neighbors('c1')[0].tolist() == engine.item_neighbors.neighbors('c1')[0].tolist()
+    assert recommendations(restored) == recommendations(engine)
+
+def test_load_snapshot_rejects_incompatible_targets(tmp_path):
+    path = tmp_path / 'model.snapshot'
+    save_snapshot(build_engine(), str(path))
+    with pytest.raises(ValueError):
+        load_snapshot(str(path), build_engine())
+    with pytest.raises(ValueError):
+        load_snapshot(str(path), RecommendationEngine(minhash_permutations=32))
+    path.write_bytes(b'{"users": {}}')
+    with pytest.raises(ValueError):
+        load_snapshot(str(path))
+
+def test_lazy_mapping_builds_values_once():
+    calls = []
+    mapping = LazyMapping(['a', 'b'], lambda key: calls.append(key) or key.upper())
+    assert 'a' in mapping and len(mapping) == 2 and list(mapping) == ['a', 'b']
+    assert calls == []
+    assert mapping['a'] == 'A' and mapping.get('a') == 'A' and mapping.get('z') is None
+    mapping['c'] = 'C'
+    assert calls == ['a'] and mapping.loaded() == 2
+    assert dict(mapping) == {'a': 'A', 'b': 'B', 'c': 'C'}
+
+def test_ratings_hydrated_while_saving_keep_their_raters(tmp_path):
+    content_file = tmp_path / 'content.ndjson'
+    content_file.write_text(json.dumps({'content_id': 'late', 'title': 'Late', 'ratings': {'late-rater': 2, 'u1': 5}}))
+    engine = RecommendationEngine()
+    StreamingLoader(engine).load_content(str(content_file))
+    assert not engine.content_database['late'].hydrated
+
+    path = str(tmp_path / 'model.snapshot')
+    save_snapshot(engine, path)
+    # Rating codes must index the saved rater table, not just this process's vocabulary
+    snapshot = _Snapshot(path)
+    raters = snapshot.strings('rater_ids').tolist()
+    assert sorted(raters[code] for code in snapshot['content/rating_users']) == ['late-rater', 'u1']
+    assert dict(load_snapshot(path).content_database['late'].ratings) == {'late-rater': 2, 'u1': 5}
@@ -0,0 +1,122 @@
+import sqlite3
+import threading
+import pytest
+from src.recommendation_engine import RecommendationEngine
+from src.sqlite_storage import SQLiteStorage
+from src.storage import JSONStorage, Storage
+from tests.test_event_log import change
+from tests.test_snapshot import WATCHED_AT, build_engine, recommendations, state
+
+def load(path, **options):
+    storage = SQLiteStorage(path, **options)
+    engine = RecommendationEngine()
+    storage.load(engine)
+    return storage, engine
+
+def rows(path, table):
+    with sqlite3.connect(path) as connection:
+        return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+def test_sqlite_round_trip_is_lazy_and_equivalent(tmp_path):
+    path = str(tmp_path / 'model.db')
+    engine = build_engine()
+    SQLiteStorage(path).save(engine)
+
+    storage, restored = load(path)
+    assert list(restored.users) == ['u1', 'u2', 'u3'] and restored.users.loaded() == 0
+    assert not any(content.hydrated for content in restored.content_database.values())
+    assert recommendations(restored) == recommendations(engine)
+    assert restored.users.loaded() == 3
+
+    # Deferred fields load through the calling thread's own connection
+    thread = threading.Thread(target=lambda: restored.content_database['c1'].description)
+    thread.start()
+    thread.join()
+    assert restored.content_database['c1'].hydrated and len(storage._connections) == 2
+    assert state(restored) == state(engine)
+
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone() == ('wal',)
+        indexes = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'viewing_history_user', 'viewing_history_content', 'viewing_history_timestamp'} <= indexes
+
+def test_sqlite_saves_only_changes(tmp_path):
+    path = str(tmp_path / 'model.db')
+    SQLiteStorage(path).save(build_engine())
+
+    expected = build_engine()
+    change(expected)
+    storage, engine = load(path)
+    change(engine)
+    storage.save(engine)
+    assert rows(path, 'viewing_history') == 8 and rows(path, 'users') == 4
+    # Items whose description and ratings were never read keep them
+    assert not engine.content_database['c2'].hydrated
+    storage.save(engine)
+    assert rows(path, 'viewing_history') == 8
+
+    restored = load(path)[1]
+    assert state(restored) == state(engine)
+    assert recommendations(restored) == recommendations(expected)
+
+    # A database holding data is never overwritten by another engine
+    with pytest.raises(ValueError):
+        SQLiteStorage(path).save(build_engine())
+
+def test_sqlite_evicts_loaded_users_on_access(tmp_path):
+    path = str(tmp_path / 'model.db')
+    engine = build_engine()
+    SQLiteStorage(path).save(engine)
+
+    storage, restored = load(path, max_loaded_users=1)
+    expected = state(engine)
+    assert state(restored) == expected and restored.users.loaded() == 1
+
+    # Profiles with unsaved changes stay loaded until they are saved
+    restored.users['u3'].add_viewing_record('c2', 100, 0.6, WATCHED_AT)
+    restored.users['u1']
+    assert restored.users.loaded() == 2
+    storage.save(restored)
+    assert restored.users.loaded() == 1 and 'u3' in restored.users
+
+    # Evicted profiles are rebuilt from the database
+    engine.users['u3'].add_viewing_record('c2', 100, 0.6, WATCHED_AT)
+    assert state(restored) == state(engine)
+    assert recommendations(restored) == recommendations(engine)
+    assert restored.users.loaded() == 1
+
+def test_sqlite_falls_back_to_json_until_saved(tmp_path):
+    files = JSONStorage(str(tmp_path / 'users.ndjson'), str(tmp_path / 'content.ndjson'))
+    engine = build_engine()
+    files.save(engine)
+
+    path = str(tmp_path / 'model.db')
+    storage = SQLiteStorage(path, fallback=files)
+    migrated = RecommendationEngine()
+    storage.load(migrated)
+    assert type(migrated.users) is dict and recommendations(migrated) == recommendations(engine)
+    storage.save(migrated)
+    migrated.update_user_preferences('u3', {'Drama': 0.2})
+    storage.save(migrated)
+    storage.close()
+
+    restored = load(path)[1]
+    assert state(restored) == state(migrated)
+    assert recommendations(restored) == recommendations(migrated)
+
+def test_storage_backends_must_implement_load_and_save():
+    class LoadOnly(Storage):
+        def load(self, engine, progress=None):
+            pass
+
+    with pytest.raises(TypeError):
+        LoadOnly()
+
+def test_sqlite_warns_when_exact_history_similarity_loads_every_user(tmp_path, caplog):
+    path = str(tmp_path / 'model.db')
+    SQLiteStorage(path).save(build_engine())
+
+    SQLiteStorage(path).load(RecommendationEngine(history_similarity='minhash'))
+    assert not caplog.records
+    load(path)
+    assert [record.levelname for record in caplog.records] == ['WARNING']
@@ -0,0 +1,126 @@
+import io
+import json
+from datetime import datetime
+import numpy as np
+from src.recommendation_engine import RecommendationEngine
+from src.streaming_loader import JSONObjectReader, StreamingLoader, parse_timestamps
+from src.utils import save_ndjson_data
+from src.user_profile import UserProfile
+from src.viewing_history import to_epoch_micros
+
+USERS = {
+    'u1': {
+        'username': 'Zoë',
+        'preferences': {'Action': 0.9},
+        'viewing_history': [
+            {'content_id': 'c1', 'watch_duration': 7000, 'completion_percentage': 1.0,
+             'timestamp': '2024-05-17T20:30:15.123456'},
+            {'content_id': 'c2', 'watch_duration': 1200, 'completion_percentage': 0.25,
+             'timestamp': '2024-05-18T08:00:00+02:00'}
+        ]
+    },
+    'u2': {'username': 'Two', 'viewing_history': [{'content_id': 'c1', 'completion_percentage': 0.5,
+                                                   'timestamp': '2024-05-19T00:00:00'}]},
+    'u3': {}
+}
+
+CONTENT = {
+    'c1': {'content_id': 'c1', 'title': 'Avengers', 'content_type': 'movie', 'genres': ['Action'],
+           'popularity_score': 9.5, 'release_date': '2012-05-04T00:00:00', 'description': 'Héroes ✓',
+           'actors': ['Robert'], 'ratings': {'u2': 4, 'u1': 0.3}},
+    'c2': {'content_id': 'c2', 'title': 'Friends', 'content_type': 'series', 'genres': ['Comedy']}
+}
+
+def test_object_reader_matches_json_load_across_chunk_boundaries():
+    document = json.dumps({'a': {'x': [1, 2.5e3, None, 'é']}, 'bb': 12345, 'c': 'tail'}, indent=2).encode()
+    for chunk_size in (1, 3, 7, 1 << 20):
+        reader = JSONObjectReader(io.BytesIO(document), chunk_size=chunk_size)
+        assert dict(reader) == json.loads(document)
+        assert reader.bytes_read == len(document)
+    assert list(JSONObjectReader(io.BytesIO(b' { } '))) == []
+
+def test_object_reader_tracks_value_byte_spans():
+    document = json.dumps({'é': {'x': 'ü' * 5}, 'b': [1, 2], 'c': 3}, indent=2).encode()
+    for chunk_size in (1, 5, 1 << 20):
+        reader = JSONObjectReader(io.BytesIO(document), chunk_size=chunk_size, track_offsets=True)
+        for key, value in reader:
+            start, end = reader.value_span
+            assert json.loads(document[start:end]) == value
+
+def test_parse_timestamps_handles_mixed_values():
+    before = to_epoch_micros(datetime.now())
+    micros = parse_timestamps(['2024-05-17T20:30:15.123456', '2024-05-18T08:00:00+02:00',
+                               '2024-05-19', None, 'not a date'])
+    assert micros[:3].tolist() == [to_epoch_micros(datetime(2024, 5, 17, 20, 30, 15, 123456)),
+                                   to_epoch_micros(datetime(2024, 5, 18, 6)),
+                                   to_epoch_micros(datetime(2024, 5, 19))]
+    assert micros[3] >= before and micros[4] == micros[3]
+
+def test_bulk_viewing_records_match_single_records():
+    single, bulk = UserProfile('u1'), UserProfile('u1')
+    watched_at = datetime(2024, 5, 17)
+    for content_id, completion in [('c1', 1.0), ('c2', 0.5), ('c1', 0.25)]:
+        single.add_viewing_record(content_id, 100, completion, watched_at)
+    bulk.add_viewing_records(['c1', 'c2', 'c1'], [100, 100, 100], [1.0, 0.5, 0.25],
+                             np.full(3, to_epoch_micros(watched_at)))
+    assert list(bulk.viewing_history) == list(single.viewing_history)
+    assert np.array_equal(bulk.history_signature, single.history_signature)
+
+def test_loader_reads_json_and_ndjson_with_progress(tmp_path):
+    (tmp_path / 'users.json').write_text(json.dumps(USERS, indent=2))
+    (tmp_path / 'content.json').write_text(json.dumps(CONTENT))
+    (tmp_path / 'users.ndjson').write_text(
+        '\n'.join(json.dumps({'user_id': user_id, **user}) for user_id, user in USERS.items()) + '\n\n')
+    (tmp_path / 'content.ndjson').write_text('\n'.join(json.dumps(content) for content in CONTENT.values()))
+
+    loaded = []
+    for extension in ('.json', '.ndjson'):
+        progress = []
+        engine = RecommendationEngine()
+        loader = StreamingLoader(engine, progress=lambda *report: progress.append(report),
+                                 progress_every=2, flush_records=2)
+        assert loader.load_users(str(tmp_path / f'users{extension}')) == 3
+        assert loader.load_content(str(tmp_path / f'content{extension}')) == 2
+        assert [(kind, records) for kind, records, _, _ in progress] == [
+            ('users', 2), ('users', 3), ('content', 2), ('content', 2)]
+        assert progress[1][2] == progress[1][3] == (tmp_path / f'users{extension}').stat().st_size
+        loaded.append(engine)
+
+    for engine in loaded:
+        user = engine.users['u1']
+        assert user.username == 'Zoë' and user.preferences == {'Action': 0.9}
+        assert [dict(record) for record in user.viewing_history] == [
+            {'content_id': 'c1', 'watch_duration': 7000, 'completion_percentage': 1.0,
+             'timestamp': datetime(2024, 5, 17, 20, 30, 15, 123456)},
+            {'content_id': 'c2', 'watch_duration': 1200, 'completion_percentage': 0.25,
+             'timestamp': datetime(2024, 5, 18, 6)}
+        ]
+        assert engine.users['u2'].viewing_history[0]['watch_duration'] == 0
+        assert len(engine.users['u3'].viewing_history) == 0
+        assert engine.content_database['c1'].release_date == datetime(2012, 5, 4)
+        assert engine.content_database['c2'].genres == ('Comedy',)
+        assert engine.generate_recommendations('u2', 'content_based')[0].content_id == 'c2'
+    assert StreamingLoader(RecommendationEngine()).load_users(str(tmp_path / 'missing.json')) == 0
+
+def test_deferred_content_matches_eager_loading(tmp_path):
+    for name, text in [('content.json', json.dumps(CONTENT, indent=2)),
+                       ('content.ndjson', '\n'.join(json.dumps(content) for content in CONTENT.values()))]:
+        (tmp_path / name).write_text(text, encoding='utf-8')
+        engines = []
+        for defer_content in (False, True):
+            engine = RecommendationEngine()
+            StreamingLoader(engine, defer_content=defer_content).load_content(str(tmp_path / name))
+            engines.append(engine)
+        eager, deferred = engines
+
+        content = deferred.content_database['c1']
+        assert content.get_average_rating() == eager.content_database['c1'].get_average_rating()
+        assert deferred.get_popular_content(2) == eager.get_popular_content(2)
+        assert not content.hydrated
+        assert content.description == 'Héroes ✓' and content.actors == ['Robert'] and content.directors == []
+        assert content.ratings.copy() == eager.content_database['c1'].ratings.copy()
+
+    # Deferred records stay readable after the file is rewritten
+    deferred_content = deferred.content_database['c2']
+    save_ndjson_data([{'content_id': 'c9'}], str(tmp_path / 'content.ndjson'))
+    assert deferred_content.description == '' and len(deferred_content.ratings) == 0
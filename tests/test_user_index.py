@@ -0,0 +1,53 @@
+import random
+import pytest
+from src.recommendation_engine import RecommendationEngine
+from src.user_index import ExactUserIndex, LSHUserIndex
+
+def build_engine(neighbor_index):
+    rng = random.Random(7)
+    engine = RecommendationEngine(neighbor_index=neighbor_index)
+    genres = ['Action', 'Comedy', 'Drama', 'Horror', 'Romance', 'Sci-Fi']
+    for i in range(60):
+        engine.add_content(f'c{i}', f'Content {i}', 'movie')
+
+    # Four taste clusters, each watching from its own slice of the catalog
+    for j in range(40):
+        cluster = j % 4
+        engine.update_user_preferences(f'u{j}', {
+            genres[cluster]: rng.uniform(0.7, 1.0),
+            genres[cluster + 1]: rng.uniform(0.2, 0.5)
+        })
+        for _ in range(8):
+            content_id = f'c{cluster * 15 + rng.randrange(15)}'
+            engine.add_viewing_record(f'u{j}', content_id, 3600, rng.random())
+    return engine
+
+def test_lsh_index_recall_against_exact_search():
+    engine = build_engine(LSHUserIndex(num_perm=32, bands=16))
+    report = engine.neighbor_recall(k=5)
+
+    assert report['users'] == 40
+    assert report['recall_at_k'] >= 0.9
+    assert report['avg_candidates'] < 39
+
+def test_neighbor_index_follows_direct_profile_changes():
+    engine = build_engine('lsh')
+    before = engine._calculate_user_similarity('u0', 'u1')
+
+    engine.users['u1'].update_preferences({'Action': 1.0})
+    for i in range(15):
+        engine.users['u1'].add_viewing_record(f'c{i}', 3600, 1.0)
+
+    assert engine._calculate_user_similarity('u0', 'u1') > before
+    assert 'u1' in engine.neighbor_index.candidates('u0')
+
+def test_unknown_neighbor_index_is_rejected():
+    with pytest.raises(ValueError):
+        RecommendationEngine(neighbor_index='kd-tree')
+
+def test_exact_index_registers_users_by_id():
+    index = ExactUserIndex()
+    index.update_ids(['u1', 'u2', 'u3'])
+    index.update_ids(['u2', 'u4'])
+    assert len(index) == 4
+    assert index.candidates('u2') == ['u1', 'u3', 'u4']
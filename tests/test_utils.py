@@ -0,0 +1,18 @@
+import numpy as np
+from src.utils import top_k_indices, top_k_items
+
+def test_top_k_items_matches_stable_sort():
+    scores = {'a': 1.0, 'b': 3.0, 'c': 2.0, 'd': 3.0, 'e': 1.0}
+    expected = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    for k in range(7):
+        assert top_k_items(scores, k) == expected[:k]
+
+def test_top_k_indices_breaks_ties_deterministically():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 5, size=200).astype(float)
+    expected = list(np.argsort(-scores, kind='stable'))
+    for k in (0, 1, 7, 50, 200, 300):
+        assert list(top_k_indices(scores, k)) == expected[:k]
+
+    ties = np.arange(200)[::-1]
+    assert list(top_k_indices(scores, 3, ties=ties)) == list(np.flatnonzero(scores == 4)[::-1][:3])
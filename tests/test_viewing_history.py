@@ -0,0 +1,76 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from src.recommendation_engine import RecommendationEngine
+from src.user_profile import UserProfile
+from src.viewing_history import ViewingHistory
+from src.vocabulary import CONTENT_IDS
+
+def test_records_round_trip_through_columns():
+    history = ViewingHistory(initial_capacity=1)
+    watched_at = datetime(2024, 5, 17, 20, 30, 15, 123456)
+    history.add('c1', 7000, 1.0, watched_at)
+    history.add('c2', 1200, 0.25, watched_at)
+    history.add('c1', 300, 0.5, watched_at)
+
+    assert len(history) == 3
+    assert history[0] == {
+        'content_id': 'c1',
+        'watch_duration': 7000,
+        'completion_percentage': 1.0,
+        'timestamp': watched_at
+    }
+    assert history[-1]['completion_percentage'] == 0.5
+    assert [record['content_id'] for record in history] == ['c1', 'c2', 'c1']
+    assert history.content_ids() == {'c1', 'c2'}
+    assert history.durations.tolist() == [7000, 1200, 300]
+
+def test_records_and_columns_are_read_only():
+    user = UserProfile('u1')
+    user.add_viewing_record('c1', 7000, 1.0)
+
+    with pytest.raises(TypeError):
+        user.viewing_history[0]['completion_percentage'] = 0.0
+    with pytest.raises(ValueError):
+        user.viewing_history.completions[0] = 0.0
+
+    record = user.viewing_history[0].copy()
+    record['timestamp'] = record['timestamp'].isoformat()
+    assert isinstance(record['timestamp'], str)
+    assert np.issubdtype(user.viewing_history.content_indices.dtype, np.int32)
+
+def test_completion_weights_aggregate_repeat_views():
+    history = ViewingHistory()
+    for content_id, completion in [('c2', 0.5), ('c1', 0.25), ('c2', 1.0), ('c1', 0.125)]:
+        history.add(content_id, 600, completion)
+
+    def weights(aggregation):
+        indices, values = history.completion_weights(aggregation)
+        return {CONTENT_IDS.lookup(index): value for index, value in zip(indices.tolist(), values.tolist())}
+
+    assert weights('first') == {'c1': 0.25, 'c2': 0.5}
+    assert weights('max') == {'c1': 0.25, 'c2': 1.0}
+    assert weights('sum') == {'c1': 0.375, 'c2': 1.5}
+    with pytest.raises(ValueError):
+        history.completion_weights('mean')
+
+def test_repeat_views_setting_changes_content_based_weights():
+    rankings = {}
+    for repeat_views in ('first', 'sum'):
+        engine = RecommendationEngine(repeat_views=repeat_views)
+        for content_id, genre in [('a', 'Action'), ('d', 'Drama'), ('a2', 'Action'), ('d2', 'Drama')]:
+            engine.add_content(content_id, content_id, 'movie').genres = [genre]
+        engine.add_viewing_record('u1', 'a', 600, 0.5)
+        engine.add_viewing_record('u1', 'd', 600, 0.75)
+        engine.add_viewing_record('u1', 'a', 600, 0.5)
+        rankings[repeat_views] = engine.content_based_filtering('u1', limit=1)
+    assert rankings == {'first': ['d2'], 'sum': ['a2']}
+
+def test_records_keep_the_values_they_were_given():
+    history = ViewingHistory()
+    history.add('c1', 90.5, 0.5477299121055509)
+    history.extend(['c2', 'c3', 'c4'], [None, -5, 7000], [1 / 3, 0.1, 1], np.zeros(3, dtype=np.int64))
+
+    assert [record['completion_percentage'] for record in history] == [0.5477299121055509, 1 / 3, 0.1, 1.0]
+    assert [record['watch_duration'] for record in history] == [90.5, None, -5, 7000]
+    assert isinstance(history[3]['watch_duration'], int)